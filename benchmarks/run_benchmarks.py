@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# ============================================
+# RUN_BENCHMARKS.PY - Sync pipeline benchmarks on simulated data
+# ============================================
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import pytz
+
+from services.owlet import data_processor as data_processor_module
+from services.owlet.aggregator import DailyAggregator
+from services.owlet.api_client import OwletAPIClient
+from services.owlet.data_processor import VitalDataProcessor
+from services.owlet.file_manager import OwletFileManager
+from services.owlet.history_store import HistoryStore
+from services.owlet.simulator import FakeOwletAPI, FakeSock, generate_vitals
+from services.owlet.sync_service import OwletSyncService
+from services.owlet.time_index import vital_epoch_ms
+from services.owlet.vital_buffer import VitalRingBuffer
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+
+# A change by more than this fraction is reported by --compare
+REGRESSION_THRESHOLD = 0.10
+
+EVENTS_PHP = os.path.join(ROOT_DIR, 'events.php')
+
+# Runs events.php for the query in argv[1] and reports its own run time,
+# so PHP's start-up is not counted, on stderr once it exits
+PHP_REQUEST = r'''
+$start = hrtime(true);
+register_shutdown_function(function() use ($start) {
+    fwrite(STDERR, sprintf("%.3f\n", (hrtime(true) - $start) / 1e6));
+});
+$_SERVER['REQUEST_METHOD'] = 'GET';
+$_GET = json_decode($argv[1], true);
+require $argv[2];
+'''
+
+def timed(func, repeat=1):
+    """Best wall time of func in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list"""
+    ordered = sorted(values)
+    return ordered[max(int(round(p / 100 * len(ordered))) - 1, 0)]
+
+class WorkDir:
+    """Temporary working directory the service writes its files to"""
+    
+    def __enter__(self):
+        self.previous = os.getcwd()
+        self.path = tempfile.mkdtemp(prefix='owlet-bench-')
+        os.chdir(self.path)
+        return self.path
+    
+    def __exit__(self, *exc):
+        os.chdir(self.previous)
+        shutil.rmtree(self.path, ignore_errors=True)
+
+def bench_sync_ticks(ticks, history_hours):
+    """Per-tick latency of OwletSyncService.sync against a simulated sock"""
+    processor = VitalDataProcessor(pytz.UTC)
+    with WorkDir():
+        with open('owlet_config.json', 'w') as f:
+            json.dump({
+                'email': 'bench@example.com',
+                'password': 'bench',
+                'region': 'us-east-1',
+                'timezone': 'UTC',
+                'auto_create_events': False,
+                'history_interval_seconds': 0,
+                'retention_hours': history_hours,
+            }, f)
+        
+        # Start from a full retention window of history
+        store = HistoryStore('owlet_history')
+        os.makedirs(store.directory, exist_ok=True)
+        store.append_many(generate_vitals(processor, history_hours * 60))
+        
+        async def run():
+            service = OwletSyncService('owlet_config.json')
+            service.api_client = OwletAPIClient(service.config_loader, FakeOwletAPI, FakeSock)
+            
+            # First tick includes authentication, discovery and loading history
+            start = time.perf_counter()
+            await service.sync()
+            first_tick = (time.perf_counter() - start) * 1000
+            
+            latencies = []
+            for _ in range(ticks):
+                start = time.perf_counter()
+                await service.sync()
+                latencies.append((time.perf_counter() - start) * 1000)
+            await service.close()
+            return first_tick, latencies
+        
+        first_tick, latencies = asyncio.run(run())
+    
+    return {
+        'first_ms': first_tick,
+        'mean_ms': statistics.mean(latencies),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'max_ms': max(latencies),
+    }
+
+def bench_aggregation(days_list, repeat):
+    """Daily summary aggregation over growing amounts of history"""
+    processor = VitalDataProcessor(pytz.UTC)
+    numpy_module = data_processor_module.np
+    results = {}
+    
+    for days in days_list:
+        vitals = generate_vitals(processor, days * 1440)
+        
+        results[f'{days}d_python_ms'] = None
+        try:
+            data_processor_module.np = None
+            results[f'{days}d_python_ms'] = timed(lambda: processor.aggregate_vitals_to_summary(vitals), repeat)
+        finally:
+            data_processor_module.np = numpy_module
+        
+        if numpy_module is not None:
+            results[f'{days}d_numpy_ms'] = timed(lambda: processor.aggregate_vitals_to_summary(vitals), repeat)
+        
+        def incremental():
+            aggregator = DailyAggregator(datetime.now(timezone.utc).date())
+            for vital in vitals:
+                aggregator.add(vital, int(vital['timestamp'][11:13]))
+            aggregator.to_daily_summary()
+        results[f'{days}d_incremental_ms'] = timed(incremental, repeat)
+    
+    return results
+
+def bench_cleanup(sizes, repeat, max_dict_samples):
+    """OwletFileManager.cleanup_old_vitals on a newest-first list"""
+    processor = VitalDataProcessor(pytz.UTC)
+    results = {}
+    with WorkDir():
+        file_manager = OwletFileManager(pytz.UTC)
+        for size in sizes:
+            if size > max_dict_samples:
+                continue
+            vitals = generate_vitals(processor, size)
+            vitals.reverse()
+            results[f'{size}_ms'] = timed(lambda: file_manager.cleanup_old_vitals(vitals, 48), repeat)
+    return results
+
+def bench_history_append(count):
+    """Cost of appending vitals to the hourly history segments"""
+    processor = VitalDataProcessor(pytz.UTC)
+    vitals = generate_vitals(processor, count)
+    results = {}
+    
+    with WorkDir():
+        store = HistoryStore('owlet_history')
+        os.makedirs(store.directory, exist_ok=True)
+        
+        start = time.perf_counter()
+        for vital in vitals:
+            store.append(vital)
+        results['single_us_per_vital'] = (time.perf_counter() - start) * 1e6 / count
+        
+        shutil.rmtree(store.directory)
+        os.makedirs(store.directory)
+        start = time.perf_counter()
+        for index in range(0, count, 60):
+            store.append_many(vitals[index:index + 60])
+        results['batched_us_per_vital'] = (time.perf_counter() - start) * 1e6 / count
+        
+        file_manager = OwletFileManager(pytz.UTC)
+        start = time.perf_counter()
+        for vital in vitals:
+            file_manager.append_history(vital)
+        file_manager.flush(wait=True)
+        results['file_manager_us_per_vital'] = (time.perf_counter() - start) * 1e6 / count
+    
+    return results
+
+def php_request(query):
+    """Milliseconds events.php spent answering a GET query, and its JSON response"""
+    process = subprocess.run(
+        ['php', '-r', PHP_REQUEST, '--', json.dumps(query), EVENTS_PHP],
+        capture_output=True, text=True, check=True
+    )
+    return float(process.stderr.strip().splitlines()[-1]), json.loads(process.stdout)
+
+def bench_series_query(days_list, repeat, max_points=500):
+    """events.php chart series of the last 6 hours (raw history) and of all history (rollups)"""
+    if shutil.which('php') is None:
+        logger.warning("php not found, skipping the series query benchmark")
+        return {}
+    
+    processor = VitalDataProcessor(pytz.UTC)
+    results = {}
+    
+    for days in days_list:
+        vitals = generate_vitals(processor, days * 1440)
+        with WorkDir():
+            file_manager = OwletFileManager(pytz.UTC)
+            for vital in vitals:
+                file_manager.append_history(vital)
+            file_manager.append_rollups(vitals)
+            # events.php reads the files once everything is written
+            file_manager.close()
+            
+            t1 = vital_epoch_ms(vitals[-1]) // 1000
+            for label, t0 in (('6h', t1 - 6 * 3600), (f'{days}d', t1 - days * 86400)):
+                for method in ('lttb', 'minmax'):
+                    query = {
+                        'series': 'true', 'metric': 'heart_rate', 'from': t0, 'to': t1,
+                        'max_points': max_points, 'method': method,
+                    }
+                    timings = [php_request(query) for _ in range(repeat)]
+                    results[f'{label}_{method}_ms'] = min(elapsed for elapsed, _ in timings)
+                    results[f'{label}_{method}_input_points'] = timings[0][1]['input_points']
+    
+    return results
+
+def traced_bytes(build):
+    """Memory held by the object build() returns, in bytes"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    gc.collect()
+    return after - before
+
+def bench_memory(sizes, max_dict_samples):
+    """Memory of the retention window as vital dicts vs the columnar buffer"""
+    processor = VitalDataProcessor(pytz.UTC)
+    template = generate_vitals(processor, min(max(sizes), max_dict_samples))
+    # Parsed like history lines, so no strings are shared between samples
+    lines = [json.dumps(v) for v in template]
+    results = {}
+    
+    for size in sizes:
+        dict_samples = min(size, max_dict_samples)
+        dict_bytes = traced_bytes(lambda: [json.loads(line) for line in lines[:dict_samples]])
+        results[f'{size}_dicts_mb'] = dict_bytes * size / dict_samples / 1e6
+        if dict_samples < size:
+            # Too large to materialize comfortably, scaled from a smaller sample
+            results[f'{size}_dicts_extrapolated_from'] = dict_samples
+        
+        def build_buffer():
+            buffer = VitalRingBuffer(size)
+            for index in range(size):
+                buffer.append(template[index % len(template)])
+            return buffer
+        results[f'{size}_ring_buffer_mb'] = traced_bytes(build_buffer) / 1e6
+    
+    return results
+
+def git_revision():
+    """Current commit of the repository, if available"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def flatten(results, prefix=''):
+    """Flatten nested results to dotted metric names"""
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{name}.'))
+        else:
+            flat[name] = value
+    return flat
+
+def compare(previous_file, metrics):
+    """Print metrics that changed noticeably since a previous run"""
+    with open(previous_file, 'r') as f:
+        previous = json.load(f)['metrics']
+    
+    print(f"\nCompared with {previous_file}:")
+    changed = 0
+    for name, value in sorted(metrics.items()):
+        old = previous.get(name)
+        if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+            continue
+        ratio = value / old - 1
+        if abs(ratio) >= REGRESSION_THRESHOLD:
+            changed += 1
+            label = 'slower/larger' if ratio > 0 else 'faster/smaller'
+            print(f"  {name}: {old:.3f} -> {value:.3f} ({ratio:+.0%}, {label})")
+    if not changed:
+        print(f"  no change above {REGRESSION_THRESHOLD:.0%}")
+
+def main():
+    """Run the benchmarks and record the results as JSON"""
+    parser = argparse.ArgumentParser(description='Benchmark the Owlet sync pipeline on simulated data')
+    parser.add_argument('--quick', action='store_true', help='small sizes for a fast smoke run')
+    parser.add_argument('--ticks', type=int, default=50, help='sync ticks to time')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='sample counts for memory and cleanup')
+    parser.add_argument('--days', default='1,7,30', help='days of history to aggregate')
+    parser.add_argument('--max-dict-samples', type=int, default=100000,
+                        help='largest vital dict list to materialize, larger sizes are extrapolated')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<time>-<commit>.json)')
+    parser.add_argument('--compare', help='previous result file to compare against')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+    
+    sizes = [int(size) for size in args.sizes.split(',')]
+    days_list = [int(days) for days in args.days.split(',')]
+    ticks = args.ticks
+    if args.quick:
+        sizes, days_list, ticks = [1000, 10000], [1], 10
+    
+    results = {}
+    steps = [
+        ('sync_tick', lambda: bench_sync_ticks(ticks, 48)),
+        ('aggregation', lambda: bench_aggregation(days_list, 3)),
+        ('cleanup_old_vitals', lambda: bench_cleanup(sizes, 3, args.max_dict_samples)),
+        ('history_append', lambda: bench_history_append(min(sizes[0], 10000))),
+        ('series_query', lambda: bench_series_query(days_list, 3)),
+        ('memory', lambda: bench_memory(sizes, args.max_dict_samples)),
+    ]
+    for name, run in steps:
+        print(f"Running {name}...", flush=True)
+        results[name] = run()
+    
+    revision = git_revision()
+    metrics = flatten(results)
+    report = {
+        'meta': {
+            'time': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+            'revision': revision,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': data_processor_module.np is not None,
+            'php': shutil.which('php') is not None,
+            'quick': args.quick,
+        },
+        'metrics': metrics,
+    }
+    
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{revision or 'unknown'}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    
+    for name, value in metrics.items():
+        print(f"  {name}: {value:.3f}" if isinstance(value, float) else f"  {name}: {value}")
+    print(f"Results written to {output}")
+    
+    if args.compare:
+        compare(args.compare, metrics)
+
+if __name__ == '__main__':
+    main()
@@ -116,3 +116,19 @@ export function getTodaysHourly() {
         });
 }
 
+
+// Get one metric over a time range, downsampled to at most maxPoints [epoch ms, value] points
+export function getOwletSeries(metric, from, to, maxPoints = 500, method = 'lttb') {
+    const params = new URLSearchParams({ series: 'true', metric, max_points: maxPoints, method });
+    if (from) params.set('from', from);
+    if (to) params.set('to', to);
+    return fetch(`api/events.php?${params}`)
+        .then(response => {
+            if (!response.ok) throw new Error('Failed to fetch series');
+            return response.json();
+        })
+        .catch(error => {
+            console.error('Error loading Owlet series:', error);
+            throw error;
+        });
+}
@@ -3,27 +3,77 @@
 # OWLET_SYNC.PY - Service entry point
 # ============================================
 
+import argparse
 import asyncio
 import logging
+import os
 import sys
 
-from services.owlet.sync_service import OwletSyncService
-
-# Setup logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('owlet_sync.log'),
-        logging.StreamHandler()
-    ]
-)
+from services.config.config_loader import ConfigLoader
+from services.owlet.sync_service import OwletSyncService, DEVICES_DIR
+from services.owlet.backfill import parse_date_range, run_backfill
+from services.owlet.sqlite_store import migrate_to_sqlite
+from services.owlet.logging_setup import setup_logging
+from services.owlet.supervisor import Supervisor
+
 logger = logging.getLogger(__name__)
 
-async def main():
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Owlet sync service')
+    parser.add_argument('--config', default='owlet_config.json', help='config file')
+    parser.add_argument('--backfill', metavar='START[:END]',
+                        help='rebuild daily summaries of a date range (YYYY-MM-DD) from history, then exit')
+    parser.add_argument('--accounts', metavar='FILE',
+                        help='run every account listed in this file, sharded over worker processes')
+    parser.add_argument('--workers', type=int,
+                        help='worker processes of --backfill or --accounts (default: CPU count)')
+    parser.add_argument('--device', metavar='DSN', help='backfill a non-primary sock')
+    parser.add_argument('--missing-only', action='store_true', help='backfill only days without a summary')
+    parser.add_argument('--migrate-sqlite', action='store_true',
+                        help='copy JSON history, summaries and events into owlet.db, then exit')
+    return parser.parse_args()
+
+def backfill(args):
+    """Replay archived history into daily summaries"""
+    try:
+        start_date, end_date = parse_date_range(args.backfill)
+    except ValueError as e:
+        logger.error(f"Invalid backfill range: {e}")
+        return False
+    
+    config_loader = ConfigLoader(args.config)
+    base_dir = os.path.join(DEVICES_DIR, args.device) if args.device else ''
+    run_backfill(config_loader, start_date, end_date, args.workers, base_dir, args.missing_only)
+    return True
+
+def migrate(args):
+    """Copy the JSON files of every device into SQLite databases"""
+    try:
+        migrate_to_sqlite(events_file='events.json')
+        if os.path.isdir(DEVICES_DIR):
+            for dsn in sorted(os.listdir(DEVICES_DIR)):
+                migrate_to_sqlite(os.path.join(DEVICES_DIR, dsn))
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        return False
+    
+    logger.info('Migration done, set "storage_backend": "sqlite" in the config to use the database')
+    return True
+
+def supervise(args):
+    """Run many accounts in worker processes"""
+    try:
+        supervisor = Supervisor(args.accounts, args.workers)
+    except ValueError as e:
+        logger.error(f"Invalid accounts file: {e}")
+        return False
+    return supervisor.run()
+
+async def main(args):
     """Main entry point"""
     try:
-        service = OwletSyncService()
+        service = OwletSyncService(args.config)
         
         is_valid, msg = service.config_loader.validate()
         if not is_valid:
@@ -39,7 +89,17 @@ async def main():
 
 if __name__ == '__main__':
     try:
-        success = asyncio.run(main())
+        args = parse_args()
+        # Queued, rotated and rate-limited logging as configured (log_* keys)
+        setup_logging(ConfigLoader(args.accounts or args.config))
+        if args.accounts:
+            success = supervise(args)
+        elif args.backfill:
+            success = backfill(args)
+        elif args.migrate_sqlite:
+            success = migrate(args)
+        else:
+            success = asyncio.run(main(args))
         sys.exit(0 if success else 1)
     except KeyboardInterrupt:
         logger.info("Service stopped by user")
@@ -25,6 +25,7 @@ if ($_SERVER['REQUEST_METHOD'] == 'OPTIONS') {
 }
 
 $eventsFile = __DIR__ . '/../../events.json';
+$eventsDatabase = __DIR__ . '/../../owlet.db';
 
 // ============================================
 // UTILITY FUNCTIONS - File I/O & Responses
@@ -63,6 +64,133 @@ function writeJsonFile($file, $data) {
     }
 }
 
+/**
+ * Decode a history segment's lines, expanding delta records (only the fields
+ * that changed, "dt" microseconds after the line before) into full vitals
+ */
+function decodeHistoryLines($lines) {
+    $vitals = [];
+    $previous = null;
+    
+    foreach ($lines as $line) {
+        $record = json_decode($line, true);
+        if ($record === null) {
+            continue;
+        }
+        
+        if (isset($record['_delta'])) {
+            if ($previous === null) {
+                continue;
+            }
+            $vital = $previous;
+            foreach ($record['_removed'] ?? [] as $key) {
+                unset($vital[$key]);
+            }
+            
+            if (isset($record['dt'])) {
+                // Same format as the service: microseconds only when non-zero
+                $time = new DateTime($previous['timestamp']);
+                $micros = (int)$time->format('U') * 1000000 + (int)$time->format('u') + $record['dt'];
+                $fraction = $micros % 1000000;
+                $record['timestamp'] = gmdate('Y-m-d\\TH:i:s', intdiv($micros, 1000000))
+                    . ($fraction ? sprintf('.%06d', $fraction) : '') . 'Z';
+            }
+            if (!isset($record['timestamp_ms'])) {
+                $time = new DateTime($record['timestamp']);
+                $record['timestamp_ms'] = (int)$time->format('U') * 1000 + intdiv((int)$time->format('u'), 1000);
+            }
+            
+            unset($record['_delta'], $record['_removed'], $record['dt']);
+            $record = array_merge($vital, $record);
+        }
+        
+        $vitals[] = $record;
+        $previous = $record;
+    }
+    
+    return $vitals;
+}
+
+/**
+ * Read the newest vitals from hourly JSON Lines history segments
+ */
+function readHistorySegments($dir, $limit) {
+    $vitals = [];
+    $files = array_diff(scandir($dir, SCANDIR_SORT_DESCENDING), ['.', '..']);
+    
+    foreach ($files as $file) {
+        if (substr($file, -6) !== '.jsonl') {
+            continue;
+        }
+        
+        $lines = file($dir . '/' . $file, FILE_IGNORE_NEW_LINES | FILE_SKIP_EMPTY_LINES);
+        if ($lines === false) {
+            continue;
+        }
+        
+        // Segments are oldest first, the API returns newest first
+        foreach (array_reverse(decodeHistoryLines($lines)) as $vital) {
+            $vitals[] = $vital;
+            if (count($vitals) >= $limit) {
+                return $vitals;
+            }
+        }
+    }
+    
+    return $vitals;
+}
+
+/**
+ * Open a SQLite database written by the sync service ("storage_backend": "sqlite"), null if there is none
+ */
+function openDatabase($file) {
+    if (!file_exists($file) || !class_exists('PDO') || !in_array('sqlite', PDO::getAvailableDrivers())) {
+        return null;
+    }
+    
+    try {
+        $db = new PDO('sqlite:' . $file);
+        $db->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+        // The service may be committing; WAL readers only wait for checkpoints
+        $db->exec('PRAGMA busy_timeout = 5000');
+        return $db;
+    } catch (PDOException $e) {
+        error_log("Error opening database $file: " . $e->getMessage());
+        return null;
+    }
+}
+
+/**
+ * History and summaries database, only while the sync service stores into it
+ * (a migrated owlet.db stays a frozen copy until storage_backend is switched)
+ */
+function openDataDatabase() {
+    $storage = readJsonFile(owletDataFile('owlet_storage.json'));
+    if (($storage['storage_backend'] ?? 'json') !== 'sqlite') {
+        return null;
+    }
+    return openDatabase(owletDataFile('owlet.db'));
+}
+
+/**
+ * Events database, used once the migration has moved events.json aside
+ */
+function openEventsDatabase() {
+    global $eventsFile, $eventsDatabase;
+    return file_exists($eventsFile) ? null : openDatabase($eventsDatabase);
+}
+
+/**
+ * Decode the JSON data column of query rows
+ */
+function decodeRows($statement) {
+    $rows = [];
+    foreach ($statement->fetchAll(PDO::FETCH_COLUMN) as $data) {
+        $rows[] = json_decode($data, true);
+    }
+    return $rows;
+}
+
 /**
  * Send JSON response
  */
@@ -72,6 +200,22 @@ function sendJsonResponse($data, $statusCode = 200) {
     exit();
 }
 
+/**
+ * Stream a pre-serialized JSON file as the response, returns if it cannot be opened
+ */
+function sendJsonFile($file) {
+    // Size and body from one handle: the service may replace the file in between
+    $fp = @fopen($file, 'rb');
+    if ($fp === false) {
+        return;
+    }
+    http_response_code(200);
+    header('Content-Length: ' . fstat($fp)['size']);
+    fpassthru($fp);
+    fclose($fp);
+    exit();
+}
+
 /**
  * Send error response
  */
@@ -89,6 +233,15 @@ function sendError($message, $statusCode = 400) {
 function handleEventsGet() {
     global $eventsFile;
     
+    $db = openEventsDatabase();
+    if ($db !== null) {
+        try {
+            sendJsonResponse(decodeRows($db->query('SELECT data FROM events ORDER BY rowid DESC')));
+        } catch (PDOException $e) {
+            sendError('Failed to read events', 500);
+        }
+    }
+    
     $events = readJsonFile($eventsFile);
     if ($events === null) {
         $events = [];
@@ -117,6 +270,21 @@ function handleEventsPost() {
         }
     }
     
+    $db = openEventsDatabase();
+    if ($db !== null) {
+        try {
+            // Updates keep their position, new events are listed first
+            $statement = $db->prepare(
+                'INSERT INTO events (id, time, data) VALUES (?, ?, ?) ' .
+                'ON CONFLICT(id) DO UPDATE SET time = excluded.time, data = excluded.data'
+            );
+            $statement->execute([(string)$input['id'], $input['time'], json_encode($input, JSON_UNESCAPED_UNICODE)]);
+            sendJsonResponse(['success' => true, 'message' => 'Event saved successfully']);
+        } catch (PDOException $e) {
+            sendError('Failed to save event', 500);
+        }
+    }
+    
     // Load existing events
     $events = readJsonFile($eventsFile);
     if ($events === null) {
@@ -156,6 +324,20 @@ function handleEventsDelete() {
     if ($input === null || !isset($input['id'])) {
         sendError('Missing event id', 400);
     }
+    
+    $db = openEventsDatabase();
+    if ($db !== null) {
+        try {
+            $statement = $db->prepare('DELETE FROM events WHERE id = ?');
+            $statement->execute([(string)$input['id']]);
+        } catch (PDOException $e) {
+            sendError('Failed to delete event', 500);
+        }
+        if ($statement->rowCount() === 0) {
+            sendError('Event not found', 404);
+        }
+        sendJsonResponse(['success' => true, 'message' => 'Event deleted']);
+    }
 
     $events = readJsonFile($eventsFile);
     if ($events === null) {
@@ -182,11 +364,32 @@ function handleEventsDelete() {
 // OWLET VITALS ENDPOINTS
 // ============================================
 
+/**
+ * Resolve an Owlet data file, optionally of a secondary device (?device=DSN)
+ */
+function owletDataFile($name) {
+    if (isset($_GET['device']) && preg_match('/^[A-Za-z0-9_-]+$/', $_GET['device'])) {
+        $deviceDir = 'owlet_devices/' . $_GET['device'];
+        if (is_dir($deviceDir)) {
+            return $deviceDir . '/' . $name;
+        }
+    }
+    return $name;
+}
+
+/**
+ * List monitored Owlet devices
+ */
+function handleOwletDevices() {
+    $devices = readJsonFile('owlet_devices.json');
+    sendJsonResponse(['devices' => $devices === null ? [] : $devices]);
+}
+
 /**
  * Get latest vital reading
  */
 function handleOwletLatest() {
-    $latestFile = 'owlet_latest.json';
+    $latestFile = owletDataFile('owlet_latest.json');
     if (!file_exists($latestFile)) {
         sendError('No real-time data available', 404);
     }
@@ -209,20 +412,34 @@ function handleOwletLatest() {
  * Get vitals history and analysis
  */
 function handleOwletVitals() {
-    $historyFile = 'owlet_history.json';
-    $vitalsFile = file_exists($historyFile) ? $historyFile : 'owlet_vitals.json';
+    // Snapshot written by the sync service after every tick
+    $snapshotFile = owletDataFile('owlet_api_vitals.json');
+    if (file_exists($snapshotFile)) {
+        sendJsonFile($snapshotFile);
+    }
+    
+    $db = openDataDatabase();
+    $historyDir = owletDataFile('owlet_history');
+    $historyFile = owletDataFile('owlet_history.json');
+    $vitalsFile = file_exists($historyFile) ? $historyFile : owletDataFile('owlet_vitals.json');
     
-    if (!file_exists($vitalsFile)) {
+    if ($db === null && !is_dir($historyDir) && !file_exists($vitalsFile)) {
         sendJsonResponse(['vitals' => [], 'last_update' => null]);
     }
     
     try {
-        $vitalsData = readJsonFile($vitalsFile);
-        $vitals = $vitalsData === null ? [] : $vitalsData;
+        if ($db !== null) {
+            $vitals = decodeRows($db->query('SELECT data FROM vitals ORDER BY timestamp_ms DESC LIMIT 100'));
+        } elseif (is_dir($historyDir)) {
+            $vitals = readHistorySegments($historyDir, 100);
+        } else {
+            $vitalsData = readJsonFile($vitalsFile);
+            $vitals = $vitalsData === null ? [] : $vitalsData;
+        }
         
         // Load latest reading separately
         $latestReading = null;
-        $latestFile = 'owlet_latest.json';
+        $latestFile = owletDataFile('owlet_latest.json');
         if (file_exists($latestFile)) {
             $latestReading = readJsonFile($latestFile);
             
@@ -244,16 +461,98 @@ function handleOwletVitals() {
     }
 }
 
+/**
+ * Load one day's full summary, hourly entries included, null if there is none
+ */
+function loadDailySummary($db, $date) {
+    if ($db !== null) {
+        $statement = $db->prepare('SELECT data FROM daily_summaries WHERE date = ?');
+        $statement->execute([$date]);
+        $rows = decodeRows($statement);
+        if (!empty($rows)) {
+            return $rows[0];
+        }
+    }
+    return readJsonFile(owletDataFile('owlet_daily_summaries') . '/owlet_summary_' . $date . '.json');
+}
+
+/**
+ * Page through the summaries manifest (?from=&to=&offset=&limit=), newest day first.
+ * Rows hold the daily aggregates only; &detail=true loads the page's full summaries
+ */
+function handleOwletSummaryPage($manifest) {
+    $from = $_GET['from'] ?? null;
+    $to = $_GET['to'] ?? null;
+    foreach ([$from, $to] as $date) {
+        if ($date !== null && !preg_match('/^\d{4}-\d{2}-\d{2}$/', $date)) {
+            sendError('Invalid date, expected YYYY-MM-DD');
+        }
+    }
+    $offset = max(0, (int)($_GET['offset'] ?? 0));
+    $limit = min(max(1, (int)($_GET['limit'] ?? 30)), 366);
+    
+    // ISO dates compare correctly as strings
+    $rows = array_values(array_filter($manifest['days'], function ($row) use ($from, $to) {
+        return ($from === null || $row['date'] >= $from) && ($to === null || $row['date'] <= $to);
+    }));
+    $page = array_slice($rows, $offset, $limit);
+    
+    if (isset($_GET['detail']) && $_GET['detail'] === 'true') {
+        $db = openDataDatabase();
+        foreach ($page as $i => $row) {
+            $page[$i] = loadDailySummary($db, $row['date']) ?? $row;
+        }
+    }
+    
+    sendJsonResponse([
+        'summaries' => $page,
+        'total_days' => count($page),
+        'total_matching' => count($rows),
+        'offset' => $offset,
+        'limit' => $limit,
+        'has_more' => $offset + count($page) < count($rows),
+        'last_update' => !empty($rows) ? $rows[0]['last_timestamp'] ?? null : null
+    ]);
+}
+
 /**
  * Get daily summaries for historical analysis
  */
 function handleOwletSummaries() {
-    $summariesDir = 'owlet_daily_summaries';
+    $summariesDir = owletDataFile('owlet_daily_summaries');
     $limit = isset($_GET['limit']) ? (int)$_GET['limit'] : 30;
     
+    // One day with its hourly detail
+    if (isset($_GET['date'])) {
+        if (!preg_match('/^\d{4}-\d{2}-\d{2}$/', $_GET['date'])) {
+            sendError('Invalid date, expected YYYY-MM-DD');
+        }
+        $summary = loadDailySummary(openDataDatabase(), $_GET['date']);
+        if ($summary === null) {
+            sendError('No summary for ' . $_GET['date'], 404);
+        }
+        sendJsonResponse(['summary' => $summary]);
+    }
+    
+    // Manifest of one compact row per day, kept by the sync service
+    $manifest = readJsonFile($summariesDir . '/index.json');
+    if (!is_array($manifest['days'] ?? null)) {
+        $manifest = null;
+    }
+    if ($manifest !== null && (isset($_GET['from']) || isset($_GET['to']) || isset($_GET['offset']))) {
+        handleOwletSummaryPage($manifest);
+    }
+    
+    // Snapshot of the default 30 days written by the sync service
+    $snapshotFile = owletDataFile('owlet_api_summaries.json');
+    if (!isset($_GET['limit']) && file_exists($snapshotFile)) {
+        sendJsonFile($snapshotFile);
+    }
+    
     $summaries = [];
+    $db = openDataDatabase();
     
-    if (!is_dir($summariesDir)) {
+    if ($db === null && !is_dir($summariesDir)) {
         sendJsonResponse([
             'summaries' => $summaries,
             'total_days' => 0,
@@ -262,7 +561,23 @@ function handleOwletSummaries() {
     }
     
     try {
-        $files = array_diff(scandir($summariesDir, SCANDIR_SORT_DESCENDING), ['.', '..']);
+        $files = [];
+        if ($db !== null) {
+            $statement = $db->prepare('SELECT data FROM daily_summaries ORDER BY date DESC LIMIT ?');
+            $statement->bindValue(1, $limit, PDO::PARAM_INT);
+            $statement->execute();
+            $summaries = decodeRows($statement);
+        } elseif ($manifest !== null) {
+            // The newest days' files only, no directory scan
+            foreach (array_slice($manifest['days'], 0, max($limit, 0)) as $row) {
+                $data = loadDailySummary(null, $row['date']);
+                if ($data && isset($data['date'])) {
+                    $summaries[] = $data;
+                }
+            }
+        } else {
+            $files = array_diff(scandir($summariesDir, SCANDIR_SORT_DESCENDING), ['.', '..']);
+        }
         $count = 0;
         
         foreach ($files as $file) {
@@ -277,7 +592,7 @@ function handleOwletSummaries() {
         }
         
         // Include today's hourly data if available
-        $todaysHourly = readJsonFile('owlet_todays_hourly.json');
+        $todaysHourly = readJsonFile(owletDataFile('owlet_todays_hourly.json'));
         if ($todaysHourly && !empty($todaysHourly['hourly'])) {
             array_unshift($summaries, $todaysHourly);
         }
@@ -296,7 +611,7 @@ function handleOwletSummaries() {
  * Get today's hourly aggregated data
  */
 function handleOwletTodaysHourly() {
-    $filename = 'owlet_todays_hourly.json';
+    $filename = owletDataFile('owlet_todays_hourly.json');
     
     if (!file_exists($filename)) {
         sendJsonResponse([
@@ -323,6 +638,341 @@ function handleOwletTodaysHourly() {
     }
 }
 
+/**
+ * Parse a range bound given as epoch seconds or a date/time string
+ */
+function parseRangeTime($value, $default) {
+    if ($value === null || $value === '') {
+        return $default;
+    }
+    if (is_numeric($value)) {
+        return (int)$value;
+    }
+    $time = strtotime($value);
+    return $time === false ? null : $time;
+}
+
+/**
+ * Format a stored rollup bucket like the sync service's range queries
+ */
+function formatRollupRecord($record) {
+    $point = [
+        'timestamp' => gmdate('Y-m-d\\TH:i:s\\Z', $record['t']),
+        'data_points' => $record['n']
+    ];
+    foreach (['heart_rate', 'oxygen_saturation', 'skin_temperature', 'movement'] as $metric) {
+        if (!empty($record[$metric])) {
+            [$count, $sum, $min, $max] = $record[$metric];
+            $point[$metric] = ['avg' => round($sum / $count, 2), 'min' => $min, 'max' => $max, 'count' => $count];
+        }
+    }
+    return $point;
+}
+
+/**
+ * Rollup tier => bucket seconds and partition file date format, as written by rollups.py
+ */
+function rollupTiers() {
+    return [
+        '1m' => [60, 'Y-m-d'],
+        '10m' => [600, 'Y-m-d'],
+        '1h' => [3600, 'Y-m']
+    ];
+}
+
+/**
+ * Coarsest rollup tier whose buckets are at most $resolution seconds long
+ */
+function pickRollupTier($resolution) {
+    $tierName = '1m';
+    foreach (rollupTiers() as $name => $tier) {
+        if ($tier[0] <= $resolution) {
+            $tierName = $name;
+        }
+    }
+    return $tierName;
+}
+
+/**
+ * Stored buckets of a rollup tier overlapping a time range (epoch seconds), oldest first
+ */
+function readRollupRecords($tierName, $from, $to) {
+    [$bucketSeconds, $partitionFormat] = rollupTiers()[$tierName];
+    $tierDir = owletDataFile('owlet_rollups') . '/' . $tierName;
+    
+    $start = intdiv($from, $bucketSeconds) * $bucketSeconds;
+    $firstKey = gmdate($partitionFormat, $start);
+    $lastKey = gmdate($partitionFormat, $to);
+    
+    $records = [];
+    if (!is_dir($tierDir)) {
+        return $records;
+    }
+    
+    $files = array_diff(scandir($tierDir), ['.', '..']);
+    foreach ($files as $file) {
+        $key = substr($file, 0, -6);
+        if (substr($file, -6) !== '.jsonl' || $key < $firstKey || $key > $lastKey) {
+            continue;
+        }
+        
+        $lines = file($tierDir . '/' . $file, FILE_IGNORE_NEW_LINES | FILE_SKIP_EMPTY_LINES);
+        if ($lines === false) {
+            continue;
+        }
+        
+        foreach ($lines as $line) {
+            $record = json_decode($line, true);
+            if ($record !== null && $record['t'] >= $start && $record['t'] <= $to) {
+                $records[] = $record;
+            }
+        }
+    }
+    
+    return $records;
+}
+
+/**
+ * Get rolled up vitals of a time range from the coarsest sufficient tier
+ */
+function handleOwletRange() {
+    $to = parseRangeTime($_GET['to'] ?? null, time());
+    $from = parseRangeTime($_GET['from'] ?? null, $to === null ? null : $to - 86400);
+    if ($from === null || $to === null || $from > $to) {
+        sendError('Invalid time range');
+    }
+    
+    // Wanted seconds per point, by default about 300 points over the range
+    $resolution = isset($_GET['resolution']) ? (int)$_GET['resolution'] : intdiv($to - $from, 300);
+    $tierName = pickRollupTier($resolution);
+    
+    sendJsonResponse([
+        'tier' => $tierName,
+        'resolution_seconds' => rollupTiers()[$tierName][0],
+        'from' => gmdate('Y-m-d\\TH:i:s\\Z', $from),
+        'to' => gmdate('Y-m-d\\TH:i:s\\Z', $to),
+        'points' => array_map('formatRollupRecord', readRollupRecords($tierName, $from, $to))
+    ]);
+}
+
+/**
+ * [epoch ms, value, low, high] readings of a metric from the stored vitals, oldest first
+ */
+function readRawSamples($metric, $from, $to) {
+    $db = openDataDatabase();
+    if ($db !== null) {
+        $statement = $db->prepare('SELECT data FROM vitals WHERE timestamp_ms >= ? AND timestamp_ms <= ? ORDER BY timestamp_ms');
+        $statement->execute([$from * 1000, $to * 1000]);
+        $vitals = decodeRows($statement);
+    } else {
+        // Hourly segments overlapping the range; an archived copy is complete when both exist
+        $vitals = [];
+        $historyDir = owletDataFile('owlet_history');
+        $archiveDir = owletDataFile('owlet_history_archive');
+        for ($hour = intdiv($from, 3600) * 3600; $hour <= $to; $hour += 3600) {
+            $key = gmdate('Y-m-d\\TH', $hour);
+            if (file_exists($archiveDir . '/' . $key . '.jsonl.gz')) {
+                $lines = gzfile($archiveDir . '/' . $key . '.jsonl.gz');
+            } elseif (file_exists($historyDir . '/' . $key . '.jsonl')) {
+                $lines = file($historyDir . '/' . $key . '.jsonl', FILE_IGNORE_NEW_LINES | FILE_SKIP_EMPTY_LINES);
+            } else {
+                continue;
+            }
+            if ($lines !== false) {
+                $vitals = array_merge($vitals, decodeHistoryLines($lines));
+            }
+        }
+    }
+    
+    $samples = [];
+    foreach ($vitals as $vital) {
+        if (!isset($vital[$metric])) {
+            continue;
+        }
+        if (isset($vital['timestamp_ms'])) {
+            $timeMs = $vital['timestamp_ms'];
+        } else {
+            $time = new DateTime($vital['timestamp']);
+            $timeMs = (int)$time->format('U') * 1000 + intdiv((int)$time->format('u'), 1000);
+        }
+        if ($timeMs >= $from * 1000 && $timeMs <= $to * 1000) {
+            $samples[] = [$timeMs, $vital[$metric], $vital[$metric], $vital[$metric]];
+        }
+    }
+    return $samples;
+}
+
+/**
+ * [bucket start ms, avg, min, max] of a metric from the coarsest sufficient rollup tier,
+ * falling back to coarser tiers when its retention already dropped the range
+ */
+function readRollupSamples($metric, $from, $to, $maxPoints) {
+    $tierNames = array_keys(rollupTiers());
+    $tierName = pickRollupTier(($to - $from) / $maxPoints);
+    
+    foreach (array_slice($tierNames, array_search($tierName, $tierNames)) as $tierName) {
+        $samples = [];
+        foreach (readRollupRecords($tierName, $from, $to) as $record) {
+            if (!empty($record[$metric])) {
+                [$count, $sum, $min, $max] = $record[$metric];
+                $samples[] = [$record['t'] * 1000, round($sum / $count, 2), $min, $max];
+            }
+        }
+        if (!empty($samples)) {
+            return [$tierName, $samples];
+        }
+    }
+    return [$tierName, []];
+}
+
+/**
+ * Largest-Triangle-Three-Buckets: keep the first and last point, and from every bucket
+ * in between the point forming the largest triangle with the previously kept point and
+ * the average of the next bucket
+ */
+function lttbDownsample($points, $maxPoints) {
+    $count = count($points);
+    if ($count <= $maxPoints || $maxPoints < 3) {
+        return $points;
+    }
+    
+    $sampled = [$points[0]];
+    $every = ($count - 2) / ($maxPoints - 2);
+    $previous = 0;
+    for ($bucket = 0; $bucket < $maxPoints - 2; $bucket++) {
+        $start = (int)($bucket * $every) + 1;
+        $end = (int)(($bucket + 1) * $every) + 1;
+        
+        // Average point of the next bucket (the last point for the last bucket)
+        $nextStart = $end;
+        $nextEnd = min((int)(($bucket + 2) * $every) + 1, $count);
+        if ($nextStart >= $nextEnd) {
+            $nextStart = $count - 1;
+            $nextEnd = $count;
+        }
+        $avgT = 0;
+        $avgV = 0;
+        for ($i = $nextStart; $i < $nextEnd; $i++) {
+            $avgT += $points[$i][0];
+            $avgV += $points[$i][1];
+        }
+        $avgT /= $nextEnd - $nextStart;
+        $avgV /= $nextEnd - $nextStart;
+        
+        [$prevT, $prevV] = $points[$previous];
+        $best = $start;
+        $bestArea = -1.0;
+        for ($i = $start; $i < $end; $i++) {
+            $area = abs(($prevT - $avgT) * ($points[$i][1] - $prevV) - ($prevT - $points[$i][0]) * ($avgV - $prevV));
+            if ($area > $bestArea) {
+                $best = $i;
+                $bestArea = $area;
+            }
+        }
+        
+        $sampled[] = $points[$best];
+        $previous = $best;
+    }
+    
+    $sampled[] = $points[$count - 1];
+    return $sampled;
+}
+
+/**
+ * Lowest and highest point of a bucket, in time order, once when they are the same
+ */
+function bucketExtremes($lowest, $highest) {
+    if ($lowest == $highest) {
+        return [$lowest];
+    }
+    return $lowest <= $highest ? [$lowest, $highest] : [$highest, $lowest];
+}
+
+/**
+ * Lowest and highest point of each of $maxPoints / 2 equal time buckets, so spikes survive however long the range is
+ */
+function minMaxDownsample($samples, $maxPoints, $fromMs, $toMs) {
+    $buckets = max(intdiv($maxPoints, 2), 1);
+    $width = max($toMs - $fromMs, 1) / $buckets;
+    
+    $sampled = [];
+    $current = null;
+    $lowest = null;
+    $highest = null;
+    foreach ($samples as [$time, $value, $low, $high]) {
+        // Rollup buckets may start before the range
+        $index = min(max((int)(($time - $fromMs) / $width), 0), $buckets - 1);
+        if ($index !== $current) {
+            if ($current !== null) {
+                array_push($sampled, ...bucketExtremes($lowest, $highest));
+            }
+            $current = $index;
+            $lowest = [$time, $low];
+            $highest = [$time, $high];
+            continue;
+        }
+        if ($low < $lowest[1]) {
+            $lowest = [$time, $low];
+        }
+        if ($high > $highest[1]) {
+            $highest = [$time, $high];
+        }
+    }
+    
+    if ($current !== null) {
+        array_push($sampled, ...bucketExtremes($lowest, $highest));
+    }
+    return $sampled;
+}
+
+/**
+ * Get at most max_points [epoch ms, value] points of one metric over a time range,
+ * downsampled from raw history for short ranges and from rollups for long ones
+ */
+function handleOwletSeries() {
+    $metric = $_GET['metric'] ?? 'heart_rate';
+    if (!in_array($metric, ['heart_rate', 'oxygen_saturation', 'skin_temperature', 'movement'], true)) {
+        sendError('Unknown metric');
+    }
+    $method = $_GET['method'] ?? 'lttb';
+    if (!in_array($method, ['lttb', 'minmax'], true)) {
+        sendError('Unknown downsampling method');
+    }
+    
+    $to = parseRangeTime($_GET['to'] ?? null, time());
+    $from = parseRangeTime($_GET['from'] ?? null, $to === null ? null : $to - 86400);
+    if ($from === null || $to === null || $from > $to) {
+        sendError('Invalid time range');
+    }
+    $maxPoints = min(max((int)($_GET['max_points'] ?? 500), 3), 5000);
+    
+    // Raw history while the range spans at most 240 seconds (4 readings at the default interval) per wanted point
+    if ($to - $from <= $maxPoints * 240) {
+        $source = 'raw';
+        $samples = readRawSamples($metric, $from, $to);
+    } else {
+        [$source, $samples] = readRollupSamples($metric, $from, $to, $maxPoints);
+    }
+    
+    if ($method === 'lttb') {
+        $points = array_map(function($sample) {
+            return [$sample[0], $sample[1]];
+        }, lttbDownsample($samples, $maxPoints));
+    } else {
+        $points = minMaxDownsample($samples, $maxPoints, $from * 1000, $to * 1000);
+    }
+    
+    sendJsonResponse([
+        'metric' => $metric,
+        'method' => $method,
+        'source' => $source,
+        'from' => gmdate('Y-m-d\\TH:i:s\\Z', $from),
+        'to' => gmdate('Y-m-d\\TH:i:s\\Z', $to),
+        'input_points' => count($samples),
+        'points' => $points
+    ]);
+}
+
 // ============================================
 // ROUTING LOGIC
 // ============================================
@@ -341,6 +991,15 @@ if ($_SERVER['REQUEST_METHOD'] == 'GET') {
     elseif (isset($_GET['todays_hourly']) && $_GET['todays_hourly'] === 'true') {
         handleOwletTodaysHourly();
     }
+    elseif (isset($_GET['devices']) && $_GET['devices'] === 'true') {
+        handleOwletDevices();
+    }
+    elseif (isset($_GET['range']) && $_GET['range'] === 'true') {
+        handleOwletRange();
+    }
+    elseif (isset($_GET['series']) && $_GET['series'] === 'true') {
+        handleOwletSeries();
+    }
     else {
         // Default: return all events
         handleEventsGet();
@@ -7,6 +7,7 @@ import { showAlertToast, closeOwletView } from './ui.js';
 import { playAlertSound, formatVitalStatus, getColorForStatus } from './utils.js';
 
 let owletAutoRefreshInterval = null;
+let owletStream = null;
 let lastAlertTime = {};
 let owletTouchStartX = 0;
 let owletTouchStartY = 0;
@@ -20,11 +21,85 @@ export function openOwletViewHandler() {
     loadOwletData();
     setupOwletSwipeGesture();
     
-    if (owletAutoRefreshInterval) clearTimeout(owletAutoRefreshInterval);
+    // Live push from the sync service, polling when the stream is unavailable
+    if (!connectOwletStream()) {
+        startOwletPolling();
+    }
+}
+
+// SSE endpoint of the sync service (push_server_enabled in owlet_config.json).
+// Opt-in: without window.OWLET_STREAM_URL the page polls and never opens a
+// stream connection the server would refuse.
+function getOwletStreamUrl() {
+    return window.OWLET_STREAM_URL || null;
+}
+
+function connectOwletStream() {
+    const url = getOwletStreamUrl();
+    if (!url || !window.EventSource) return false;
+    
+    closeOwletStream();
+    let opened = false;
+    
+    try {
+        owletStream = new EventSource(url);
+    } catch (error) {
+        console.warn('Owlet stream unavailable:', error);
+        owletStream = null;
+        return false;
+    }
+    
+    owletStream.onopen = () => {
+        opened = true;
+        stopOwletPolling();
+    };
+    
+    owletStream.addEventListener('vital', (e) => {
+        const statusDiv = document.getElementById('owletStatus');
+        if (!statusDiv) return;
+        
+        const { primary, vital } = JSON.parse(e.data);
+        if (!primary) return;
+        
+        checkAndShowAlerts(vital);
+        renderVitalsDisplay(statusDiv, vital);
+    });
+    
+    owletStream.onerror = () => {
+        // Never connected: no push server, poll instead. A dropped stream
+        // reconnects by itself and polls in the meantime.
+        if (!opened || owletStream.readyState === EventSource.CLOSED) {
+            closeOwletStream();
+        }
+        startOwletPolling();
+    };
+    
+    return true;
+}
+
+function closeOwletStream() {
+    if (owletStream) {
+        owletStream.close();
+        owletStream = null;
+    }
+}
+
+function stopOwletPolling() {
+    if (owletAutoRefreshInterval) {
+        clearTimeout(owletAutoRefreshInterval);
+        owletAutoRefreshInterval = null;
+    }
+}
+
+function startOwletPolling() {
+    if (owletAutoRefreshInterval) return;
     const scheduleOwletRefresh = () => {
         if (document.getElementById('owletView')?.classList.contains('active')) {
             loadOwletData().finally(() => {
-                owletAutoRefreshInterval = setTimeout(scheduleOwletRefresh, 5000); // 5 sec refresh
+                // Not re-armed once the stream took over while loading
+                if (owletAutoRefreshInterval) {
+                    owletAutoRefreshInterval = setTimeout(scheduleOwletRefresh, 5000); // 5 sec refresh
+                }
             });
         } else {
             if (owletAutoRefreshInterval) {
@@ -194,10 +269,8 @@ export function closeOwletViewHandler() {
     if (owletView) owletView.classList.remove('active');
     if (gridContainer) gridContainer.classList.remove('hidden');
     
-    if (owletAutoRefreshInterval) {
-        clearTimeout(owletAutoRefreshInterval);
-        owletAutoRefreshInterval = null;
-    }
+    closeOwletStream();
+    stopOwletPolling();
 }
 
 // Global functions for onclick handlers
@@ -0,0 +1,233 @@
+# ============================================
+# AGGREGATOR.PY - Incremental hourly and daily aggregation
+# ============================================
+
+import math
+import logging
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Aggregated metric -> decimals used when rounding (avg, min/max/percentiles)
+AGGREGATED_METRICS = {
+    'heart_rate': (1, None),
+    'oxygen_saturation': (1, None),
+    'skin_temperature': (2, 2),
+}
+
+PERCENTILES = (5, 50, 95)
+
+# Oxygen saturation below this (%) counts towards time in desaturation
+LOW_OXYGEN_THRESHOLD = 90
+
+def nearest_rank(count, percentile):
+    """Zero-based index of a nearest-rank percentile in sorted data"""
+    return max(math.ceil(percentile / 100 * count) - 1, 0)
+
+def format_metric(name, count, total, minimum, maximum, std, percentiles, minutes_below=None):
+    """Summary dict of one metric in the daily summary format"""
+    avg_decimals, range_decimals = AGGREGATED_METRICS[name]
+    
+    def rounded(value):
+        value = float(value)
+        return round(value, range_decimals) if range_decimals is not None else value
+    
+    if not count:
+        result = {'avg': None, 'min': None, 'max': None, 'std': None}
+        result.update({f'p{p}': None for p in PERCENTILES})
+    else:
+        result = {
+            'avg': round(float(total) / count, avg_decimals),
+            'min': rounded(minimum),
+            'max': rounded(maximum),
+            'std': round(float(std), 2),
+        }
+        for p, value in zip(PERCENTILES, percentiles):
+            result[f'p{p}'] = rounded(value)
+    
+    if name == 'oxygen_saturation':
+        result[f'minutes_below_{LOW_OXYGEN_THRESHOLD}'] = round(float(minutes_below or 0), 1)
+    return result
+
+class MetricAccumulator:
+    """Running count/sum/min/max/variance of one metric, updated in O(1)"""
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self.m2 = 0.0
+        # Readings are discrete (whole bpm/%/degrees), so a value -> count
+        # histogram stays small and gives exact percentiles
+        self.histogram = {}
+    
+    def add(self, value):
+        """Add one reading (Welford's online variance)"""
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+        
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        
+        key = round(value, 2)
+        self.histogram[key] = self.histogram.get(key, 0) + 1
+    
+    def merge(self, other):
+        """Merge another accumulator into this one (Chan's parallel variance)"""
+        if not other.count:
+            return
+        for key, count in other.histogram.items():
+            self.histogram[key] = self.histogram.get(key, 0) + count
+        
+        if not self.count:
+            self.count, self.total = other.count, other.total
+            self.min, self.max = other.min, other.max
+            self.mean, self.m2 = other.mean, other.m2
+            return
+        
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+    
+    def stddev(self):
+        """Population standard deviation"""
+        if not self.count:
+            return None
+        return math.sqrt(self.m2 / self.count)
+    
+    def percentiles(self):
+        """Nearest-rank percentiles from the histogram"""
+        ranks = [nearest_rank(self.count, p) for p in PERCENTILES]
+        results = []
+        seen = 0
+        for key in sorted(self.histogram):
+            seen += self.histogram[key]
+            while len(results) < len(ranks) and ranks[len(results)] < seen:
+                results.append(key)
+        return results
+    
+    def count_below(self, threshold):
+        """Number of readings below a threshold"""
+        return sum(count for key, count in self.histogram.items() if key < threshold)
+    
+    def to_dict(self, name, sample_interval_seconds=60):
+        """Summary dict in the daily summary format"""
+        minutes_below = None
+        if name == 'oxygen_saturation':
+            minutes_below = self.count_below(LOW_OXYGEN_THRESHOLD) * sample_interval_seconds / 60
+        
+        return format_metric(
+            name, self.count, self.total, self.min, self.max,
+            self.stddev(), self.percentiles(), minutes_below
+        )
+
+class HourAccumulator:
+    """Running aggregates of all vitals within one hour"""
+    
+    def __init__(self, hour):
+        self.hour = hour
+        self.data_points = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.metrics = {name: MetricAccumulator() for name in AGGREGATED_METRICS}
+    
+    def add(self, vital):
+        """Add one vital"""
+        self.data_points += 1
+        timestamp = vital.get('timestamp')
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        self.last_timestamp = timestamp
+        
+        for name, accumulator in self.metrics.items():
+            value = vital.get(name)
+            if value is not None:
+                accumulator.add(value)
+    
+    def merge(self, other):
+        """Merge another hour's accumulators into this one"""
+        if not other.data_points:
+            return
+        self.data_points += other.data_points
+        if self.first_timestamp is None or other.first_timestamp < self.first_timestamp:
+            self.first_timestamp = other.first_timestamp
+        if self.last_timestamp is None or other.last_timestamp > self.last_timestamp:
+            self.last_timestamp = other.last_timestamp
+        for name, accumulator in self.metrics.items():
+            accumulator.merge(other.metrics[name])
+    
+    def to_summary(self, sample_interval_seconds=60):
+        """Metrics in the format of an hourly/daily summary entry"""
+        summary = {'data_points': self.data_points}
+        for name, accumulator in self.metrics.items():
+            summary[name] = accumulator.to_dict(name, sample_interval_seconds)
+        return summary
+
+class DailyAggregator:
+    """Per-hour accumulators for one local day"""
+    
+    def __init__(self, date, sample_interval_seconds=60):
+        self.date = date
+        self.sample_interval_seconds = sample_interval_seconds
+        self.hours = [HourAccumulator(hour) for hour in range(24)]
+        self.closed_hours = set()
+    
+    def add(self, vital, hour):
+        """Add a vital to the accumulator of its local hour"""
+        self.hours[hour].add(vital)
+    
+    def close_hours_before(self, hour):
+        """Mark all hours before the given hour closed, return True if any newly closed"""
+        newly_closed = set(range(min(hour, 24))) - self.closed_hours
+        self.closed_hours |= newly_closed
+        return bool(newly_closed)
+    
+    def hour_entry(self, accumulator):
+        """Hourly summary entry for one hour"""
+        if not accumulator.data_points:
+            return {'hour': accumulator.hour, 'data_points': 0}
+        entry = accumulator.to_summary(self.sample_interval_seconds)
+        entry['hour'] = accumulator.hour
+        return entry
+    
+    def to_todays_hourly(self):
+        """Closed hours with data, in the owlet_todays_hourly.json format"""
+        hourly = [
+            self.hour_entry(self.hours[hour])
+            for hour in sorted(self.closed_hours)
+            if self.hours[hour].data_points
+        ]
+        return {
+            'date': self.date.isoformat(),
+            'hourly': hourly,
+            'total_hours': len(hourly),
+            'last_update': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+        }
+    
+    def to_daily_summary(self):
+        """Daily summary built by merging the 24 hourly accumulators"""
+        day = HourAccumulator(None)
+        for accumulator in self.hours:
+            day.merge(accumulator)
+        
+        if not day.data_points:
+            return None
+        
+        return {
+            'date': self.date.isoformat(),
+            'total_data_points': day.data_points,
+            'first_timestamp': day.first_timestamp,
+            'last_timestamp': day.last_timestamp,
+            'daily': day.to_summary(self.sample_interval_seconds),
+            'hourly': [self.hour_entry(accumulator) for accumulator in self.hours],
+        }
@@ -2,60 +2,199 @@
 # API_CLIENT.PY - Owlet API communication
 # ============================================
 
+import asyncio
+import os
+import time
 import logging
 
+from .token_cache import TokenCache
+from .metrics import metrics
+
 logger = logging.getLogger(__name__)
 
 try:
     from pyowletapi.api import OwletAPI
     from pyowletapi.sock import Sock
+    from pyowletapi.exceptions import OwletAuthenticationError, OwletCredentialsError
+    AUTH_ERRORS = (OwletAuthenticationError, OwletCredentialsError)
 except ImportError:
     logger.error("pyowletapi not installed. Run: pip install pyowletapi")
     OwletAPI = None
     Sock = None
+    AUTH_ERRORS = ()
 
 class OwletAPIClient:
     """Handle Owlet API authentication and communication"""
     
-    def __init__(self, config):
+    def __init__(self, config, api_factory=None, sock_factory=None, base_dir=''):
         self.config = config
         self.api = None
+        
+        # Overridable for running against a local fake API
+        self.api_factory = api_factory or OwletAPI
+        self.sock_factory = sock_factory or Sock
+        
+        # Tokens survive restarts so a restart does not need a fresh login
+        token_cache_file = self.config.get('token_cache_file', 'owlet_token_cache.json')
+        if base_dir and not os.path.isabs(token_cache_file):
+            token_cache_file = os.path.join(base_dir, token_cache_file)
+        self.token_cache = TokenCache(
+            token_cache_file,
+            self.config.get('region', 'us-east-1'),
+            self.config.get('email')
+        )
+        self.saved_tokens = None
+        
+        # Sock objects by DSN, reused across ticks
+        self.socks = {}
+        self.last_discovery_time = None
     
     async def authenticate(self):
         """Authenticate with Owlet API"""
         if self.api is not None:
-            return True
+            return await self.refresh_if_expiring()
         
-        if not OwletAPI:
+        if not self.api_factory:
             logger.error("pyowletapi not available")
             return False
         
-        try:
-            region = self.config.get('region', 'us-east-1')
-            email = self.config.get('email')
-            password = self.config.get('password')
-            
-            if not email or not password:
-                logger.error("Email or password not configured")
+        region = self.config.get('region', 'us-east-1')
+        email = self.config.get('email')
+        password = self.config.get('password')
+        
+        if not email or not password:
+            logger.error("Email or password not configured")
+            return False
+        
+        cached_tokens = self.token_cache.load()
+        if cached_tokens:
+            try:
+                self.api = self.api_factory(
+                    region, email, password,
+                    token=cached_tokens['api_token'],
+                    expiry=cached_tokens['expiry'],
+                    refresh=cached_tokens['refresh']
+                )
+                await self.api.authenticate()
+                self.on_authenticated()
+                metrics.inc('owlet_auth_total', kind='cached')
+                logger.info("Resumed Owlet API session from cached tokens")
+                return True
+            except AUTH_ERRORS as e:
+                metrics.inc('owlet_api_errors_total', operation='auth')
+                logger.warning(f"Cached tokens rejected, logging in again: {e}")
+                await self.discard_session(clear_cache=True)
+            except Exception as e:
+                # Transient (network, timeout): the cached tokens stay for the next tick
+                metrics.inc('owlet_api_errors_total', operation='auth')
+                logger.warning(f"Could not resume session from cached tokens, retrying next tick: {e}")
+                await self.discard_session()
                 return False
-            
-            self.api = OwletAPI(region, email, password)
+        
+        try:
+            self.api = self.api_factory(region, email, password)
             await self.api.authenticate()
+            self.on_authenticated()
+            metrics.inc('owlet_auth_total', kind='login')
             logger.info("Successfully authenticated with Owlet API")
             return True
         except Exception as e:
+            metrics.inc('owlet_api_errors_total', operation='auth')
             logger.error(f"Authentication failed: {e}")
-            self.api = None
+            await self.discard_session(clear_cache=isinstance(e, AUTH_ERRORS))
             return False
     
-    async def fetch_device_data(self):
-        """Fetch device data from Owlet"""
+    def on_authenticated(self):
+        """Reset per-session state after a (re)login"""
+        # Cached socks hold the previous API object
+        self.socks = {}
+        self.last_discovery_time = None
+        self.save_tokens()
+    
+    def save_tokens(self):
+        """Persist the session's tokens if they changed"""
+        tokens = getattr(self.api, 'tokens', None)
+        if tokens and tokens != self.saved_tokens:
+            if self.token_cache.save(tokens):
+                self.saved_tokens = dict(tokens)
+    
+    async def refresh_if_expiring(self):
+        """Refresh the auth token shortly before it expires"""
+        tokens = getattr(self.api, 'tokens', None) or {}
+        expiry = tokens.get('expiry')
+        margin_seconds = self.config.get('token_refresh_margin_seconds', 300)
+        
+        if expiry is None or expiry - time.time() > margin_seconds:
+            return True
+        
+        try:
+            await self.api.refresh_authentication()
+            self.save_tokens()
+            metrics.inc('owlet_auth_total', kind='refresh')
+            logger.info("Refreshed Owlet API token")
+            return True
+        except AUTH_ERRORS as e:
+            metrics.inc('owlet_api_errors_total', operation='refresh')
+            logger.warning(f"Token refresh rejected, logging in again: {e}")
+            await self.discard_session(clear_cache=True)
+            return await self.authenticate()
+        except Exception as e:
+            # Transient: the current token stays usable until it actually expires
+            metrics.inc('owlet_api_errors_total', operation='refresh')
+            logger.warning(f"Token refresh failed, retrying next tick: {e}")
+            return True
+    
+    async def discard_session(self, clear_cache=False):
+        """Drop the API session, e.g. after its tokens were rejected"""
+        api, self.api = self.api, None
+        self.socks = {}
+        self.last_discovery_time = None
+        self.saved_tokens = None
+        if clear_cache:
+            self.token_cache.clear()
+        
+        if api is not None and getattr(api, 'session', None):
+            try:
+                await api.session.close()
+            except Exception as e:
+                logger.warning(f"Error closing API session: {e}")
+    
+    async def call_with_retry(self, description, func):
+        """Retry transient failures on the existing session"""
+        attempts = 1 + self.config.get('api_retry_attempts', 2)
+        delay_seconds = self.config.get('api_retry_delay_seconds', 1)
+        
+        for attempt in range(attempts):
+            try:
+                return await func()
+            except AUTH_ERRORS:
+                raise
+            except Exception as e:
+                if attempt + 1 >= attempts:
+                    raise
+                metrics.inc('owlet_api_errors_total', operation='retried')
+                logger.warning(f"{description} failed ({e}), retrying on the existing session")
+                await asyncio.sleep(delay_seconds * (attempt + 1))
+    
+    def should_discover_devices(self):
+        """Check if the device list should be fetched again"""
+        if not self.socks or self.last_discovery_time is None:
+            return True
+        
+        interval_seconds = self.config.get('device_discovery_interval_seconds', 3600)
+        return time.monotonic() - self.last_discovery_time >= interval_seconds
+    
+    async def discover_devices(self):
+        """Discover all devices on the account, returns Sock objects by DSN"""
         if not self.api:
             logger.error("API not authenticated")
-            return None
+            return {}
+        
+        if not self.should_discover_devices():
+            return self.socks
         
         try:
-            devices = await self.api.get_devices()
+            devices = await self.call_with_retry("Device discovery", self.api.get_devices)
             
             # Handle response wrapper
             if isinstance(devices, dict) and 'response' in devices:
@@ -65,37 +204,87 @@ class OwletAPIClient:
             
             if not devices_list or len(devices_list) == 0:
                 logger.warning("No devices found")
-                return None
-            
-            # Get first device
-            if isinstance(devices_list[0], dict) and 'device' in devices_list[0]:
-                device_data = devices_list[0]['device']
-            else:
-                device_data = devices_list[0]
-            
-            if not device_data:
-                logger.error("Invalid device data")
-                return None
+                return {}
             
-            logger.info(f"Creating Sock object for device: {device_data.get('dsn', 'unknown')}")
-            sock = Sock(self.api, device_data)
-            await sock.update_properties()
+            socks = {}
+            for entry in devices_list:
+                if isinstance(entry, dict) and 'device' in entry:
+                    device_data = entry['device']
+                else:
+                    device_data = entry
+                
+                if not device_data or not device_data.get('dsn'):
+                    logger.error("Invalid device data")
+                    continue
+                
+                dsn = device_data['dsn']
+                sock = self.socks.get(dsn)
+                if sock is None:
+                    logger.info(f"Creating Sock object for device: {dsn}")
+                    sock = self.sock_factory(self.api, device_data)
+                socks[dsn] = sock
             
-            logger.info(f"Successfully fetched device data")
+            self.socks = socks
+            self.last_discovery_time = time.monotonic()
+            self.save_tokens()
+            logger.info(f"Discovered {len(socks)} device(s)")
+            return self.socks
+        except AUTH_ERRORS as e:
+            metrics.inc('owlet_api_errors_total', operation='discover')
+            logger.error(f"Failed to discover devices, session rejected: {e}")
+            await self.discard_session()
+            return {}
+        except Exception as e:
+            # Keep the session and any known socks, the next tick tries again
+            metrics.inc('owlet_api_errors_total', operation='discover')
+            logger.error(f"Failed to discover devices: {e}")
+            return self.socks
+    
+    async def update_device(self, dsn):
+        """Fetch current properties of one device"""
+        sock = self.socks.get(dsn)
+        if sock is None:
+            logger.error(f"Unknown device: {dsn}")
+            return None
+        
+        # A slow device gives up on its own instead of holding back the others
+        timeout_seconds = self.config.get('device_timeout_seconds', 20)
+        try:
+            await asyncio.wait_for(
+                self.call_with_retry(f"Fetching {dsn}", sock.update_properties),
+                timeout_seconds
+            )
+            self.save_tokens()
+            logger.info("Successfully fetched device data for %s", dsn)
             return sock
+        except asyncio.TimeoutError:
+            metrics.inc('owlet_api_errors_total', operation='fetch_timeout')
+            logger.warning(f"Timed out fetching device data for {dsn}")
+            return None
+        except AUTH_ERRORS as e:
+            metrics.inc('owlet_api_errors_total', operation='fetch')
+            logger.error(f"Failed to fetch device data for {dsn}, session rejected: {e}")
+            await self.discard_session()
+            return None
         except Exception as e:
-            logger.error(f"Failed to fetch device data: {e}")
-            self.api = None
+            metrics.inc('owlet_api_errors_total', operation='fetch')
+            logger.error(f"Failed to fetch device data for {dsn}: {e}")
             return None
     
+    async def fetch_all_devices(self):
+        """Fetch data of every device concurrently, returns updated socks by DSN"""
+        socks = await self.discover_devices()
+        results = await asyncio.gather(*(self.update_device(dsn) for dsn in socks))
+        return {dsn: sock for dsn, sock in zip(socks, results) if sock}
+    
+    async def fetch_device_data(self):
+        """Fetch device data of the first device"""
+        socks = await self.fetch_all_devices()
+        return next(iter(socks.values()), None)
+    
     async def close(self):
-        """Close API session"""
+        """Close API session (cached tokens are kept for the next start)"""
         if self.api:
-            try:
-                if hasattr(self.api, 'session') and self.api.session:
-                    await self.api.session.close()
-                self.api = None
-                logger.info("API session closed")
-            except Exception as e:
-                logger.warning(f"Error closing API session: {e}")
-
+            self.save_tokens()
+            await self.discard_session()
+            logger.info("API session closed")
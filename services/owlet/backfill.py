@@ -0,0 +1,182 @@
+# ============================================
+# BACKFILL.PY - Offline replay of history into daily summaries
+# ============================================
+
+import os
+import math
+import time
+import logging
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+import pytz
+
+from .aggregator import AGGREGATED_METRICS
+from .data_processor import VitalDataProcessor
+from .file_manager import OwletFileManager
+from .history_store import HistoryStore, iter_segment_file
+from .raw_archive import RawArchiveWriter, write_raw_archive
+from .sqlite_store import OwletDatabase
+from .time_index import vital_epoch_ms
+
+logger = logging.getLogger(__name__)
+
+def parse_date_range(value):
+    """Parse 'YYYY-MM-DD' or 'YYYY-MM-DD:YYYY-MM-DD' into (start, end) dates"""
+    start, _, end = value.partition(':')
+    start_date = datetime.strptime(start, '%Y-%m-%d').date()
+    end_date = datetime.strptime(end, '%Y-%m-%d').date() if end else start_date
+    if end_date < start_date:
+        raise ValueError(f"Backfill range ends before it starts: {value}")
+    return start_date, end_date
+
+def local_day_bounds(tz, date):
+    """UTC epoch seconds [start, end) of a local day"""
+    day_start = tz.localize(datetime.combine(date, datetime.min.time()))
+    next_day_start = tz.localize(datetime.combine(date + timedelta(days=1), datetime.min.time()))
+    return day_start.timestamp(), next_day_start.timestamp()
+
+def day_segment_paths(segments, tz, date):
+    """Paths of the hourly UTC segments overlapping a local day, oldest first"""
+    day_start, day_end = local_day_bounds(tz, date)
+    hour = datetime.fromtimestamp(day_start, timezone.utc).replace(minute=0, second=0, microsecond=0)
+    paths = []
+    while hour.timestamp() < day_end:
+        path = segments.get(hour.strftime(HistoryStore.SEGMENT_KEY_FORMAT))
+        if path:
+            paths.append(path)
+        hour += timedelta(hours=1)
+    return paths
+
+def iter_source(source):
+    """Stream the vitals of a backfill source: segment files or a SQLite range"""
+    kind, location = source
+    if kind == 'sqlite':
+        path, t0_ms, t1_ms = location
+        database = OwletDatabase(path)
+        try:
+            yield from database.iter_vitals(t0_ms, t1_ms)
+        finally:
+            database.close()
+        return
+    
+    for path in location:
+        yield from iter_segment_file(path)
+
+def iter_day(source, day_start, day_end):
+    """(epoch seconds, vital) of the vitals of a source inside [day_start, day_end)"""
+    for vital in iter_source(source):
+        try:
+            ts = vital_epoch_ms(vital) / 1000
+        except Exception:
+            continue
+        if day_start <= ts < day_end:
+            yield ts, vital
+
+def summarize_day(date_iso, source, timezone_name, sample_interval_seconds, summarize=True,
+                  raw_archive_path=None, compression='zlib'):
+    """Worker: stream one day's vitals, return its daily summary and write its raw archive"""
+    tz = pytz.timezone(timezone_name)
+    date = datetime.strptime(date_iso, '%Y-%m-%d').date()
+    day_start, day_end = local_day_bounds(tz, date)
+    
+    # Summary columns and the archive's current hour only, the day's vitals are never held in memory
+    timestamps = array('d')
+    metrics = {name: array('d') for name in AGGREGATED_METRICS}
+    writer = RawArchiveWriter(raw_archive_path, tz, date, compression) if raw_archive_path else None
+    in_order = True
+    try:
+        for ts, vital in iter_day(source, day_start, day_end):
+            timestamps.append(ts)
+            for name, column in metrics.items():
+                value = vital.get(name)
+                column.append(math.nan if value is None else value)
+            if writer is not None and in_order:
+                in_order = writer.add(vital)
+        
+        if writer is not None:
+            if in_order:
+                writer.close()
+            else:
+                # Hours out of order: a second pass groups the whole day in memory
+                writer.abort()
+                write_raw_archive(raw_archive_path, (vital for _, vital in iter_day(source, day_start, day_end)),
+                                  tz, date, compression)
+    except Exception:
+        if writer is not None:
+            writer.abort()
+        raise
+    
+    summary = None
+    if summarize:
+        summary = VitalDataProcessor(tz, sample_interval_seconds).summarize_columns(timestamps, metrics)
+    return date_iso, summary, len(timestamps)
+
+def day_source(file_manager, segments, tz, date):
+    """Picklable description of where a day's vitals are, None without data"""
+    if file_manager.database:
+        day_start, day_end = local_day_bounds(tz, date)
+        t0_ms, t1_ms = int(day_start * 1000), int(day_end * 1000)
+        if not file_manager.database.count_vitals(t0_ms, t1_ms):
+            return None
+        return 'sqlite', (file_manager.database.path, t0_ms, t1_ms)
+    
+    paths = day_segment_paths(segments, tz, date)
+    return ('segments', paths) if paths else None
+
+def run_backfill(config_loader, start_date, end_date, workers=None, base_dir='', missing_only=False):
+    """Rebuild the daily summaries and raw archives of a date range from live and archived history"""
+    tz = config_loader.timezone
+    sample_interval_seconds = config_loader.get('history_interval_seconds', 60)
+    file_manager = OwletFileManager(tz, config_loader, base_dir=base_dir)
+    segments = None if file_manager.database else file_manager.history_store.list_all_segments()
+    
+    # Today is still being aggregated by the running service
+    yesterday = datetime.now(timezone.utc).astimezone(tz).date() - timedelta(days=1)
+    if end_date > yesterday:
+        logger.info(f"Backfill stops at {yesterday}, today's summary is written at midnight")
+        end_date = yesterday
+    
+    jobs = []
+    date = start_date
+    while date <= end_date:
+        summarize = not (missing_only and file_manager.has_daily_summary(date))
+        raw_archive_path = file_manager.get_raw_archive_filename(date) if file_manager.raw_archive_enabled else None
+        if missing_only and raw_archive_path and os.path.exists(raw_archive_path):
+            raw_archive_path = None
+        
+        source = day_source(file_manager, segments, tz, date) if summarize or raw_archive_path else None
+        if source:
+            jobs.append((date.isoformat(), source, str(tz), sample_interval_seconds, summarize,
+                         raw_archive_path, file_manager.raw_archive_compression))
+        date += timedelta(days=1)
+    
+    if not jobs:
+        logger.info(f"Nothing to backfill between {start_date} and {end_date}")
+        return 0
+    
+    logger.info(f"Backfilling {len(jobs)} days with {workers or os.cpu_count()} workers...")
+    started = time.perf_counter()
+    rebuilt = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(summarize_day, *job): job[0] for job in jobs}
+        for future in as_completed(futures):
+            try:
+                date_iso, summary, data_points = future.result()
+            except Exception as e:
+                logger.error(f"Failed to backfill {futures[future]}: {e}")
+                continue
+            if summary:
+                file_manager.store_daily_summary(summary, datetime.strptime(date_iso, '%Y-%m-%d').date())
+            if data_points:
+                rebuilt += 1
+                logger.info(f"Rebuilt {date_iso} ({data_points} data points)")
+    
+    # The served snapshot is rebuilt from the summaries just written
+    file_manager.recent_summaries = None
+    file_manager.save_summaries_snapshot()
+    file_manager.close()
+    
+    logger.info(f"Backfilled {rebuilt} days in {time.perf_counter() - started:.1f}s")
+    return rebuilt
@@ -2,46 +2,64 @@
 # DATA_PROCESSOR.PY - Vital data extraction and aggregation
 # ============================================
 
+import math
 import logging
 from datetime import datetime, timezone, timedelta
 
+from .aggregator import (
+    AGGREGATED_METRICS, PERCENTILES, LOW_OXYGEN_THRESHOLD, nearest_rank, format_metric
+)
+from .time_index import epoch_ms, vital_epoch_ms
+
 logger = logging.getLogger(__name__)
 
+# NumPy is optional, aggregation falls back to pure Python without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 class VitalDataProcessor:
     """Process and aggregate vital data"""
     
-    def __init__(self, timezone_obj):
+    def __init__(self, timezone_obj, sample_interval_seconds=60):
         self.timezone = timezone_obj
+        self.sample_interval_seconds = sample_interval_seconds
     
     def extract_vital_data(self, sock):
         """Extract vital signs from sock data"""
         try:
             props = sock.properties if hasattr(sock, 'properties') else {}
+            vital = self.vital_from_properties(props, datetime.now(timezone.utc))
             
-            vital = {
-                'timestamp': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
-                'heart_rate': props.get('heart_rate'),
-                'oxygen_saturation': props.get('oxygen_saturation'),
-                'oxygen_10_av': props.get('oxygen_10_av'),
-                'movement': props.get('movement'),
-                'battery_percentage': props.get('battery_percentage'),
-                'battery_minutes': props.get('battery_minutes'),
-                'signal_strength': props.get('signal_strength'),
-                'skin_temperature': props.get('skin_temperature'),
-                'sleep_state': props.get('sleep_state'),
-                'sock_connected': not props.get('sock_disconnected', False),
-                'sock_on': not props.get('sock_off', False),
-                'low_battery': props.get('low_battery_alert'),
-                'high_heart_rate': props.get('high_heart_rate_alert'),
-                'low_oxygen': props.get('low_oxygen_alert'),
-            }
-            
-            logger.info(f"Extracted vitals: HR={vital['heart_rate']}, O2={vital['oxygen_saturation']}%")
+            logger.info("Extracted vitals: HR=%s, O2=%s%%", vital['heart_rate'], vital['oxygen_saturation'])
             return vital
         except Exception as e:
             logger.error(f"Failed to extract vital data: {e}")
             return None
     
+    def vital_from_properties(self, props, now_utc):
+        """Build a vital record from sock properties read at now_utc"""
+        return {
+            'timestamp': now_utc.isoformat().replace('+00:00', 'Z'),
+            'timestamp_ms': epoch_ms(now_utc),
+            'heart_rate': props.get('heart_rate'),
+            'oxygen_saturation': props.get('oxygen_saturation'),
+            'oxygen_10_av': props.get('oxygen_10_av'),
+            'movement': props.get('movement'),
+            'battery_percentage': props.get('battery_percentage'),
+            'battery_minutes': props.get('battery_minutes'),
+            'charging': props.get('charging'),
+            'signal_strength': props.get('signal_strength'),
+            'skin_temperature': props.get('skin_temperature'),
+            'sleep_state': props.get('sleep_state'),
+            'sock_connected': not props.get('sock_disconnected', False),
+            'sock_on': not props.get('sock_off', False),
+            'low_battery': props.get('low_battery_alert'),
+            'high_heart_rate': props.get('high_heart_rate_alert'),
+            'low_oxygen': props.get('low_oxygen_alert'),
+        }
+    
     def detect_sleep_state(self, sock, recent_vitals=None):
         """Detect if baby is asleep"""
         try:
@@ -58,77 +76,154 @@ class VitalDataProcessor:
             return None
         
         try:
-            # Organize vitals by hour
-            hourly_vitals = {hour: [] for hour in range(24)}
-            
+            timestamps = []
+            metrics = {name: [] for name in AGGREGATED_METRICS}
             for vital in vitals:
                 try:
-                    vital_time = datetime.fromisoformat(vital['timestamp'].replace('Z', '+00:00'))
-                    vital_time_local = vital_time.astimezone(self.timezone)
-                    hour = vital_time_local.hour
-                    hourly_vitals[hour].append(vital)
+                    ts_ms = vital_epoch_ms(vital)
                 except Exception as e:
                     logger.warning(f"Could not parse vital timestamp: {e}")
+                    continue
+                
+                timestamps.append(ts_ms / 1000)
+                for name, column in metrics.items():
+                    value = vital.get(name)
+                    column.append(math.nan if value is None else value)
             
-            # Aggregate hourly data
-            hourly_data = []
-            for hour in range(24):
-                if hourly_vitals[hour]:
-                    agg = self._aggregate_metrics(hourly_vitals[hour])
-                    agg['hour'] = hour
-                    hourly_data.append(agg)
-                else:
-                    hourly_data.append({'hour': hour, 'data_points': 0})
-            
-            # Build summary
-            daily_agg = self._aggregate_metrics(vitals)
-            
-            try:
-                first_vital_time = datetime.fromisoformat(vitals[0]['timestamp'].replace('Z', '+00:00'))
-                first_vital_local = first_vital_time.astimezone(self.timezone)
-                summary_date = first_vital_local.strftime('%Y-%m-%d')
-            except:
-                summary_date = vitals[0]['timestamp'][:10]
-            
-            summary = {
-                'date': summary_date,
-                'total_data_points': len(vitals),
-                'first_timestamp': vitals[-1]['timestamp'],
-                'last_timestamp': vitals[0]['timestamp'],
-                'daily': daily_agg,
-                'hourly': hourly_data
-            }
-            
-            return summary
+            return self.summarize_columns(timestamps, metrics)
         except Exception as e:
             logger.error(f"Failed to aggregate vitals: {e}")
             return None
     
-    def _aggregate_metrics(self, vitals_list):
-        """Aggregate metrics from vitals list"""
-        if not vitals_list:
+    def summarize_columns(self, timestamps, metrics):
+        """Build a daily summary from columnar data (epoch seconds, NaN = missing)"""
+        if not len(timestamps):
             return None
         
-        heart_rates = [v.get('heart_rate') for v in vitals_list if v.get('heart_rate') is not None]
-        oxygen_sats = [v.get('oxygen_saturation') for v in vitals_list if v.get('oxygen_saturation') is not None]
-        temperatures = [v.get('skin_temperature') for v in vitals_list if v.get('skin_temperature') is not None]
+        hourly_data, daily_agg = self.aggregate_columns(timestamps, metrics)
+        
+        first_ts = min(timestamps)
+        last_ts = max(timestamps)
+        first_vital_local = datetime.fromtimestamp(first_ts, timezone.utc).astimezone(self.timezone)
         
         return {
-            'data_points': len(vitals_list),
-            'heart_rate': {
-                'avg': round(sum(heart_rates) / len(heart_rates), 1) if heart_rates else None,
-                'min': min(heart_rates) if heart_rates else None,
-                'max': max(heart_rates) if heart_rates else None,
-            },
-            'oxygen_saturation': {
-                'avg': round(sum(oxygen_sats) / len(oxygen_sats), 1) if oxygen_sats else None,
-                'min': min(oxygen_sats) if oxygen_sats else None,
-                'max': max(oxygen_sats) if oxygen_sats else None,
-            },
-            'skin_temperature': {
-                'avg': round(sum(temperatures) / len(temperatures), 2) if temperatures else None,
-                'min': round(min(temperatures), 2) if temperatures else None,
-                'max': round(max(temperatures), 2) if temperatures else None,
-            }
+            'date': first_vital_local.strftime('%Y-%m-%d'),
+            'total_data_points': len(timestamps),
+            'first_timestamp': self._format_timestamp(first_ts),
+            'last_timestamp': self._format_timestamp(last_ts),
+            'daily': daily_agg,
+            'hourly': hourly_data
         }
-
+    
+    def aggregate_columns(self, timestamps, metrics):
+        """Aggregate every metric for all 24 local hours, returns (hourly, daily)"""
+        if np is not None:
+            return self._aggregate_columns_numpy(timestamps, metrics)
+        return self._aggregate_columns_python(timestamps, metrics)
+    
+    def _format_timestamp(self, epoch):
+        """Format epoch seconds as vital timestamp"""
+        return datetime.fromtimestamp(epoch, timezone.utc).isoformat().replace('+00:00', 'Z')
+    
+    def _local_hour(self, epoch):
+        """Local hour of an epoch timestamp"""
+        return datetime.fromtimestamp(epoch, timezone.utc).astimezone(self.timezone).hour
+    
+    def _minutes_below(self, count):
+        """Minutes covered by a number of samples"""
+        return count * self.sample_interval_seconds / 60
+    
+    def _aggregate_columns_numpy(self, timestamps, metrics):
+        """Vectorized aggregation, one grouped pass per metric"""
+        ts = np.asarray(timestamps, dtype=np.float64)
+        
+        # UTC offsets are whole quarter hours, so resolving the local hour once
+        # per quarter-hour slot is exact and keeps the datetime work tiny
+        slots, slot_index = np.unique(np.floor_divide(ts, 900).astype(np.int64), return_inverse=True)
+        slot_hours = np.array([self._local_hour(slot * 900) for slot in slots], dtype=np.int64)
+        hours = slot_hours[slot_index.ravel()]
+        
+        data_points = np.bincount(hours, minlength=24)
+        hourly = [{'hour': hour, 'data_points': int(data_points[hour])} for hour in range(24)]
+        daily = {'data_points': len(ts)}
+        
+        for name in AGGREGATED_METRICS:
+            values = np.asarray(metrics[name], dtype=np.float64)
+            valid = ~np.isnan(values)
+            values = values[valid]
+            value_hours = hours[valid]
+            
+            # Sorting by (hour, value) makes every hour a sorted run, so min,
+            # max and percentiles are plain index lookups into that run
+            order = np.lexsort((values, value_hours))
+            sorted_values = values[order]
+            counts = np.bincount(value_hours, minlength=24)
+            sums = np.bincount(value_hours, weights=values, minlength=24)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            below = np.bincount(value_hours[values < LOW_OXYGEN_THRESHOLD], minlength=24)
+            
+            for hour in range(24):
+                if not data_points[hour]:
+                    continue
+                count = int(counts[hour])
+                run = sorted_values[starts[hour]:starts[hour] + count]
+                hourly[hour][name] = self._format_sorted(
+                    name, run, sums[hour], run.std() if count else None, below[hour]
+                )
+            
+            daily_sorted = np.sort(values)
+            daily[name] = self._format_sorted(
+                name, daily_sorted, sums.sum(), daily_sorted.std() if len(values) else None, below.sum()
+            )
+        
+        return hourly, daily
+    
+    def _format_sorted(self, name, sorted_values, total, std, below):
+        """Format one metric from its sorted values, sum and population std"""
+        count = len(sorted_values)
+        if not count:
+            return format_metric(name, 0, 0, None, None, None, [], self._minutes_below(below))
+        
+        percentiles = [sorted_values[nearest_rank(count, p)] for p in PERCENTILES]
+        return format_metric(
+            name, count, total, sorted_values[0], sorted_values[-1],
+            std, percentiles, self._minutes_below(below)
+        )
+    
+    def _aggregate_columns_python(self, timestamps, metrics):
+        """Pure-Python aggregation used when NumPy is not installed"""
+        hours = [self._local_hour(ts) for ts in timestamps]
+        
+        hourly_points = [0] * 24
+        for hour in hours:
+            hourly_points[hour] += 1
+        
+        hourly = [{'hour': hour, 'data_points': hourly_points[hour]} for hour in range(24)]
+        daily = {'data_points': len(timestamps)}
+        
+        for name in AGGREGATED_METRICS:
+            hourly_values = {hour: [] for hour in range(24)}
+            for hour, value in zip(hours, metrics[name]):
+                if value is not None and not math.isnan(value):
+                    hourly_values[hour].append(value)
+            
+            for hour in range(24):
+                if hourly_points[hour]:
+                    hourly[hour][name] = self._aggregate_values(name, hourly_values[hour])
+            
+            all_values = [value for values in hourly_values.values() for value in values]
+            daily[name] = self._aggregate_values(name, all_values)
+        
+        return hourly, daily
+    
+    def _aggregate_values(self, name, values):
+        """Aggregate one metric from a list of readings"""
+        sorted_values = sorted(values)
+        total = sum(sorted_values)
+        std = None
+        if sorted_values:
+            # Two passes, like the aggregator's Welford updates, never E[x^2] - E[x]^2
+            mean = total / len(sorted_values)
+            std = math.sqrt(sum((value - mean) ** 2 for value in sorted_values) / len(sorted_values))
+        below = sum(1 for value in sorted_values if value < LOW_OXYGEN_THRESHOLD)
+        return self._format_sorted(name, sorted_values, total, std, below)
@@ -0,0 +1,305 @@
+# ============================================
+# DEVICE_SYNC.PY - Per-device vital pipeline
+# ============================================
+
+import os
+import time
+import logging
+from collections import deque
+from datetime import datetime, timezone, timedelta
+
+from .vital_buffer import VitalRingBuffer
+from .aggregator import DailyAggregator
+from .vital_stats import VitalWindows, SleepDetector, DesaturationDetector, WINDOW_SECONDS
+from .time_index import vital_datetime, vital_epoch_ms
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Number of history entries returned by events.php?vitals=true
+RECENT_VITALS_LIMIT = 100
+
+class DeviceSync:
+    """In-memory state and file output of one Owlet sock"""
+    
+    def __init__(self, dsn, config, timezone_obj, data_processor, file_manager, on_vital=None):
+        self.dsn = dsn
+        self.config = config
+        self.timezone = timezone_obj
+        self.data_processor = data_processor
+        self.file_manager = file_manager
+        self.on_vital = on_vital
+        self.history_interval_seconds = config.get('history_interval_seconds', 60)
+        
+        # Recent vitals are read from disk once, then kept in memory
+        self.retention_hours = config.get('retention_hours', 48)
+        self.vital_buffer = VitalRingBuffer.from_store(
+            self.file_manager.history_store,
+            self.retention_hours,
+            self.history_interval_seconds
+        )
+        
+        # Rollup buckets missed while the service was down are rebuilt from history
+        self.file_manager.append_rollups(self.vital_buffer.to_vitals(
+            self.file_manager.rollups.resume_time() or None, newest_first=False
+        ))
+        
+        # Newest history entries served by the vitals snapshot
+        self.recent_vitals = deque(
+            self.file_manager.history_store.load_recent(RECENT_VITALS_LIMIT),
+            maxlen=RECENT_VITALS_LIMIT
+        )
+        
+        # Running hourly accumulators for today, resumed from memory
+        self.daily_aggregator = self.build_daily_aggregator()
+        
+        # Sliding windows over the newest readings, warmed up from memory
+        self.vital_windows = VitalWindows()
+        self.vital_windows.extend(self.vital_buffer.to_vitals(
+            time.time() - max(WINDOW_SECONDS), newest_first=False
+        ))
+        self.sleep_detector = SleepDetector(config) if config.get('sleep_detection', 'windows') == 'windows' else None
+        self.desaturation_detector = DesaturationDetector(config) if config.get('desaturation_events', True) else None
+        # Detected events waiting for detect_events: (type, icon, notes, epoch seconds)
+        self.pending_events = []
+        
+        # State tracking
+        self.last_sleep_state = None
+        self.last_history_save_time = None
+        self.last_daily_cleanup_time = None
+        
+        # Polling state read by the scheduler
+        self.latest_vital = None
+        self.sock_on_since = None
+    
+    def should_perform_daily_cleanup(self):
+        """Check if we should perform daily cleanup"""
+        current_time = datetime.now(timezone.utc)
+        
+        if self.last_daily_cleanup_time is None:
+            return True
+        
+        time_since_last = (current_time - self.last_daily_cleanup_time).total_seconds()
+        return time_since_last >= 86400  # 24 hours
+    
+    def should_save_to_history(self, current_time):
+        """Check if we should save to history"""
+        if self.last_history_save_time is None:
+            return True
+        
+        time_since_last = (current_time - self.last_history_save_time).total_seconds()
+        return time_since_last >= self.history_interval_seconds
+    
+    def run_maintenance(self):
+        """Daily cleanup and hourly update, cheap unless a period has ended"""
+        if self.should_perform_daily_cleanup():
+            logger.info(f"[{self.dsn}] Performing daily cleanup...")
+            self.cleanup_yesterdays_data()
+            self.file_manager.prune_history_archive()
+            self.file_manager.prune_rollups()
+            self.file_manager.prune_raw_archives()
+            self.last_daily_cleanup_time = datetime.now(timezone.utc)
+        
+        # Hourly update (only writes when an hour has closed)
+        self.update_todays_hourly()
+    
+    def record(self, sock):
+        """Extract and save the vital data of a freshly updated sock"""
+        with metrics.timer('extract'):
+            vital = self.data_processor.extract_vital_data(sock)
+        if not vital:
+            return None
+        
+        # Live listeners get the vital before any file is written
+        if self.on_vital:
+            self.on_vital(self.dsn, vital)
+        
+        # Remember when the sock was put on (monotonic clock)
+        was_on = self.latest_vital.get('sock_on') if self.latest_vital else None
+        if vital.get('sock_on') and was_on is False:
+            self.sock_on_since = time.monotonic()
+        elif not vital.get('sock_on'):
+            self.sock_on_since = None
+        self.latest_vital = vital
+        
+        with metrics.timer('detect'):
+            self.detect_episodes(vital)
+        
+        # Save real-time data, readings that only moved in time are written every latest_refresh_seconds
+        latest_is_current = self.file_manager.latest_is_current(vital)
+        if latest_is_current:
+            metrics.inc('owlet_writes_skipped_total', file=self.file_manager.latest_file)
+        else:
+            with metrics.timer('save_latest'):
+                self.file_manager.save_latest(vital)
+        
+        # Save to history if interval passed
+        appended = False
+        current_time = datetime.now(timezone.utc)
+        if self.should_save_to_history(current_time):
+            with metrics.timer('history_append'):
+                appended = self.file_manager.append_history(vital)
+            if appended:
+                self.recent_vitals.appendleft(vital)
+                self.vital_buffer.append(vital)
+                with metrics.timer('aggregate'):
+                    self.aggregate_vital(vital)
+                with metrics.timer('rollup'):
+                    self.file_manager.append_rollups([vital])
+                
+                # Cleanup old history
+                cutoff_time = current_time - timedelta(hours=self.retention_hours)
+                with metrics.timer('prune'):
+                    self.vital_buffer.drop_before(cutoff_time.timestamp())
+                    self.file_manager.prune_history(self.retention_hours)
+                self.last_history_save_time = current_time
+                logger.info("[%s] Appended vital to history", self.dsn)
+        
+        if appended or not latest_is_current:
+            with metrics.timer('vitals_snapshot'):
+                self.file_manager.save_vitals_snapshot(self.recent_vitals, vital)
+        return vital
+    
+    def detect_episodes(self, vital):
+        """Feed the sliding windows and queue sleep and desaturation events"""
+        if not self.vital_windows.add(vital):
+            return
+        ts = vital_epoch_ms(vital) / 1000
+        
+        if self.sleep_detector:
+            transition = self.sleep_detector.update(self.vital_windows)
+            if transition:
+                self.pending_events.append((transition, '😴', 'Detected by Owlet', ts))
+        
+        if self.desaturation_detector:
+            episode = self.desaturation_detector.update(self.vital_windows)
+            if episode:
+                minutes = episode['duration_seconds'] / 60
+                notes = (f"Detected by Owlet: SpO2 down to {episode['nadir']:g}% "
+                         f"for {minutes:.1f} min")
+                self.pending_events.append(('Desaturation', '🫁', notes, episode['start']))
+    
+    def detect_events(self, sock):
+        """Events detected since the last call as (type, icon, notes, epoch seconds)"""
+        events, self.pending_events = self.pending_events, []
+        
+        # Legacy detection straight from the sock's sleep state
+        if self.sleep_detector is None:
+            transition = self.detect_sleep_transition(sock)
+            if transition:
+                events.append((transition, '😴', 'Detected by Owlet', None))
+        return events
+    
+    def detect_sleep_transition(self, sock):
+        """Return 'Sleep Start' or 'Sleep End' when the sleep state flipped"""
+        current_sleep_state = self.data_processor.detect_sleep_state(sock)
+        
+        transition = None
+        if current_sleep_state is not None and self.last_sleep_state is not None:
+            if current_sleep_state and not self.last_sleep_state:
+                transition = 'Sleep Start'  # Fell asleep
+            elif not current_sleep_state and self.last_sleep_state:
+                transition = 'Sleep End'  # Woke up
+        
+        self.last_sleep_state = current_sleep_state
+        return transition
+    
+    def local_time(self, vital):
+        """Get a vital's timestamp in the local timezone"""
+        return vital_datetime(vital).astimezone(self.timezone)
+    
+    def local_day_bounds(self, date):
+        """Epoch seconds of the first and last instant of a local day"""
+        day_start = self.timezone.localize(datetime.combine(date, datetime.min.time()))
+        next_day_start = self.timezone.localize(datetime.combine(date + timedelta(days=1), datetime.min.time()))
+        return day_start.timestamp(), next_day_start.timestamp() - 0.001
+    
+    def build_daily_aggregator(self, date=None):
+        """Build hourly accumulators for a local day from in-memory history"""
+        if date is None:
+            date = datetime.now(timezone.utc).astimezone(self.timezone).date()
+        
+        aggregator = DailyAggregator(date, self.history_interval_seconds)
+        day_start, day_end = self.local_day_bounds(date)
+        
+        for vital in self.vital_buffer.to_vitals(day_start, day_end, newest_first=False):
+            vital_time_local = self.local_time(vital)
+            if vital_time_local.date() == date:
+                aggregator.add(vital, vital_time_local.hour)
+        
+        return aggregator
+    
+    def aggregate_vital(self, vital):
+        """Add a vital to the running hourly accumulators"""
+        try:
+            vital_time_local = self.local_time(vital)
+        except Exception as e:
+            logger.warning(f"Could not parse vital timestamp: {e}")
+            return
+        
+        self.roll_aggregates(vital_time_local)
+        if vital_time_local.date() == self.daily_aggregator.date:
+            self.daily_aggregator.add(vital, vital_time_local.hour)
+    
+    def roll_aggregates(self, current_time_local):
+        """Close finished hours and days of the running accumulators"""
+        aggregator = self.daily_aggregator
+        
+        if current_time_local.date() > aggregator.date:
+            # Day rollover: the summary is merged from the 24 hourly accumulators
+            summary = aggregator.to_daily_summary()
+            if summary:
+                self.file_manager.save_daily_summary(summary, aggregator.date)
+            self.archive_raw_day(aggregator.date)
+            
+            self.daily_aggregator = DailyAggregator(current_time_local.date(), self.history_interval_seconds)
+            self.daily_aggregator.close_hours_before(current_time_local.hour)
+            self.file_manager.save_todays_hourly(self.daily_aggregator.to_todays_hourly())
+            return
+        
+        if aggregator.close_hours_before(current_time_local.hour):
+            self.file_manager.save_todays_hourly(aggregator.to_todays_hourly())
+    
+    def cleanup_yesterdays_data(self):
+        """Create yesterday's summary if the day rolled over while not running"""
+        try:
+            current_time = datetime.now(timezone.utc).astimezone(self.timezone)
+            yesterday = (current_time - timedelta(days=1)).date()
+            
+            if not self.file_manager.has_daily_summary(yesterday):
+                logger.info(f"[{self.dsn}] Creating yesterday's summary...")
+                
+                # One vectorized pass over yesterday's columns in memory
+                day_start, day_end = self.local_day_bounds(yesterday)
+                columns = self.vital_buffer.columns(day_start, day_end)
+                summary = self.data_processor.summarize_columns(columns['timestamp'], columns)
+                if summary:
+                    self.file_manager.save_daily_summary(summary, yesterday)
+                    logger.info(f"[{self.dsn}] Created yesterday's summary")
+            
+            self.archive_raw_day(yesterday)
+            self.file_manager.save_summaries_snapshot()
+            logger.info(f"[{self.dsn}] Daily cleanup completed")
+        except Exception as e:
+            logger.error(f"[{self.dsn}] Error during cleanup: {e}")
+    
+    def archive_raw_day(self, date):
+        """Archive a finished local day's raw vitals from the history segments"""
+        file_manager = self.file_manager
+        if not file_manager.raw_archive_enabled or os.path.exists(file_manager.get_raw_archive_filename(date)):
+            return
+        
+        try:
+            # Read and written on the writer thread, after the day's last queued minutes
+            day_start, day_end = self.local_day_bounds(date)
+            file_manager.archive_raw_day(date, day_start, day_end)
+        except Exception as e:
+            logger.error(f"[{self.dsn}] Failed to archive raw vitals of {date}: {e}")
+    
+    def update_todays_hourly(self):
+        """Persist today's hourly data when an hour has closed"""
+        try:
+            current_time = datetime.now(timezone.utc).astimezone(self.timezone)
+            self.roll_aggregates(current_time)
+        except Exception as e:
+            logger.error(f"[{self.dsn}] Failed to update hourly: {e}")
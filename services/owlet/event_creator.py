@@ -2,49 +2,119 @@
 # EVENT_CREATOR.PY - Sleep event detection
 # ============================================
 
+import asyncio
 import logging
-import requests
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
+
+from .metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# An event of the same type within this window counts as a duplicate
+DUPLICATE_WINDOW_SECONDS = 300
+
 class EventCreator:
-    """Create sleep events in Baby Monitor"""
+    """Create sleep events in Baby Monitor.
+    
+    Events are posted in the background on one pooled HTTP session with a
+    deadline, so a slow or unreachable PHP endpoint never stalls the sync loop.
+    The last created event of each type is remembered for duplicate checks.
+    """
     
     def __init__(self, config):
         self.config = config
         self.php_endpoint = config.get('php_api_endpoint', 'http://localhost/events.php')
+        self.timeout_seconds = config.get('event_timeout_seconds', 5)
+        self.session = None
+        
+        # Event type -> time of the last event of that type
+        self.last_events = {}
+        self.seed_task = None
+        self.pending = set()
     
-    def should_create_sleep_event(self, event_type):
-        """Check if we should create a sleep event (prevent duplicates)"""
+    def get_session(self):
+        """Get the shared HTTP session, created on first use"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=2),
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds)
+            )
+        return self.session
+    
+    async def seed_last_events(self):
+        """Load the newest event of each type once, so restarts keep deduplicating"""
         try:
-            response = requests.get(self.php_endpoint)
-            if response.status_code != 200:
-                return True
-            
-            events = response.json()
-            if not events:
-                return True
-            
-            # Check if most recent event is same type (within 5 minutes)
-            last_event = events[0]
-            if last_event.get('type') == event_type:
-                last_time = datetime.fromisoformat(last_event.get('time', '').replace('Z', '+00:00'))
-                now_utc = datetime.now(timezone.utc)
-                time_diff = now_utc - last_time
-                if time_diff.total_seconds() < 300:  # 5 minutes
-                    logger.info(f"Skipping duplicate {event_type} event")
-                    return False
-            
-            return True
+            async with self.get_session().get(self.php_endpoint) as response:
+                if response.status != 200:
+                    return
+                events = await response.json(content_type=None)
         except Exception as e:
-            logger.warning(f"Could not check for duplicate events: {e}")
+            logger.warning(f"Could not load existing events: {e}")
+            return
+        
+        for event in events or []:
+            try:
+                event_time = datetime.fromisoformat(event.get('time', '').replace('Z', '+00:00'))
+            except Exception:
+                continue
+            event_type = event.get('type')
+            if event_type not in self.last_events or event_time > self.last_events[event_type]:
+                self.last_events[event_type] = event_time
+    
+    def should_create_sleep_event(self, event_type, now_utc=None):
+        """Check if we should create a sleep event (prevent duplicates)"""
+        now_utc = now_utc or datetime.now(timezone.utc)
+        last_time = self.last_events.get(event_type)
+        if last_time is None:
             return True
+        
+        # Only a duplicate if it is still the most recent event
+        if any(other_time > last_time for other_time in self.last_events.values()):
+            return True
+        
+        if (now_utc - last_time).total_seconds() < DUPLICATE_WINDOW_SECONDS:
+            logger.info(f"Skipping duplicate {event_type} event")
+            return False
+        return True
+    
+    def submit_event(self, event_type, icon, notes="", event_time=None):
+        """Queue an event (at epoch seconds event_time, default now) without waiting for the endpoint"""
+        if aiohttp is None:
+            logger.error("aiohttp not available, cannot create events")
+            return None
+        
+        task = asyncio.ensure_future(self.create_if_new(event_type, icon, notes, event_time))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+        return task
     
-    def create_event(self, event_type, icon, notes=""):
+    async def create_if_new(self, event_type, icon, notes="", event_time=None):
+        """Create an event unless it duplicates the last one"""
+        if self.seed_task is None:
+            self.seed_task = asyncio.ensure_future(self.seed_last_events())
+        await self.seed_task
+        now_utc = datetime.fromtimestamp(event_time, timezone.utc) if event_time is not None else None
+        if not self.should_create_sleep_event(event_type, now_utc):
+            return False
+        return await self.create_event(event_type, icon, notes, event_time)
+    
+    async def create_event(self, event_type, icon, notes="", event_time=None):
         """Create an event in Baby Monitor"""
-        try:
+        if event_time is None:
             now_utc = datetime.now(timezone.utc)
+        else:
+            now_utc = datetime.fromtimestamp(event_time, timezone.utc)
+        
+        # Remembered before posting so concurrent transitions are deduplicated too
+        previous_time = self.last_events.get(event_type)
+        self.last_events[event_type] = now_utc
+        
+        try:
             event_id = int(now_utc.timestamp() * 1000)
             event_data = {
                 'id': event_id,
@@ -54,14 +124,38 @@ class EventCreator:
                 'notes': notes
             }
             
-            response = requests.post(self.php_endpoint, json=event_data)
-            if response.status_code == 200:
-                logger.info(f"Created event: {event_type}")
-                return True
-            else:
-                logger.error(f"Failed to create event: {response.text}")
-                return False
+            with metrics.timer('event_post'):
+                async with self.get_session().post(self.php_endpoint, json=event_data) as response:
+                    if response.status == 200:
+                        metrics.inc('owlet_events_total', result='created')
+                        logger.info(f"Created event: {event_type}")
+                        return True
+                    logger.error(f"Failed to create event: {await response.text()}")
         except Exception as e:
-            logger.error(f"Error creating event: {e}")
-            return False
-
+            logger.error(f"Error creating event: {e!r}")
+        metrics.inc('owlet_events_total', result='failed')
+        
+        # Not created, a later transition may try again
+        if self.last_events.get(event_type) == now_utc:
+            if previous_time is None:
+                del self.last_events[event_type]
+            else:
+                self.last_events[event_type] = previous_time
+        return False
+    
+    async def close(self):
+        """Wait briefly for queued events, then close the HTTP session"""
+        if self.pending:
+            await asyncio.wait(set(self.pending), timeout=self.timeout_seconds)
+        
+        # Events still posting would fail against the closed session
+        leftover = {task for task in self.pending if not task.done()}
+        if leftover:
+            logger.warning(f"Dropping {len(leftover)} unsent events at shutdown")
+            for task in leftover:
+                task.cancel()
+            await asyncio.gather(*leftover, return_exceptions=True)
+        
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
@@ -4,48 +4,290 @@
 
 import json
 import os
+import time
+import hashlib
 import logging
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
 
+from .history_store import HistoryStore
+from .sqlite_store import DATABASE_FILE, OwletDatabase, SQLiteHistoryStore
+from .rollups import RollupStore
+from .file_writer import BackgroundWriter
+from .raw_archive import RawDayArchive, write_raw_archive
+from .vital_delta import changed_fields
+from .time_index import TimeIndex, epoch_ms
+from .metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+# orjson is optional, it only makes (de)serialization faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Unix only: elsewhere concurrent manifest merges are not serialized across processes
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+FSYNC_POLICIES = ('always', 'periodic', 'never')
+STORAGE_BACKENDS = ('json', 'sqlite')
+
+def dump_json(data):
+    """Serialize data to compact JSON bytes"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            pass
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+def load_json(raw):
+    """Parse JSON bytes"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on path + '.lock' across processes"""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def summary_row(summary, file=None):
+    """Manifest row of a daily summary: everything but the hourly entries"""
+    row = {key: value for key, value in summary.items() if key != 'hourly'}
+    row['file'] = file
+    return row
+
 class OwletFileManager:
     """Manage all file I/O operations for Owlet data"""
     
-    def __init__(self, timezone):
+    def __init__(self, timezone, config=None, base_dir=''):
         self.timezone = timezone
-        self.vitals_file = 'owlet_vitals.json'
-        self.latest_file = 'owlet_latest.json'
-        self.history_file = 'owlet_history.json'
-        self.daily_summaries_dir = 'owlet_daily_summaries'
-        self.todays_hourly_file = 'owlet_todays_hourly.json'
+        self.config = config
+        self.base_dir = base_dir
+        self.vitals_file = self._path('owlet_vitals.json')
+        self.latest_file = self._path('owlet_latest.json')
+        self.history_file = self._path('owlet_history.json')
+        self.history_dir = self._path('owlet_history')
+        self.history_archive_dir = self._path('owlet_history_archive')
+        self.daily_summaries_dir = self._path('owlet_daily_summaries')
+        self.rollups_dir = self._path('owlet_rollups')
+        self.todays_hourly_file = self._path('owlet_todays_hourly.json')
+        self.devices_file = self._path('owlet_devices.json')
+        self.storage_file = self._path('owlet_storage.json')
+        
+        # Ready-to-serve responses for events.php
+        self.api_vitals_file = self._path('owlet_api_vitals.json')
+        self.api_summaries_file = self._path('owlet_api_summaries.json')
         
         # Ensure directories exist
-        Path(self.daily_summaries_dir).mkdir(exist_ok=True)
+        Path(self.daily_summaries_dir).mkdir(parents=True, exist_ok=True)
+        
+        # Write policy
+        self.write_coalescing = self._config_get('write_coalescing', False)
+        self.fsync_policy = self._config_get('fsync_policy', 'never')
+        if self.fsync_policy not in FSYNC_POLICIES:
+            logger.warning(f"Invalid fsync_policy '{self.fsync_policy}', defaulting to 'never'")
+            self.fsync_policy = 'never'
+        self.fsync_interval_seconds = self._config_get('fsync_interval_seconds', 300)
+        self.last_fsync_time = 0
+        
+        # Writes run on a dedicated thread so a slow disk never stalls the event loop
+        self.writer = None
+        if self._config_get('background_writes', True):
+            self.writer = BackgroundWriter(
+                f"owlet-writer-{base_dir or 'main'}", self._config_get('writer_queue_size', 64)
+            )
+        
+        # History and daily summaries live in JSON files or in one SQLite database
+        self.storage_backend = self._config_get('storage_backend', 'json')
+        if self.storage_backend not in STORAGE_BACKENDS:
+            logger.warning(f"Invalid storage_backend '{self.storage_backend}', defaulting to 'json'")
+            self.storage_backend = 'json'
+        
+        archive_enabled = self._config_get('history_archive_enabled', True)
+        self.history_archive_days = self._config_get('history_archive_days', 365)
+        if self.storage_backend == 'sqlite':
+            self.database = OwletDatabase(
+                self._path(DATABASE_FILE), 'FULL' if self.fsync_policy == 'always' else 'NORMAL'
+            )
+            self.history_store = SQLiteHistoryStore(
+                self.database, self._config_get('retention_hours', 48), archive_enabled
+            )
+        else:
+            # Hourly append-only segments, expired ones are archived for replays
+            self.database = None
+            self.history_store = HistoryStore(
+                self.history_dir,
+                self.history_archive_dir if archive_enabled else None,
+                self._config_get('history_keyframe_interval', 30)
+            )
+            self.history_store.import_legacy(self.history_file)
+        
+        # 1-minute, 10-minute and 1-hour rollups for range queries
+        self.rollups = RollupStore(self.rollups_dir, config)
+        
+        # Finished days' raw vitals, compressed and columnar, next to the summaries
+        self.raw_archive_enabled = self._config_get('raw_archive_enabled', True)
+        self.raw_archive_compression = self._config_get('raw_archive_compression', 'zlib')
+        self.raw_archive_days = self._config_get('raw_archive_days', 0)
+        
+        # Content hash of the last write per file, to skip unchanged rewrites
+        self.written_hashes = {}
+        
+        # Latest vital last written; readings differing only in time refresh it every latest_refresh_seconds
+        self.latest_refresh_seconds = self._config_get('latest_refresh_seconds', 60)
+        self.written_latest = None
+        self.written_latest_time = 0
+        
+        # Writes staged until the next flush() in coalescing mode
+        self.pending_writes = {}
+        self.pending_history = []
+        
+        # Newest daily summaries and today's hourly data, kept for the summaries snapshot
+        self.summary_snapshot_days = self._config_get('summary_snapshot_days', 30)
+        self.recent_summaries = None
+        self.todays_hourly = None
+        
+        # One compact row per summarized day, so events.php pages through dates without opening every summary
+        self.summary_manifest_file = os.path.join(self.daily_summaries_dir, 'index.json')
+        self.summary_manifest = None
+        # Rows stored since the manifest was last saved, merged into the file by date
+        self.summary_manifest_updates = {}
+        
+        # Tells events.php whether owlet.db is live or a leftover copy from --migrate-sqlite
+        self.write_json(self.storage_file, {'storage_backend': self.storage_backend})
+    
+    def _path(self, name):
+        """Path of a data file inside this manager's base directory"""
+        return os.path.join(self.base_dir, name) if self.base_dir else name
+    
+    def _config_get(self, key, default):
+        """Get config value, tolerating a missing config"""
+        return self.config.get(key, default) if self.config else default
     
     def read_json(self, filepath):
         """Read JSON file"""
+        # Reads are rare (startup, day rollover) and must see queued writes
+        if self.writer is not None:
+            self.writer.wait()
         if not os.path.exists(filepath):
             return None
         
         try:
-            with open(filepath, 'r') as f:
-                return json.load(f)
+            with open(filepath, 'rb') as f:
+                return load_json(f.read())
         except Exception as e:
             logger.error(f"Failed to read {filepath}: {e}")
             return None
     
     def write_json(self, filepath, data):
-        """Write JSON file"""
+        """Write compact JSON file atomically, skipping unchanged content"""
         try:
-            with open(filepath, 'w') as f:
-                json.dump(data, f, indent=2)
-            return True
+            payload = dump_json(data)
+            digest = hashlib.blake2b(payload, digest_size=16).digest()
+            if self.written_hashes.get(filepath) == digest and filepath not in self.pending_writes:
+                logger.debug("Skipped unchanged %s", filepath)
+                metrics.inc('owlet_writes_skipped_total', file=filepath)
+                return True
+            
+            if self.write_coalescing:
+                self.pending_writes[filepath] = (payload, digest)
+                return True
+            
+            return self._submit_write(filepath, payload, digest, self._should_fsync())
         except Exception as e:
             logger.error(f"Failed to write {filepath}: {e}")
             return False
     
+    def _submit(self, job, key=None):
+        """Run a write job on the writer thread, or right away without one"""
+        if self.writer is not None and self.writer.submit(job, key):
+            return True
+        return job()
+    
+    def _submit_write(self, filepath, payload, digest, fsync=False):
+        """Hand a serialized file off to be written atomically"""
+        # Remembered now, so identical snapshots are not queued again meanwhile
+        self.written_hashes[filepath] = digest
+        
+        def write():
+            try:
+                self._write_atomic(filepath, payload, fsync)
+                return True
+            except Exception as e:
+                logger.error(f"Failed to write {filepath}: {e}")
+                if self.written_hashes.get(filepath) == digest:
+                    del self.written_hashes[filepath]
+                return False
+        
+        return self._submit(write, filepath)
+    
+    def _should_fsync(self):
+        """Decide whether the current write or flush should reach the disk"""
+        if self.fsync_policy == 'always':
+            return True
+        if self.fsync_policy == 'periodic':
+            now = time.monotonic()
+            if now - self.last_fsync_time >= self.fsync_interval_seconds:
+                self.last_fsync_time = now
+                return True
+        return False
+    
+    def _write_atomic(self, filepath, payload, fsync=False):
+        """Write to a temp file and rename it over the target"""
+        # Readers (events.php) see either the old or the new file, never a partial one
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+        metrics.inc('owlet_bytes_written_total', len(payload), file=filepath)
+    
+    def flush(self, wait=False):
+        """Write everything staged in coalescing mode, with wait=True also wait for the writer thread"""
+        success = True
+        if self.pending_writes or self.pending_history or self.rollups.has_pending():
+            with metrics.timer('flush'):
+                success = self._flush_pending()
+        
+        if wait and self.writer is not None:
+            with metrics.timer('flush_wait'):
+                self.writer.wait()
+        return success
+    
+    def _flush_pending(self):
+        """Write the staged history lines and files"""
+        fsync = self._should_fsync()
+        success = True
+        
+        if self.pending_history:
+            pending_history, self.pending_history = self.pending_history, []
+            success = self._submit(lambda: self.history_store.append_many(pending_history, fsync)) and success
+        
+        success = self._flush_rollups() and success
+        
+        pending_writes, self.pending_writes = self.pending_writes, {}
+        for filepath, (payload, digest) in pending_writes.items():
+            success = self._submit_write(filepath, payload, digest, fsync) and success
+        
+        return success
+    
     def load_vitals(self):
         """Load vital signs"""
         data = self.read_json(self.vitals_file)
@@ -62,24 +304,80 @@ class OwletFileManager:
         """Load latest vital reading"""
         return self.read_json(self.latest_file)
     
+    def latest_is_current(self, vital):
+        """Whether the written latest reading differs from vital only in its timestamp and is recent"""
+        if self.written_latest is None or changed_fields(self.written_latest, vital):
+            return False
+        if len(self.written_latest) != len(vital):
+            return False
+        return time.monotonic() - self.written_latest_time < self.latest_refresh_seconds
+    
     def save_latest(self, vital):
         """Save latest vital reading"""
         if self.write_json(self.latest_file, vital):
-            logger.info(f"Saved latest vital: HR={vital.get('heart_rate')}, O2={vital.get('oxygen_saturation')}%")
+            self.written_latest = vital
+            self.written_latest_time = time.monotonic()
+            logger.info("Saved latest vital: HR=%s, O2=%s%%", vital.get('heart_rate'), vital.get('oxygen_saturation'))
             return True
         return False
     
     def load_history(self):
-        """Load historical vital data"""
-        data = self.read_json(self.history_file)
-        return data if data else []
+        """Load historical vital data, newest first"""
+        self.flush(wait=True)
+        return self.history_store.load_all()
     
     def save_history(self, history):
-        """Save historical vital data"""
-        if self.write_json(self.history_file, history):
-            logger.info(f"Saved {len(history)} historical readings")
+        """Replace historical vital data"""
+        history = [dict(vital) for vital in history]
+        
+        def replace():
+            if self.history_store.replace_all(history):
+                logger.info(f"Saved {len(history)} historical readings")
+                return True
+            return False
+        
+        return self._submit(replace)
+    
+    def append_history(self, vital):
+        """Append a single vital to history"""
+        # The writer gets its own copy, the caller keeps the vital
+        vital = dict(vital)
+        if self.write_coalescing:
+            self.pending_history.append(vital)
             return True
-        return False
+        fsync = self._should_fsync()
+        return self._submit(lambda: self.history_store.append_many([vital], fsync))
+    
+    def prune_history(self, retention_hours=48):
+        """Drop history segments older than retention period"""
+        # Queued behind the appends, the segments are only touched by one thread
+        return self._submit(lambda: self.history_store.drop_expired(retention_hours))
+    
+    def prune_history_archive(self):
+        """Delete archived history older than history_archive_days"""
+        return self.history_store.drop_expired_archive(self.history_archive_days)
+    
+    def append_rollups(self, vitals):
+        """Add history vitals to the rollup tiers"""
+        for vital in vitals:
+            self.rollups.add(vital)
+        if self.write_coalescing:
+            return True
+        return self._flush_rollups()
+    
+    def _flush_rollups(self):
+        """Write the rollup buckets closed so far"""
+        if self.writer is None:
+            return self.rollups.flush()
+        
+        collected = self.rollups.collect()
+        if not collected:
+            return True
+        return self._submit(lambda: self.rollups.write(collected))
+    
+    def prune_rollups(self):
+        """Delete rollups older than each tier's retention"""
+        return self.rollups.drop_expired()
     
     def get_daily_summary_filename(self, date=None):
         """Get filename for daily summary"""
@@ -90,19 +388,136 @@ class OwletFileManager:
         
         return os.path.join(self.daily_summaries_dir, f"owlet_summary_{date.isoformat()}.json")
     
+    def has_daily_summary(self, date):
+        """Whether a day's summary exists"""
+        # Rows are added when the summary is handed off, before the writer has written it
+        if self.summary_manifest is not None and date.isoformat() in self.summary_manifest:
+            return True
+        if self.database:
+            return self.database.load_summary(date.isoformat()) is not None
+        return os.path.exists(self.get_daily_summary_filename(date))
+    
     def load_daily_summary(self, date=None):
         """Load daily summary"""
+        if self.database:
+            if isinstance(date, datetime):
+                date = date.date()
+            # A summary may still be queued for the writer thread
+            if self.writer is not None:
+                self.writer.wait()
+            return self.database.load_summary(self.get_local_date() if date is None else date.isoformat())
         filename = self.get_daily_summary_filename(date)
         return self.read_json(filename)
     
+    def store_daily_summary(self, summary, date=None):
+        """Write a daily summary to the storage backend and its row to the in-memory manifest"""
+        if self.database:
+            date_iso = summary['date']
+            
+            def save():
+                try:
+                    self.database.save_summary(date_iso, summary)
+                    logger.info(f"Saved daily summary for {date_iso} to {self.database.path}")
+                    return True
+                except Exception as e:
+                    logger.error(f"Failed to save daily summary for {date_iso}: {e}")
+                    return False
+            
+            if not self._submit(save, f"summary-{date_iso}"):
+                return False
+            file = None
+        else:
+            filename = self.get_daily_summary_filename(date)
+            if not self.write_json(filename, summary):
+                return False
+            logger.info(f"Saved daily summary: {filename}")
+            file = os.path.basename(filename)
+        
+        row = summary_row(summary, file)
+        self._load_summary_manifest()[summary['date']] = row
+        self.summary_manifest_updates[summary['date']] = row
+        return True
+    
     def save_daily_summary(self, summary, date=None):
         """Save daily summary"""
-        filename = self.get_daily_summary_filename(date)
-        if self.write_json(filename, summary):
-            logger.info(f"Saved daily summary: {filename}")
+        if self.store_daily_summary(summary, date):
+            recent_summaries = self._load_recent_summaries()
+            recent_summaries[summary['date']] = summary
+            for old_date in sorted(recent_summaries, reverse=True)[self.summary_snapshot_days:]:
+                del recent_summaries[old_date]
+            self.save_summary_manifest()
+            self.save_summaries_snapshot()
             return True
         return False
     
+    def _load_summary_manifest(self):
+        """Load the summaries manifest once, building it from the stored summaries if missing"""
+        if self.summary_manifest is not None:
+            return self.summary_manifest
+        
+        manifest = self.read_json(self.summary_manifest_file)
+        if manifest and isinstance(manifest.get('days'), list):
+            self.summary_manifest = {row['date']: row for row in manifest['days'] if 'date' in row}
+            return self.summary_manifest
+        
+        # First run with a manifest: one pass over every stored summary
+        self.summary_manifest = {}
+        if self.database:
+            # LIMIT -1 is no limit
+            for data in self.database.recent_summaries(-1):
+                self.summary_manifest[data['date']] = summary_row(data)
+        else:
+            for name in os.listdir(self.daily_summaries_dir):
+                if not (name.startswith('owlet_summary_') and name.endswith('.json')):
+                    continue
+                data = self.read_json(os.path.join(self.daily_summaries_dir, name))
+                if data and 'date' in data:
+                    self.summary_manifest[data['date']] = summary_row(data, name)
+        
+        if self.summary_manifest:
+            logger.info(f"Indexed {len(self.summary_manifest)} daily summaries in {self.summary_manifest_file}")
+            self.summary_manifest_updates.update(self.summary_manifest)
+            self.save_summary_manifest()
+        return self.summary_manifest
+    
+    def save_summary_manifest(self):
+        """Upsert the rows stored since the last save into the manifest file, newest day first.
+        
+        A --backfill run may have added days to the file meanwhile, so it is
+        re-read under a lock and only this process's rows replace its rows.
+        """
+        self._load_summary_manifest()
+        updates, self.summary_manifest_updates = self.summary_manifest_updates, {}
+        if not updates:
+            return True
+        path = self.summary_manifest_file
+        
+        def merge():
+            try:
+                with file_lock(path):
+                    rows = {}
+                    if os.path.exists(path):
+                        with open(path, 'rb') as f:
+                            manifest = load_json(f.read())
+                        rows = {row['date']: row for row in manifest.get('days', []) if 'date' in row}
+                    rows.update(updates)
+                    self._write_atomic(path, dump_json({
+                        'version': 1,
+                        'days': [rows[date] for date in sorted(rows, reverse=True)]
+                    }))
+            except Exception as e:
+                logger.error(f"Failed to update {path}: {e}")
+                # Kept for the next save
+                self.summary_manifest_updates = {**updates, **self.summary_manifest_updates}
+                return False
+            
+            # Days written by other processes become visible here too
+            self.summary_manifest = {**rows, **self.summary_manifest_updates}
+            return True
+        
+        # Not keyed: a waiting merge must not be superseded, it carries its own rows
+        return self._submit(merge)
+    
     def load_todays_hourly(self):
         """Load today's hourly data"""
         data = self.read_json(self.todays_hourly_file)
@@ -112,28 +527,148 @@ class OwletFileManager:
         """Save today's hourly data"""
         if self.write_json(self.todays_hourly_file, data):
             logger.info(f"Saved today's hourly data: {len(data.get('hourly', []))} hours")
+            self.todays_hourly = data
+            self.save_summaries_snapshot()
             return True
         return False
     
+    def get_raw_archive_filename(self, date):
+        """Get filename for a day's raw vitals archive"""
+        return os.path.join(self.daily_summaries_dir, f"owlet_raw_{date.isoformat()}.owlcol")
+    
+    def save_raw_archive(self, vitals, date):
+        """Archive a finished day's raw vitals (oldest first)"""
+        filename = self.get_raw_archive_filename(date)
+        try:
+            count = write_raw_archive(filename, vitals, self.timezone, date, self.raw_archive_compression)
+            logger.info(f"Archived {count} raw vitals of {date} ({os.path.getsize(filename) if count else 0} bytes)")
+            return count > 0
+        except Exception as e:
+            logger.error(f"Failed to archive raw vitals of {date}: {e}")
+            return False
+    
+    def archive_raw_day(self, date, day_start, day_end):
+        """Archive a finished day's raw vitals from history (epoch seconds bounds) on the writer thread"""
+        filename = self.get_raw_archive_filename(date)
+        
+        def archive():
+            if os.path.exists(filename):
+                return True
+            vitals = list(self.history_store.iter_range(day_start, day_end))
+            return self.save_raw_archive(vitals, date) if vitals else False
+        
+        # Staged history is queued first, so the job also reads the day's last minutes
+        self.flush()
+        return self._submit(archive, filename)
+    
+    def load_raw_archive(self, date):
+        """Open a day's raw vitals archive, None if there is none"""
+        filename = self.get_raw_archive_filename(date)
+        if not os.path.exists(filename):
+            return None
+        
+        try:
+            return RawDayArchive(filename)
+        except Exception as e:
+            logger.error(f"Failed to read {filename}: {e}")
+            return None
+    
+    def prune_raw_archives(self):
+        """Delete raw archives older than raw_archive_days, 0 keeps them forever"""
+        if self.raw_archive_days <= 0:
+            return 0
+        
+        cutoff = (datetime.now(timezone.utc).astimezone(self.timezone) - timedelta(days=self.raw_archive_days)).date()
+        removed = 0
+        for name in os.listdir(self.daily_summaries_dir):
+            if not (name.startswith('owlet_raw_') and name.endswith('.owlcol')):
+                continue
+            if name[len('owlet_raw_'):-len('.owlcol')] < cutoff.isoformat():
+                try:
+                    os.remove(os.path.join(self.daily_summaries_dir, name))
+                    removed += 1
+                except Exception as e:
+                    logger.error(f"Failed to remove {name}: {e}")
+        return removed
+    
+    def _load_recent_summaries(self):
+        """Load the newest daily summaries once, then keep them in memory"""
+        if self.recent_summaries is None:
+            self.recent_summaries = {}
+            if self.database:
+                for data in self.database.recent_summaries(self.summary_snapshot_days):
+                    self.recent_summaries[data['date']] = data
+                return self.recent_summaries
+            
+            names = sorted(
+                (name for name in os.listdir(self.daily_summaries_dir)
+                 if name.startswith('owlet_summary_') and name.endswith('.json')),
+                reverse=True
+            )
+            for name in names[:self.summary_snapshot_days]:
+                data = self.read_json(os.path.join(self.daily_summaries_dir, name))
+                if data and 'date' in data:
+                    self.recent_summaries[data['date']] = data
+        return self.recent_summaries
+    
+    def save_summaries_snapshot(self):
+        """Save the ready-to-serve response of events.php?summaries=true"""
+        try:
+            recent_summaries = self._load_recent_summaries()
+            summaries = [recent_summaries[date] for date in sorted(recent_summaries, reverse=True)]
+            
+            if self.todays_hourly is None:
+                self.todays_hourly = self.read_json(self.todays_hourly_file)
+            if self.todays_hourly and self.todays_hourly.get('hourly'):
+                summaries.insert(0, self.todays_hourly)
+            
+            last_update = None
+            if summaries:
+                last_update = summaries[0].get('last_update') or summaries[0].get('last_timestamp')
+            
+            return self.write_json(self.api_summaries_file, {
+                'summaries': summaries,
+                'total_days': len(summaries),
+                'last_update': last_update
+            })
+        except Exception as e:
+            logger.error(f"Failed to save summaries snapshot: {e}")
+            return False
+    
+    def save_vitals_snapshot(self, recent_vitals, latest):
+        """Save the ready-to-serve response of events.php?vitals=true"""
+        vitals = list(recent_vitals)
+        if not vitals and latest:
+            vitals = [latest]
+        
+        return self.write_json(self.api_vitals_file, {
+            'vitals': vitals,
+            'last_update': vitals[0]['timestamp'] if vitals else None,
+            'latest_reading': latest if latest is not None else (vitals[0] if vitals else None)
+        })
+    
     def cleanup_old_vitals(self, vitals, retention_hours=48):
         """Remove vitals older than retention period"""
         cutoff_time = datetime.now(timezone.utc) - timedelta(hours=retention_hours)
         
-        filtered = []
-        for vital in vitals:
-            try:
-                vital_time = datetime.fromisoformat(vital['timestamp'].replace('Z', '+00:00'))
-                if vital_time > cutoff_time:
-                    filtered.append(vital)
-            except Exception as e:
-                logger.warning(f"Could not parse vital timestamp: {e}")
-                filtered.append(vital)
+        # History is newest first, so the kept vitals are a prefix found by bisection
+        filtered = TimeIndex(vitals, newest_first=True).after(epoch_ms(cutoff_time))
         
         if len(filtered) < len(vitals):
             logger.info(f"Cleaned up {len(vitals) - len(filtered)} old vitals")
         
         return filtered
     
+    def close(self):
+        """Write the summaries manifest and everything staged or queued, then close the database"""
+        if self.summary_manifest_updates:
+            self.save_summary_manifest()
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+        if self.database:
+            self.database.close()
+    
     def get_local_date(self):
         """Get current date in local timezone"""
         return datetime.now(timezone.utc).astimezone(self.timezone).strftime('%Y-%m-%d')
@@ -0,0 +1,99 @@
+# ============================================
+# FILE_WRITER.PY - Background thread for file writes off the event loop
+# ============================================
+
+import contextvars
+import functools
+import queue
+import threading
+import logging
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Queue entry telling the thread to exit once everything before it is written
+STOP = object()
+
+class BackgroundWriter:
+    """Dedicated thread running the file writes handed off by the sync loop.
+    
+    Jobs run one at a time in submission order and only receive data that
+    the loop no longer changes (serialized payloads, copied vitals). A job
+    keyed by a file path replaces the one still waiting for that file, so a
+    slow disk skips stale snapshots instead of queueing them. The queue is
+    bounded: when it is full, submit blocks until the thread catches up.
+    """
+    
+    def __init__(self, name='owlet-writer', max_pending=64):
+        self.name = name
+        self.queue = queue.Queue(max(int(max_pending), 1))
+        # Path -> newest waiting job for that file
+        self.keyed = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.closed = False
+    
+    def start(self):
+        """Start the thread on first use"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+            self.thread.start()
+    
+    def submit(self, job, key=None):
+        """Queue a callable, False once the writer is closed"""
+        if self.closed:
+            return False
+        self.start()
+        # The job records its metrics under the submitting account
+        job = functools.partial(contextvars.copy_context().run, job)
+        
+        if key is not None:
+            with self.lock:
+                superseded = key in self.keyed
+                self.keyed[key] = job
+            if superseded:
+                metrics.inc('owlet_writes_superseded_total', file=key)
+                return True
+            job = None
+        
+        try:
+            self.queue.put_nowait((key, job))
+        except queue.Full:
+            # Backpressure: the loop waits for the disk instead of buffering without bound
+            metrics.inc('owlet_writer_backpressure_total')
+            with metrics.timer('writer_backpressure'):
+                self.queue.put((key, job))
+        return True
+    
+    def run(self):
+        """Thread body: run queued jobs until STOP"""
+        while True:
+            key, job = self.queue.get()
+            try:
+                if job is STOP:
+                    return
+                if key is not None:
+                    with self.lock:
+                        job = self.keyed.pop(key)
+                with metrics.timer('background_write'):
+                    job()
+            except Exception as e:
+                logger.error(f"Background write failed: {e}")
+            finally:
+                self.queue.task_done()
+    
+    def wait(self):
+        """Block until every job submitted so far has run"""
+        if self.thread is not None:
+            self.queue.join()
+    
+    def close(self):
+        """Write everything still queued, then stop the thread"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.thread is not None:
+            self.queue.put((None, STOP))
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,314 @@
+# ============================================
+# HISTORY_STORE.PY - Append-only segmented vital history
+# ============================================
+
+import gzip
+import json
+import os
+import shutil
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+from .metrics import metrics
+from .time_index import vital_epoch_ms
+from .vital_delta import apply_delta, encode_delta, is_delta
+
+logger = logging.getLogger(__name__)
+
+def iter_segment_file(path):
+    """Stream the vitals of a segment file (.jsonl or .jsonl.gz), oldest first"""
+    opener = gzip.open if path.endswith('.gz') else open
+    try:
+        with opener(path, 'rt') as f:
+            previous = None
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line after a crash is skipped, not fatal
+                    logger.warning(f"Skipping corrupt line in {path}")
+                    continue
+                
+                # Delta records are expanded against the vital before them
+                if is_delta(record):
+                    if previous is None:
+                        continue
+                    record = apply_delta(previous, record)
+                previous = record
+                yield record
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error(f"Failed to read {path}: {e}")
+
+class HistoryStore:
+    """Append-only vital history split into hourly JSON Lines segments.
+    
+    Each segment holds the vitals of one UTC hour, one compact JSON object per
+    line, oldest first. Appending a vital only touches the current segment and
+    retention works by deleting whole segments, or by moving them gzipped into
+    an archive directory that offline replays read from.
+    
+    Lines are full vitals (keyframes) or deltas holding only the fields that
+    changed since the line before. Every segment starts with a keyframe and
+    one is repeated every keyframe_interval lines; 0 writes only keyframes.
+    """
+    
+    SEGMENT_SUFFIX = '.jsonl'
+    ARCHIVE_SUFFIX = '.jsonl.gz'
+    SEGMENT_KEY_FORMAT = '%Y-%m-%dT%H'
+    
+    def __init__(self, directory, archive_dir=None, keyframe_interval=30):
+        self.directory = directory
+        self.archive_dir = archive_dir
+        self.keyframe_interval = keyframe_interval
+        
+        # Segment key -> (last vital written, lines since its keyframe)
+        self.segment_state = {}
+        Path(self.directory).mkdir(exist_ok=True)
+        if self.archive_dir:
+            Path(self.archive_dir).mkdir(exist_ok=True)
+    
+    def segment_key(self, vital):
+        """Get the UTC hour key (YYYY-MM-DDTHH) a vital belongs to"""
+        # ISO timestamps written by the processor are UTC, so the hour is a prefix
+        return vital['timestamp'][:13]
+    
+    def segment_path(self, key):
+        """Get path of the segment file for an hour key"""
+        return os.path.join(self.directory, f"{key}{self.SEGMENT_SUFFIX}")
+    
+    def list_segments(self, directory=None, suffix=None):
+        """List (hour_key, path) of all segments, oldest first"""
+        directory = directory or self.directory
+        suffix = suffix or self.SEGMENT_SUFFIX
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+        
+        segments = []
+        for name in names:
+            if name.endswith(suffix):
+                key = name[:-len(suffix)]
+                segments.append((key, os.path.join(directory, name)))
+        
+        segments.sort()
+        return segments
+    
+    def list_archived(self):
+        """List (hour_key, path) of archived segments, oldest first"""
+        if not self.archive_dir:
+            return []
+        return self.list_segments(self.archive_dir, self.ARCHIVE_SUFFIX)
+    
+    def list_all_segments(self):
+        """Archived and live segments by hour key, archived copy wins"""
+        segments = dict(self.list_segments())
+        # A crash between archiving and removal leaves both, the archive is complete
+        segments.update(self.list_archived())
+        return segments
+    
+    def is_empty(self):
+        """Check if the store has no segments"""
+        return not self.list_segments()
+    
+    def append(self, vital):
+        """Append a single vital to its hourly segment"""
+        return self.append_many([vital])
+    
+    def append_many(self, vitals, fsync=False):
+        """Append vitals (oldest first), opening each segment once"""
+        try:
+            by_segment = {}
+            for vital in vitals:
+                by_segment.setdefault(self.segment_key(vital), []).append(vital)
+            
+            for key, segment_vitals in by_segment.items():
+                lines = ''.join(json.dumps(r, separators=(',', ':')) + '\n' for r in self.encode(key, segment_vitals))
+                with open(self.segment_path(key), 'a') as f:
+                    f.write(lines)
+                    if fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                metrics.inc('owlet_bytes_written_total', len(lines), file=self.directory)
+            return True
+        except Exception as e:
+            # The next line must be a keyframe, the failed ones may be missing
+            self.segment_state = {}
+            logger.error(f"Failed to append vitals to history: {e}")
+            return False
+    
+    def encode(self, key, vitals):
+        """Records to append to a segment, deltas against the segment's last vital"""
+        previous, since_keyframe = self.segment_state.get(key, (None, 0))
+        records = []
+        for vital in vitals:
+            if previous is None or not self.keyframe_interval or since_keyframe >= self.keyframe_interval:
+                records.append(vital)
+                since_keyframe = 0
+            else:
+                records.append(encode_delta(previous, vital))
+                since_keyframe += 1
+            previous = vital
+        
+        # Only the segment being written needs its state
+        self.segment_state = {key: (previous, since_keyframe)}
+        return records
+    
+    def iter_segment(self, path):
+        """Stream the vitals of one live or archived segment, oldest first"""
+        return iter_segment_file(path)
+    
+    def read_segment(self, path):
+        """Read all vitals of one segment, oldest first"""
+        return list(self.iter_segment(path))
+    
+    def iter_vitals(self, newest_first=False):
+        """Stream vitals segment by segment"""
+        segments = self.list_segments()
+        if newest_first:
+            segments.reverse()
+        
+        for _, path in segments:
+            vitals = self.read_segment(path)
+            if newest_first:
+                vitals.reverse()
+            yield from vitals
+    
+    def iter_range(self, t0, t1):
+        """Stream live and archived vitals between epoch seconds t0 and t1, oldest first"""
+        segments = self.list_all_segments()
+        hour = datetime.fromtimestamp(t0, timezone.utc).replace(minute=0, second=0, microsecond=0)
+        while hour.timestamp() <= t1:
+            path = segments.get(hour.strftime(self.SEGMENT_KEY_FORMAT))
+            if path:
+                for vital in iter_segment_file(path):
+                    try:
+                        ts = vital_epoch_ms(vital) / 1000
+                    except Exception:
+                        continue
+                    if t0 <= ts <= t1:
+                        yield vital
+            hour += timedelta(hours=1)
+    
+    def load_recent(self, limit):
+        """Load the newest vitals, newest first, reading only the segments needed"""
+        vitals = []
+        for vital in self.iter_vitals(newest_first=True):
+            vitals.append(vital)
+            if len(vitals) >= limit:
+                break
+        return vitals
+    
+    def load_all(self):
+        """Load all vitals, newest first"""
+        return list(self.iter_vitals(newest_first=True))
+    
+    def replace_all(self, vitals):
+        """Rewrite the store so it contains exactly the given vitals"""
+        try:
+            by_segment = {}
+            for vital in vitals:
+                by_segment.setdefault(self.segment_key(vital), []).append(vital)
+            
+            for key, segment_vitals in by_segment.items():
+                segment_vitals.sort(key=lambda v: v['timestamp'])
+                path = self.segment_path(key)
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    for vital in segment_vitals:
+                        f.write(json.dumps(vital, separators=(',', ':')) + '\n')
+                os.replace(tmp_path, path)
+            
+            for key, path in self.list_segments():
+                if key not in by_segment:
+                    os.remove(path)
+            self.segment_state = {}
+            return True
+        except Exception as e:
+            logger.error(f"Failed to rewrite history store: {e}")
+            return False
+    
+    def archive_segment(self, key, path):
+        """Move a segment gzipped into the archive directory"""
+        archive_path = os.path.join(self.archive_dir, f"{key}{self.ARCHIVE_SUFFIX}")
+        tmp_path = archive_path + '.tmp'
+        with open(path, 'rb') as source, gzip.open(tmp_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.replace(tmp_path, archive_path)
+        os.remove(path)
+    
+    def drop_expired(self, retention_hours=48):
+        """Archive or delete whole segments that ended before the retention cutoff"""
+        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=retention_hours)
+        
+        removed = 0
+        for key, path in self.list_segments():
+            try:
+                segment_start = datetime.strptime(key, self.SEGMENT_KEY_FORMAT).replace(tzinfo=timezone.utc)
+            except ValueError:
+                logger.warning(f"Unexpected history segment name: {path}")
+                continue
+            
+            if segment_start + timedelta(hours=1) > cutoff_time:
+                # Segments are sorted, everything after this one is newer
+                break
+            
+            try:
+                if self.archive_dir:
+                    self.archive_segment(key, path)
+                else:
+                    os.remove(path)
+                removed += 1
+            except Exception as e:
+                logger.error(f"Failed to remove {path}: {e}")
+        
+        if removed:
+            action = 'Archived' if self.archive_dir else 'Dropped'
+            logger.info(f"{action} {removed} expired history segments")
+        return removed
+    
+    def drop_expired_archive(self, archive_days):
+        """Delete archived segments older than archive_days (0 keeps them forever)"""
+        if not archive_days:
+            return 0
+        
+        cutoff_key = (datetime.now(timezone.utc) - timedelta(days=archive_days)).strftime(self.SEGMENT_KEY_FORMAT)
+        removed = 0
+        for key, path in self.list_archived():
+            if key >= cutoff_key:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except Exception as e:
+                logger.error(f"Failed to remove {path}: {e}")
+        
+        if removed:
+            logger.info(f"Deleted {removed} archived history segments older than {archive_days} days")
+        return removed
+    
+    def import_legacy(self, legacy_file):
+        """Move a legacy single-file JSON history into segments"""
+        if not os.path.exists(legacy_file) or not self.is_empty():
+            return False
+        
+        try:
+            with open(legacy_file, 'r') as f:
+                vitals = json.load(f) or []
+        except Exception as e:
+            logger.error(f"Failed to read legacy history {legacy_file}: {e}")
+            return False
+        
+        vitals = [v for v in vitals if isinstance(v, dict) and v.get('timestamp')]
+        if not self.replace_all(vitals):
+            return False
+        
+        os.replace(legacy_file, legacy_file + '.bak')
+        logger.info(f"Migrated {len(vitals)} vitals from {legacy_file} into {self.directory}/")
+        return True
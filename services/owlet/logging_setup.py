@@ -0,0 +1,171 @@
+# ============================================
+# LOGGING_SETUP.PY - Queued, rotated and rate-limited service logging
+# ============================================
+
+import json
+import queue
+import time
+import atexit
+import logging
+import threading
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from .metrics import metrics
+
+LOG_FORMATS = ('text', 'json')
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+ACCOUNT_TEXT_FORMAT = '%(asctime)s - %(levelname)s - [%(account)s] %(message)s'
+
+# Account whose task is logging, when a supervisor worker runs several
+log_account = contextvars.ContextVar('log_account', default=None)
+
+def set_log_account(name):
+    """Tag the records logged by the current task (and tasks it starts) with an account"""
+    log_account.set(name)
+
+class AccountFilter(logging.Filter):
+    """Stamp records with the account of the logging task"""
+    
+    def filter(self, record):
+        record.account = log_account.get()
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """Let each message template through at most once per interval.
+    
+    Records are keyed by logger, unformatted template and account, so a line
+    logged every tick with lazy %-style arguments counts as one message. Errors
+    always pass. The next record let through carries how many were
+    suppressed since.
+    """
+    
+    def __init__(self, interval_seconds=60, max_level=logging.WARNING):
+        super().__init__()
+        self.interval_seconds = interval_seconds
+        self.max_level = max_level
+        # (logger, level, template) -> [time last let through, suppressed since]
+        self.seen = {}
+        self.lock = threading.Lock()
+    
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+        
+        key = (record.name, record.levelno, record.msg, getattr(record, 'account', None))
+        now = time.monotonic()
+        with self.lock:
+            entry = self.seen.get(key)
+            if entry is not None and now - entry[0] < self.interval_seconds:
+                entry[1] += 1
+                return False
+            suppressed = entry[1] if entry is not None else 0
+            self.seen[key] = [now, 0]
+        
+        record.suppressed = suppressed
+        return True
+
+class LazyQueueHandler(QueueHandler):
+    """Queue records without formatting them; the listener thread formats.
+    
+    The standard QueueHandler renders the message in the calling thread.
+    Records stay in this process, so the arguments are passed along as they
+    are (the service logs numbers and strings, which nothing mutates).
+    Records are dropped and counted when the queue is full.
+    """
+    
+    def prepare(self, record):
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc('owlet_log_records_dropped_total')
+
+class TextFormatter(logging.Formatter):
+    """The service's text lines, noting rate-limited repeats"""
+    
+    def __init__(self, fmt=TEXT_FORMAT):
+        super().__init__(fmt)
+        self.account_style = logging.PercentStyle(ACCOUNT_TEXT_FORMAT)
+    
+    def formatMessage(self, record):
+        if getattr(record, 'account', None):
+            return self.account_style.format(record)
+        return super().formatMessage(record)
+    
+    def format(self, record):
+        line = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        return f"{line} ({suppressed} similar suppressed)" if suppressed else line
+
+class JsonLinesFormatter(logging.Formatter):
+    """One compact JSON object per record"""
+    
+    def format(self, record):
+        created = datetime.fromtimestamp(record.created, timezone.utc)
+        entry = {
+            't': created.isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'account', None):
+            entry['account'] = record.account
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(',', ':'), ensure_ascii=False)
+
+def setup_logging(config=None):
+    """Route all logging through a queue to a rotating file and the console.
+    
+    The calling thread only creates, rate-limits and queues records;
+    formatting and disk writes happen on the listener thread. Returns a
+    function stopping it (draining the queue), which also runs at exit.
+    """
+    def get(key, default):
+        return config.get(key, default) if config else default
+    
+    level = getattr(logging, str(get('log_level', 'INFO')).upper(), logging.INFO)
+    log_format = get('log_format', 'text')
+    if log_format not in LOG_FORMATS:
+        log_format = 'text'
+    formatter = JsonLinesFormatter() if log_format == 'json' else TextFormatter()
+    
+    handlers = [logging.StreamHandler()]
+    log_file = get('log_file', 'owlet_sync.log')
+    if log_file:
+        handlers.append(RotatingFileHandler(
+            log_file,
+            maxBytes=get('log_max_bytes', 5 * 1024 * 1024),
+            backupCount=get('log_backup_count', 3),
+            encoding='utf-8'
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    queue_handler = LazyQueueHandler(queue.Queue(get('log_queue_size', 10000)))
+    queue_handler.addFilter(AccountFilter())
+    rate_limit_seconds = get('log_rate_limit_seconds', 60)
+    if rate_limit_seconds:
+        queue_handler.addFilter(RateLimitFilter(rate_limit_seconds))
+    
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    
+    def stop():
+        atexit.unregister(stop)
+        listener.stop()
+    
+    atexit.register(stop)
+    return stop
@@ -0,0 +1,235 @@
+# ============================================
+# METRICS.PY - Per-stage timings and counters in Prometheus format
+# ============================================
+
+import asyncio
+import os
+import time
+import logging
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+COUNTER_HELP = {
+    'owlet_ticks_total': 'Sync ticks run',
+    'owlet_tick_overruns_total': 'Scheduled sync slots skipped because a tick overran',
+    'owlet_auth_total': 'Owlet API logins and token refreshes',
+    'owlet_api_errors_total': 'Failed Owlet API requests',
+    'owlet_bytes_written_total': 'Bytes written per data file',
+    'owlet_writes_skipped_total': 'File writes skipped because the content was unchanged',
+    'owlet_writes_superseded_total': 'Queued file snapshots replaced by a newer one before being written',
+    'owlet_writer_backpressure_total': 'Hand-offs that waited because the writer queue was full',
+    'owlet_log_records_dropped_total': 'Log records dropped because the logging queue was full',
+    'owlet_events_total': 'Sleep events posted to the PHP endpoint',
+}
+
+# Account whose task records metrics, when a supervisor worker runs several
+metrics_account = contextvars.ContextVar('metrics_account', default=None)
+
+def set_metrics_account(name):
+    """Label the metrics recorded by the current task (and tasks and writes it starts) with an account"""
+    metrics_account.set(name)
+
+def with_account(labels):
+    """Label tuple of the current task: the given labels plus its account, sorted"""
+    account = metrics_account.get()
+    if account is not None:
+        labels = labels + (('account', account),)
+    return tuple(sorted(labels))
+
+def escape_label_value(value):
+    """Escape a label value as the exposition format requires (backslash, quote, newline)"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    """Render a sorted label tuple as {key="value",...}"""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label_value(value)}"' for key, value in labels) + '}'
+
+class Histogram:
+    """Cumulative-bucket latency histogram"""
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        """Record one observation"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def render(self, name, labels):
+        """Prometheus text lines of this histogram"""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{format_labels(labels + (("le", bound),))} {cumulative}')
+        lines.append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {self.count}')
+        lines.append(f'{name}_sum{format_labels(labels)} {self.sum:.6f}')
+        lines.append(f'{name}_count{format_labels(labels)} {self.count}')
+        return lines
+
+class MetricsRegistry:
+    """In-memory counters and stage histograms of the sync service.
+    
+    Recording is a dict update, so the metrics stay on in production; they
+    are only rendered when the text file is written or the endpoint is read.
+    A lock makes recording safe from the background writer thread. Series
+    recorded under an account (see set_metrics_account) carry an account
+    label and can be rendered on their own.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        # (stage, labels) -> histogram
+        self.stages = {}
+        # Account -> stage -> seconds spent in the account's current tick, for slow tick logging
+        self.tick_stages = {}
+    
+    def inc(self, name, amount=1, **labels):
+        """Increase a counter"""
+        key = (name, with_account(tuple(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+    
+    def observe(self, stage, seconds):
+        """Record the duration of one stage run"""
+        account = metrics_account.get()
+        key = (stage, with_account(()))
+        with self.lock:
+            histogram = self.stages.get(key)
+            if histogram is None:
+                histogram = self.stages[key] = Histogram()
+            histogram.observe(seconds)
+            tick_stages = self.tick_stages.setdefault(account, {})
+            tick_stages[stage] = tick_stages.get(stage, 0.0) + seconds
+    
+    @contextmanager
+    def timer(self, stage):
+        """Time the enclosed block as a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+    
+    def start_tick(self):
+        """Reset the per-tick stage breakdown of the current account"""
+        with self.lock:
+            self.tick_stages[metrics_account.get()] = {}
+    
+    def tick_breakdown(self):
+        """Stage durations of the current account's tick, slowest first"""
+        with self.lock:
+            tick_stages = self.tick_stages.get(metrics_account.get(), {})
+            stages = sorted(tick_stages.items(), key=lambda item: item[1], reverse=True)
+        return ', '.join(f'{stage}={seconds * 1000:.0f}ms' for stage, seconds in stages if stage != 'tick')
+    
+    def render(self, account=None):
+        """Metrics in the Prometheus text exposition format, only one account's when given"""
+        def selected(labels):
+            return account is None or ('account', account) in labels
+        
+        with self.lock:
+            counters = sorted(item for item in self.counters.items() if selected(item[0][1]))
+            stages = sorted(
+                (item for item in self.stages.items() if selected(item[0][1])),
+                key=lambda item: item[0]
+            )
+            
+            lines = []
+            for name in sorted({name for (name, _), _ in counters}):
+                lines.append(f'# HELP {name} {COUNTER_HELP.get(name, name)}')
+                lines.append(f'# TYPE {name} counter')
+                for (counter_name, labels), value in counters:
+                    if counter_name == name:
+                        lines.append(f'{name}{format_labels(labels)} {value}')
+            
+            if stages:
+                lines.append('# HELP owlet_stage_seconds Duration of each sync stage')
+                lines.append('# TYPE owlet_stage_seconds histogram')
+                for (stage, labels), histogram in stages:
+                    lines.extend(histogram.render('owlet_stage_seconds', tuple(sorted(labels + (('stage', stage),)))))
+            
+            return '\n'.join(lines) + '\n'
+    
+    def write_textfile(self, path, account=None):
+        """Write the metrics atomically, e.g. for node_exporter's textfile collector"""
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(self.render(account))
+            os.replace(tmp_path, path)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write metrics file {path}: {e}")
+            return False
+
+# Process-wide registry shared by all components
+metrics = MetricsRegistry()
+
+class MetricsServer:
+    """Tiny HTTP endpoint serving GET /metrics"""
+    
+    def __init__(self, registry, host='127.0.0.1', port=9464, account=None):
+        self.registry = registry
+        # Serve only this account's series when several share the registry
+        self.account = account
+        self.host = host
+        self.port = port
+        self.server = None
+    
+    async def start(self):
+        """Start listening, returns False if the port is unavailable"""
+        try:
+            self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        except OSError as e:
+            logger.error(f"Could not start metrics endpoint on {self.host}:{self.port}: {e}")
+            return False
+        logger.info(f"Metrics endpoint listening on {self.host}:{self.port}/metrics")
+        return True
+    
+    async def handle_client(self, reader, writer):
+        """Answer one HTTP request"""
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 10)
+            request_line = request.split(b'\r\n', 1)[0].decode('latin-1').split()
+            path = request_line[1].split('?', 1)[0] if len(request_line) > 1 else ''
+            
+            if request_line[:1] == ['GET'] and path == '/metrics':
+                body = self.registry.render(self.account).encode('utf-8')
+                status = b'200 OK'
+            else:
+                body = b''
+                status = b'404 Not Found'
+            
+            writer.write(
+                b'HTTP/1.1 ' + status + b'\r\n'
+                b'Content-Type: text/plain; version=0.0.4\r\n'
+                b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+                b'Connection: close\r\n\r\n' + body
+            )
+            await writer.drain()
+        except Exception:
+            pass
+        finally:
+            writer.close()
+    
+    async def close(self):
+        """Stop listening"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
@@ -0,0 +1,156 @@
+# ============================================
+# PUSH_SERVER.PY - Server-Sent Events stream of live vitals
+# ============================================
+
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = '/owlet/stream'
+
+# A client whose unsent data grows beyond this is too slow and gets dropped
+MAX_CLIENT_BUFFER_BYTES = 256 * 1024
+
+def request_origin(request):
+    """Origin header of a raw HTTP request, None when there is none"""
+    for line in request.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'origin':
+            return value.strip().decode('latin-1')
+    return None
+
+class VitalPushServer:
+    """Minimal SSE endpoint pushing every new vital to connected browsers.
+    
+    Each vital is encoded once and the same bytes are written to every
+    client. The newest vital of each device is kept so a client that
+    connects between syncs gets the current reading immediately.
+    """
+    
+    def __init__(self, config):
+        # Local only unless LAN exposure is configured explicitly
+        self.host = config.get('push_server_host', '127.0.0.1')
+        self.port = config.get('push_server_port', 8765)
+        self.max_clients = config.get('push_max_clients', 32)
+        self.keepalive_seconds = config.get('push_keepalive_seconds', 15)
+        # Page origins allowed to read the stream cross-origin, e.g. "http://192.168.1.10"
+        self.allowed_origins = set(config.get('push_allowed_origins', []))
+        
+        self.server = None
+        self.keepalive_task = None
+        self.clients = set()
+        # DSN -> encoded event of the newest vital
+        self.latest_events = {}
+    
+    async def start(self):
+        """Start listening, returns False if the port is unavailable"""
+        try:
+            self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        except OSError as e:
+            logger.error(f"Could not start push server on {self.host}:{self.port}: {e}")
+            return False
+        
+        self.keepalive_task = asyncio.ensure_future(self.keepalive())
+        logger.info(f"Push server listening on {self.host}:{self.port}{STREAM_PATH}")
+        return True
+    
+    async def handle_client(self, reader, writer):
+        """Answer one HTTP request, keeping stream connections open"""
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 10)
+        except Exception:
+            writer.close()
+            return
+        
+        request_line = request.split(b'\r\n', 1)[0].decode('latin-1').split()
+        path = request_line[1].split('?', 1)[0] if len(request_line) > 1 else ''
+        
+        if request_line[:1] != ['GET'] or path != STREAM_PATH:
+            writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            writer.close()
+            return
+        
+        origin = request_origin(request)
+        if origin is not None and origin not in self.allowed_origins:
+            logger.warning(f"Refused push client from origin {origin}")
+            writer.write(b'HTTP/1.1 403 Forbidden\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            writer.close()
+            return
+        
+        if len(self.clients) >= self.max_clients:
+            writer.write(b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            writer.close()
+            return
+        
+        cors = f'Access-Control-Allow-Origin: {origin}\r\nVary: Origin\r\n' if origin else ''
+        writer.write(
+            b'HTTP/1.1 200 OK\r\n'
+            b'Content-Type: text/event-stream\r\n'
+            b'Cache-Control: no-cache\r\n'
+            b'Connection: keep-alive\r\n' + cors.encode('latin-1') +
+            b'\r\n'
+            b'retry: 5000\n\n'
+        )
+        for event in self.latest_events.values():
+            writer.write(event)
+        self.clients.add(writer)
+        logger.info(f"Push client connected ({len(self.clients)} total)")
+        
+        try:
+            # Clients never send anything, EOF means they went away
+            while await reader.read(1024):
+                pass
+        except Exception:
+            pass
+        finally:
+            self.drop_client(writer)
+    
+    def drop_client(self, writer):
+        """Forget and close a client connection"""
+        if writer in self.clients:
+            self.clients.discard(writer)
+            logger.info(f"Push client disconnected ({len(self.clients)} total)")
+        writer.close()
+    
+    def broadcast(self, payload):
+        """Write the same bytes to every client"""
+        for writer in list(self.clients):
+            if writer.is_closing():
+                self.drop_client(writer)
+                continue
+            writer.write(payload)
+            if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER_BYTES:
+                logger.warning("Dropping push client that is not reading")
+                self.drop_client(writer)
+    
+    def publish(self, dsn, vital, primary=True):
+        """Push a new vital to all clients"""
+        try:
+            data = json.dumps({'dsn': dsn, 'primary': primary, 'vital': vital}, separators=(',', ':'))
+        except Exception as e:
+            logger.error(f"Could not encode vital for push: {e}")
+            return
+        
+        event = f"event: vital\ndata: {data}\n\n".encode('utf-8')
+        self.latest_events[dsn] = event
+        self.broadcast(event)
+    
+    async def keepalive(self):
+        """Send comments periodically so proxies keep idle streams open"""
+        while True:
+            await asyncio.sleep(self.keepalive_seconds)
+            self.broadcast(b': keepalive\n\n')
+    
+    async def close(self):
+        """Disconnect all clients and stop listening"""
+        if self.keepalive_task:
+            self.keepalive_task.cancel()
+            self.keepalive_task = None
+        for writer in list(self.clients):
+            self.drop_client(writer)
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
@@ -0,0 +1,310 @@
+# ============================================
+# RAW_ARCHIVE.PY - Compressed columnar archive of a day's raw vitals
+# ============================================
+
+import json
+import math
+import os
+import sys
+import struct
+import zlib
+import logging
+from array import array
+from datetime import datetime, timezone
+
+from .metrics import metrics
+from .time_index import vital_epoch_ms
+
+logger = logging.getLogger(__name__)
+
+# zstandard is optional, zlib (the gzip algorithm) is always available
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b'OWLRAW1\n'
+FOOTER = struct.Struct('<Q')
+
+# Column encodings: '?' flags, 'b'/'h'/'i' integers of 8/16/32 bits (the
+# type's minimum marks a missing value), 'd' floats (NaN) and 'j' JSON lists
+INT_TYPES = ('b', 'h', 'i')
+BOOL_MISSING = -1
+
+def int_missing(typecode):
+    """Sentinel of a missing value in an integer column"""
+    return -2 ** (array(typecode).itemsize * 8 - 1)
+
+def compress(payload, compression):
+    """Compress one chunk"""
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=19).compress(payload)
+    return zlib.compress(payload, 9)
+
+def decompress(payload, compression):
+    """Decompress one chunk"""
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Archive is zstd compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return zlib.decompress(payload)
+
+def to_little_endian(values):
+    """Array bytes in little-endian order"""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def from_little_endian(typecode, payload):
+    """Array from little-endian bytes"""
+    values = array(typecode)
+    values.frombytes(payload)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def column_type(values):
+    """Narrowest encoding able to hold every value of a column"""
+    present = [value for value in values if value is not None]
+    if all(isinstance(value, bool) for value in present):
+        return '?'
+    if all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+        low, high = min(present), max(present)
+        for typecode in INT_TYPES:
+            if int_missing(typecode) < low and high < -int_missing(typecode):
+                return typecode
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        return 'd'
+    return 'j'
+
+def encode_column(values, kind):
+    """Encode a column as bytes"""
+    if kind == '?':
+        return to_little_endian(array('b', (BOOL_MISSING if v is None else int(v) for v in values)))
+    if kind in INT_TYPES:
+        missing = int_missing(kind)
+        return to_little_endian(array(kind, (missing if v is None else v for v in values)))
+    if kind == 'd':
+        return to_little_endian(array('d', (math.nan if v is None else v for v in values)))
+    return json.dumps(values, separators=(',', ':')).encode('utf-8')
+
+def decode_column(payload, kind):
+    """Decode a column to a list with None for missing values"""
+    if kind == '?':
+        return [None if v == BOOL_MISSING else bool(v) for v in from_little_endian('b', payload)]
+    if kind in INT_TYPES:
+        missing = int_missing(kind)
+        return [None if v == missing else v for v in from_little_endian(kind, payload)]
+    if kind == 'd':
+        return [None if math.isnan(v) else v for v in from_little_endian('d', payload)]
+    return json.loads(payload)
+
+def format_timestamp_ms(ts_ms):
+    """ISO timestamp of epoch milliseconds, as used in vitals"""
+    dt = datetime.fromtimestamp(ts_ms / 1000, timezone.utc)
+    return dt.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+class RawArchiveWriter:
+    """Streaming writer of a local day's columnar archive.
+    
+    Every field of every local hour is a separately compressed chunk and
+    timestamps are stored as millisecond deltas, so a reader can load one
+    field or one hour without touching the rest. The chunk index is a
+    compressed JSON footer at the end of the file. Only the hour being
+    added is held in memory: add() takes vitals hour by hour and refuses
+    one of an earlier hour.
+    """
+    
+    def __init__(self, path, tz, date, compression='zlib'):
+        if compression == 'zstd' and zstandard is None:
+            logger.warning("zstandard is not installed, archiving raw vitals with zlib")
+            compression = 'zlib'
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.tz = tz
+        self.compression = compression
+        self.file = None
+        self.offset = 0
+        self.fields = set()
+        self.index = {'version': 1, 'date': date.isoformat(), 'timezone': str(tz), 'compression': compression,
+                      'fields': [], 'count': 0, 'hours': {}}
+        
+        # Local hour being collected and its (epoch ms, vital) entries
+        self.hour = None
+        self.entries = []
+    
+    def add(self, vital):
+        """Buffer a vital, writing out the previous hour once a new one starts"""
+        try:
+            ts_ms = vital_epoch_ms(vital)
+        except Exception:
+            return True
+        hour = datetime.fromtimestamp(ts_ms / 1000, timezone.utc).astimezone(self.tz).hour
+        if hour != self.hour:
+            if self.hour is not None and hour < self.hour:
+                return False
+            self.write_hour()
+            self.hour = hour
+        self.entries.append((ts_ms, vital))
+        return True
+    
+    def write_chunk(self, payload):
+        """Append a compressed chunk, returns its [offset, length]"""
+        chunk = compress(payload, self.compression)
+        self.file.write(chunk)
+        location = [self.offset, len(chunk)]
+        self.offset += len(chunk)
+        return location
+    
+    def write_hour(self, hour=None, entries=None):
+        """Write the chunks of one hour (by default the buffered one)"""
+        if entries is None:
+            hour, entries = self.hour, self.entries
+            self.entries = []
+        if not entries:
+            return
+        if self.file is None:
+            self.file = open(self.tmp_path, 'wb')
+            self.file.write(MAGIC)
+            self.offset = len(MAGIC)
+        
+        base_ms = entries[0][0]
+        previous = base_ms
+        deltas = array('i')
+        for ts_ms, _ in entries:
+            deltas.append(ts_ms - previous)
+            previous = ts_ms
+        
+        fields = sorted({key for _, vital in entries for key in vital} - {'timestamp', 'timestamp_ms'})
+        self.fields.update(fields)
+        columns = {'timestamp_ms': self.write_chunk(to_little_endian(deltas)) + ['delta']}
+        for field in fields:
+            values = [vital.get(field) for _, vital in entries]
+            if all(value is None for value in values):
+                continue
+            kind = column_type(values)
+            columns[field] = self.write_chunk(encode_column(values, kind)) + [kind]
+        
+        self.index['hours'][f"{hour:02d}"] = {'count': len(entries), 'base_ms': base_ms, 'columns': columns}
+        self.index['count'] += len(entries)
+    
+    def close(self):
+        """Write the footer and move the archive into place, returns the vitals written"""
+        self.write_hour()
+        if self.file is None:
+            return 0
+        
+        self.index['fields'] = sorted(self.fields)
+        footer = zlib.compress(json.dumps(self.index, separators=(',', ':')).encode('utf-8'), 9)
+        self.file.write(footer)
+        self.file.write(FOOTER.pack(len(footer)))
+        self.file.close()
+        size = self.offset + len(footer) + FOOTER.size
+        
+        os.replace(self.tmp_path, self.path)
+        metrics.inc('owlet_bytes_written_total', size, file=os.path.dirname(self.path))
+        return self.index['count']
+    
+    def abort(self):
+        """Drop the partly written archive"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            os.remove(self.tmp_path)
+        self.entries = []
+
+def write_raw_archive(path, vitals, tz, date, compression='zlib'):
+    """Write a local day's vitals, in any order, as a columnar archive (see RawArchiveWriter).
+    
+    Vitals are grouped by local hour first, keeping their original order
+    within the hour, so the whole day is held in memory.
+    """
+    writer = RawArchiveWriter(path, tz, date, compression)
+    hours = {}
+    for vital in vitals:
+        try:
+            ts_ms = vital_epoch_ms(vital)
+        except Exception:
+            continue
+        hour = datetime.fromtimestamp(ts_ms / 1000, timezone.utc).astimezone(tz).hour
+        hours.setdefault(hour, []).append((ts_ms, vital))
+    
+    try:
+        for hour, entries in sorted(hours.items()):
+            writer.write_hour(hour, entries)
+        return writer.close()
+    except Exception:
+        writer.abort()
+        raise
+
+class RawDayArchive:
+    """Reader of a columnar raw vitals archive.
+    
+    Opening only reads the footer index; columns are decompressed on
+    demand, one hour chunk at a time.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a raw vitals archive")
+            f.seek(-FOOTER.size, os.SEEK_END)
+            footer_size = FOOTER.unpack(f.read(FOOTER.size))[0]
+            f.seek(-FOOTER.size - footer_size, os.SEEK_END)
+            self.index = json.loads(zlib.decompress(f.read(footer_size)))
+        
+        self.date = self.index['date']
+        self.fields = self.index['fields']
+        self.count = self.index['count']
+        self.compression = self.index['compression']
+    
+    def hours(self):
+        """Local hours present in the archive"""
+        return sorted(int(hour) for hour in self.index['hours'])
+    
+    def _chunks(self, hour):
+        """Index entries of one hour or of the whole day"""
+        if hour is None:
+            return [self.index['hours'][key] for key in sorted(self.index['hours'])]
+        entry = self.index['hours'].get(f"{hour:02d}")
+        return [entry] if entry else []
+    
+    def _read_chunk(self, f, location):
+        """Read and decompress one chunk"""
+        offset, length = location[:2]
+        f.seek(offset)
+        return decompress(f.read(length), self.compression)
+    
+    def read_timestamps(self, hour=None):
+        """Epoch milliseconds of the samples of one hour or the whole day"""
+        timestamps = []
+        with open(self.path, 'rb') as f:
+            for entry in self._chunks(hour):
+                ts_ms = entry['base_ms']
+                for delta in from_little_endian('i', self._read_chunk(f, entry['columns']['timestamp_ms'])):
+                    ts_ms += delta
+                    timestamps.append(ts_ms)
+        return timestamps
+    
+    def read_field(self, field, hour=None):
+        """Values of one field, None where missing"""
+        values = []
+        with open(self.path, 'rb') as f:
+            for entry in self._chunks(hour):
+                location = entry['columns'].get(field)
+                if location is None:
+                    values.extend([None] * entry['count'])
+                else:
+                    values.extend(decode_column(self._read_chunk(f, location), location[2]))
+        return values
+    
+    def read_vitals(self, hour=None, fields=None):
+        """Rebuild vital dicts, oldest first, optionally with only some fields"""
+        timestamps = self.read_timestamps(hour)
+        vitals = [{'timestamp': format_timestamp_ms(ts_ms), 'timestamp_ms': ts_ms} for ts_ms in timestamps]
+        for field in fields or self.fields:
+            for vital, value in zip(vitals, self.read_field(field, hour)):
+                vital[field] = value
+        return vitals
@@ -0,0 +1,277 @@
+# ============================================
+# ROLLUPS.PY - Multi-resolution rollup tiers of vital history
+# ============================================
+
+import json
+import os
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+from .time_index import vital_epoch_ms
+from .vital_buffer import format_timestamp
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_METRICS = ('heart_rate', 'oxygen_saturation', 'skin_temperature', 'movement')
+
+# Tier name -> (bucket seconds, partition file date format, default retention days)
+ROLLUP_TIERS = {
+    '1m': (60, '%Y-%m-%d', 7),
+    '10m': (600, '%Y-%m-%d', 90),
+    '1h': (3600, '%Y-%m', 730),
+}
+
+class RollupBucket:
+    """count/sum/min/max per metric of one time bucket"""
+    
+    def __init__(self, start):
+        self.start = start
+        self.samples = 0
+        self.stats = {}
+    
+    def add(self, vital):
+        """Add one vital"""
+        self.samples += 1
+        for name in ROLLUP_METRICS:
+            value = vital.get(name)
+            if value is None:
+                continue
+            stat = self.stats.get(name)
+            if stat is None:
+                self.stats[name] = [1, value, value, value]
+            else:
+                stat[0] += 1
+                stat[1] += value
+                stat[2] = min(stat[2], value)
+                stat[3] = max(stat[3], value)
+    
+    def to_record(self):
+        """Compact record stored in the tier files"""
+        record = {'t': self.start, 'n': self.samples}
+        record.update(self.stats)
+        return record
+
+def format_record(record):
+    """Rollup record as served by range queries"""
+    point = {'timestamp': format_timestamp(record['t']), 'data_points': record['n']}
+    for name in ROLLUP_METRICS:
+        stat = record.get(name)
+        if stat:
+            count, total, minimum, maximum = stat
+            point[name] = {'avg': round(total / count, 2), 'min': minimum, 'max': maximum, 'count': count}
+    return point
+
+class RollupTier:
+    """Closed buckets of one resolution, appended to partition files"""
+    
+    def __init__(self, directory, name, resolution, partition_format, retention_days):
+        self.directory = os.path.join(directory, name)
+        self.name = name
+        self.resolution = resolution
+        self.partition_format = partition_format
+        self.retention_days = retention_days
+        Path(self.directory).mkdir(parents=True, exist_ok=True)
+        
+        self.bucket = None
+        self.pending = []
+        # End of the newest bucket already on disk, older samples are not re-added
+        self.flushed_until = self._read_flushed_until()
+    
+    def partition_path(self, start):
+        """File holding the bucket starting at start (epoch seconds)"""
+        key = datetime.fromtimestamp(start, timezone.utc).strftime(self.partition_format)
+        return os.path.join(self.directory, f"{key}.jsonl")
+    
+    def list_partitions(self):
+        """List (key, path) of partition files, oldest first"""
+        try:
+            names = sorted(name for name in os.listdir(self.directory) if name.endswith('.jsonl'))
+        except FileNotFoundError:
+            return []
+        return [(name[:-len('.jsonl')], os.path.join(self.directory, name)) for name in names]
+    
+    def _read_flushed_until(self):
+        """End time of the last bucket written before a restart"""
+        partitions = self.list_partitions()
+        if not partitions:
+            return 0
+        
+        last_record = None
+        try:
+            with open(partitions[-1][1], 'r') as f:
+                for line in f:
+                    if line.strip():
+                        last_record = line
+            return json.loads(last_record)['t'] + self.resolution if last_record else 0
+        except Exception as e:
+            logger.warning(f"Could not read last {self.name} rollup: {e}")
+            return 0
+    
+    def add(self, ts, vital):
+        """Add a vital at epoch seconds ts, closing the previous bucket if needed"""
+        start = int(ts // self.resolution * self.resolution)
+        if start < self.flushed_until:
+            return
+        
+        if self.bucket is not None and self.bucket.start != start:
+            self.pending.append(self.bucket.to_record())
+            self.flushed_until = self.bucket.start + self.resolution
+            self.bucket = None
+        
+        if self.bucket is None:
+            self.bucket = RollupBucket(start)
+        self.bucket.add(vital)
+    
+    def collect(self):
+        """Take the closed buckets as (path, lines) per partition file"""
+        by_partition = {}
+        for record in self.pending:
+            by_partition.setdefault(self.partition_path(record['t']), []).append(record)
+        self.pending = []
+        return [
+            (path, ''.join(json.dumps(r, separators=(',', ':')) + '\n' for r in records))
+            for path, records in by_partition.items()
+        ]
+    
+    def write(self, batches):
+        """Append collected lines to their partition files"""
+        try:
+            for path, lines in batches:
+                with open(path, 'a') as f:
+                    f.write(lines)
+                metrics.inc('owlet_bytes_written_total', len(lines), file=self.directory)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write {self.name} rollups: {e}")
+            return False
+    
+    def flush(self):
+        """Append closed buckets to their partition files"""
+        if not self.pending:
+            return True
+        
+        pending = self.pending
+        if self.write(self.collect()):
+            return True
+        # Kept for the next flush
+        self.pending = pending + self.pending
+        return False
+    
+    def drop_expired(self):
+        """Delete partitions entirely older than the retention, 0 keeps them forever"""
+        if self.retention_days <= 0:
+            return 0
+        cutoff_key = (datetime.now(timezone.utc) - timedelta(days=self.retention_days)).strftime(self.partition_format)
+        removed = 0
+        for key, path in self.list_partitions():
+            if key >= cutoff_key:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except Exception as e:
+                logger.error(f"Failed to remove {path}: {e}")
+        return removed
+    
+    def query(self, t0, t1):
+        """Closed and open buckets overlapping [t0, t1], oldest first"""
+        records = []
+        t0 = t0 // self.resolution * self.resolution
+        first_key = datetime.fromtimestamp(t0, timezone.utc).strftime(self.partition_format)
+        last_key = datetime.fromtimestamp(t1, timezone.utc).strftime(self.partition_format)
+        
+        for key, path in self.list_partitions():
+            if key < first_key or key > last_key:
+                continue
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if t0 <= record['t'] <= t1:
+                        records.append(record)
+        
+        # Buckets not on disk yet
+        for record in self.pending + ([self.bucket.to_record()] if self.bucket else []):
+            if t0 <= record['t'] <= t1:
+                records.append(record)
+        return records
+
+class RollupStore:
+    """Raw vitals rolled up into 1-minute, 10-minute and 1-hour tiers.
+    
+    Every tier keeps count/sum/min/max per metric and bucket, is maintained
+    incrementally as vitals arrive and has its own retention. A bucket is
+    written when the first vital of the next bucket arrives.
+    """
+    
+    def __init__(self, directory, config=None):
+        self.directory = directory
+        self.tiers = []
+        for name, (resolution, partition_format, retention_days) in ROLLUP_TIERS.items():
+            if config is not None:
+                retention_days = config.get(f'rollup_{name}_retention_days', retention_days)
+            self.tiers.append(RollupTier(directory, name, resolution, partition_format, retention_days))
+    
+    def resume_time(self):
+        """Epoch seconds from which history must be replayed after a restart"""
+        return min(tier.flushed_until for tier in self.tiers)
+    
+    def add(self, vital):
+        """Add a vital to every tier"""
+        try:
+            ts = vital_epoch_ms(vital) / 1000
+        except Exception as e:
+            logger.warning(f"Could not parse vital timestamp: {e}")
+            return False
+        for tier in self.tiers:
+            tier.add(ts, vital)
+        return True
+    
+    def has_pending(self):
+        """Whether closed buckets wait to be written"""
+        return any(tier.pending for tier in self.tiers)
+    
+    def flush(self):
+        """Write closed buckets of all tiers"""
+        success = True
+        for tier in self.tiers:
+            success = tier.flush() and success
+        return success
+    
+    def collect(self):
+        """Take the closed buckets of all tiers, to be written later by write()"""
+        return [(tier, tier.collect()) for tier in self.tiers if tier.pending]
+    
+    def write(self, collected):
+        """Write buckets taken by collect()"""
+        success = True
+        for tier, batches in collected:
+            success = tier.write(batches) and success
+        return success
+    
+    def drop_expired(self):
+        """Apply each tier's retention"""
+        removed = sum(tier.drop_expired() for tier in self.tiers)
+        if removed:
+            logger.info(f"Dropped {removed} expired rollup partitions")
+        return removed
+    
+    def pick_tier(self, resolution_seconds):
+        """Coarsest tier whose buckets are at most the requested resolution"""
+        candidates = [tier for tier in self.tiers if tier.resolution <= resolution_seconds]
+        if not candidates:
+            return self.tiers[0]
+        return max(candidates, key=lambda tier: tier.resolution)
+    
+    def query(self, t0, t1, resolution_seconds):
+        """Rolled up points of a time range (epoch seconds) at about the requested resolution"""
+        tier = self.pick_tier(resolution_seconds)
+        return {
+            'tier': tier.name,
+            'resolution_seconds': tier.resolution,
+            'points': [format_record(record) for record in tier.query(t0, t1)],
+        }
@@ -0,0 +1,90 @@
+# ============================================
+# SCHEDULER.PY - Drift-free adaptive sync cadence
+# ============================================
+
+import asyncio
+import math
+import time
+import logging
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Polling modes, fastest first
+MODE_ALERT = 'alert'
+MODE_NORMAL = 'normal'
+MODE_IDLE = 'idle'
+
+class SyncScheduler:
+    """Fire sync ticks on a fixed cadence of a monotonic clock.
+    
+    Slots are counted from an anchor instead of sleeping "interval" after
+    each sync, so sync time does not accumulate as drift. Slots missed while
+    a sync overran are skipped and counted rather than run back to back.
+    The interval adapts to the state of the monitored socks.
+    """
+    
+    def __init__(self, config, interval_seconds, clock=time.monotonic):
+        self.clock = clock
+        self.intervals = {
+            MODE_ALERT: min(config.get('alert_interval_seconds', 15), interval_seconds),
+            MODE_NORMAL: interval_seconds,
+            MODE_IDLE: max(config.get('idle_interval_seconds', 300), interval_seconds),
+        }
+        # How long after the sock is put on polling stays fast
+        self.sock_on_boost_seconds = config.get('sock_on_boost_seconds', 300)
+        
+        self.mode = MODE_NORMAL
+        self.next_time = self.clock()
+        self.missed_slots = 0
+    
+    def device_mode(self, device, now):
+        """Polling mode one device asks for"""
+        vital = device.latest_vital
+        if not vital:
+            return MODE_NORMAL
+        if vital.get('low_oxygen') or vital.get('high_heart_rate'):
+            return MODE_ALERT
+        if device.sock_on_since is not None and now - device.sock_on_since < self.sock_on_boost_seconds:
+            return MODE_ALERT
+        if not vital.get('sock_on') or vital.get('charging'):
+            return MODE_IDLE
+        return MODE_NORMAL
+    
+    def select_mode(self, devices):
+        """Fastest mode any device asks for (normal when nothing is known)"""
+        now = self.clock()
+        modes = [self.device_mode(device, now) for device in devices]
+        if not modes:
+            return MODE_NORMAL
+        if MODE_ALERT in modes:
+            return MODE_ALERT
+        if MODE_NORMAL in modes:
+            return MODE_NORMAL
+        return MODE_IDLE
+    
+    def advance(self, devices=()):
+        """Pick the next slot after a tick, returns the seconds until it"""
+        mode = self.select_mode(devices)
+        if mode != self.mode:
+            logger.info(f"Polling mode {self.mode} -> {mode} (every {self.intervals[mode]}s)")
+            self.mode = mode
+        
+        interval = self.intervals[mode]
+        now = self.clock()
+        self.next_time += interval
+        
+        if self.next_time <= now:
+            # The sync overran: skip the slots that already passed
+            missed = math.floor((now - self.next_time) / interval) + 1
+            self.next_time += missed * interval
+            self.missed_slots += missed
+            metrics.inc('owlet_tick_overruns_total', missed)
+            logger.warning(f"Sync overran, skipped {missed} slot(s) ({self.missed_slots} in total)")
+        
+        return self.next_time - now
+    
+    async def wait(self, devices=()):
+        """Sleep until the next slot"""
+        await asyncio.sleep(max(self.advance(devices), 0))
@@ -0,0 +1,242 @@
+# ============================================
+# SIMULATOR.PY - Synthetic Owlet sock and API for benchmarks and dry runs
+# ============================================
+
+import asyncio
+import random
+import logging
+from datetime import datetime, timezone, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Sleep states as reported by the sock
+SLEEP_AWAKE = 1
+SLEEP_DEEP = 2
+SLEEP_LIGHT = 8
+
+# Typical heart rate (bpm) per sleep state
+HEART_RATE_BASE = {SLEEP_AWAKE: 135, SLEEP_LIGHT: 122, SLEEP_DEEP: 112}
+
+# One infant sleep cycle: light sleep first, then deep sleep (minutes)
+SLEEP_CYCLE_MINUTES = 50
+LIGHT_SLEEP_MINUTES = 20
+
+class VitalSimulator:
+    """Generate realistic sock readings step by step.
+    
+    Alternates awake periods with sleep made of light/deep cycles, lets
+    heart rate and oxygen wander around state-dependent baselines, and
+    injects sock-off dropouts (charging meanwhile), desaturations and
+    high heart rate episodes at configurable rates per hour.
+    """
+    
+    def __init__(self, seed=None, start=None, step_seconds=60,
+                 dropouts_per_hour=0.1, desaturations_per_hour=0.2, high_heart_rate_per_hour=0.05):
+        self.random = random.Random(seed)
+        self.time = start or datetime.now(timezone.utc)
+        self.step_seconds = step_seconds
+        
+        # Event rates as probabilities per step
+        steps_per_hour = 3600 / step_seconds
+        self.dropout_chance = dropouts_per_hour / steps_per_hour
+        self.desaturation_chance = desaturations_per_hour / steps_per_hour
+        self.high_heart_rate_chance = high_heart_rate_per_hour / steps_per_hour
+        
+        self.asleep = False
+        self.state_seconds_left = self.random.uniform(20, 90) * 60
+        self.sleep_seconds = 0
+        self.off_seconds_left = 0
+        self.desaturation_seconds_left = 0
+        self.high_heart_rate_seconds_left = 0
+        
+        self.heart_rate = float(HEART_RATE_BASE[SLEEP_AWAKE])
+        self.oxygen = 97.0
+        self.oxygen_history = []
+        self.skin_temperature = 34.0
+        self.battery = 100.0
+    
+    def sleep_state(self):
+        """Current sleep state following the cycle position"""
+        if not self.asleep:
+            return SLEEP_AWAKE
+        cycle_position = (self.sleep_seconds / 60) % SLEEP_CYCLE_MINUTES
+        return SLEEP_LIGHT if cycle_position < LIGHT_SLEEP_MINUTES else SLEEP_DEEP
+    
+    def advance_state(self, seconds):
+        """Move the awake/asleep schedule and the episode timers forward"""
+        self.state_seconds_left -= seconds
+        if self.state_seconds_left <= 0:
+            self.asleep = not self.asleep
+            minutes = self.random.uniform(45, 180) if self.asleep else self.random.uniform(20, 90)
+            self.state_seconds_left = minutes * 60
+            self.sleep_seconds = 0
+        elif self.asleep:
+            self.sleep_seconds += seconds
+        
+        self.off_seconds_left = max(self.off_seconds_left - seconds, 0)
+        self.desaturation_seconds_left = max(self.desaturation_seconds_left - seconds, 0)
+        self.high_heart_rate_seconds_left = max(self.high_heart_rate_seconds_left - seconds, 0)
+        
+        if not self.off_seconds_left and self.random.random() < self.dropout_chance:
+            self.off_seconds_left = self.random.uniform(5, 40) * 60
+        if not self.desaturation_seconds_left and self.random.random() < self.desaturation_chance:
+            self.desaturation_seconds_left = self.random.uniform(1, 4) * 60
+        if not self.high_heart_rate_seconds_left and self.random.random() < self.high_heart_rate_chance:
+            self.high_heart_rate_seconds_left = self.random.uniform(3, 10) * 60
+    
+    def step(self):
+        """Advance one step, returns (time, sock properties)"""
+        self.time += timedelta(seconds=self.step_seconds)
+        self.advance_state(self.step_seconds)
+        
+        if self.off_seconds_left:
+            # Sock off the foot and on the base station
+            self.battery = min(self.battery + self.step_seconds / 60, 100.0)
+            self.oxygen_history = []
+            return self.time, {
+                'heart_rate': None,
+                'oxygen_saturation': None,
+                'oxygen_10_av': None,
+                'movement': None,
+                'skin_temperature': None,
+                'sleep_state': 0,
+                'battery_percentage': round(self.battery),
+                'battery_minutes': None,
+                'signal_strength': self.random.randint(60, 100),
+                'charging': 1,
+                'sock_off': True,
+                'sock_disconnected': False,
+                'low_battery_alert': False,
+                'high_heart_rate_alert': False,
+                'low_oxygen_alert': False,
+            }
+        
+        state = self.sleep_state()
+        
+        # Mean-reverting random walks around the state's baseline
+        heart_rate_target = HEART_RATE_BASE[state] + (90 if self.high_heart_rate_seconds_left else 0)
+        self.heart_rate += 0.3 * (heart_rate_target - self.heart_rate) + self.random.gauss(0, 3)
+        oxygen_target = 86 if self.desaturation_seconds_left else 97.5
+        self.oxygen += 0.4 * (oxygen_target - self.oxygen) + self.random.gauss(0, 0.6)
+        self.oxygen = min(self.oxygen, 100.0)
+        self.skin_temperature += 0.05 * (34.5 - self.skin_temperature) + self.random.gauss(0, 0.05)
+        self.battery = max(self.battery - self.step_seconds / 600, 0.0)
+        
+        oxygen = round(self.oxygen)
+        self.oxygen_history = (self.oxygen_history + [oxygen])[-10:]
+        movement = self.random.randint(3, 10) if state == SLEEP_AWAKE else self.random.randint(0, 3)
+        
+        return self.time, {
+            'heart_rate': round(self.heart_rate),
+            'oxygen_saturation': oxygen,
+            'oxygen_10_av': round(sum(self.oxygen_history) / len(self.oxygen_history)),
+            'movement': movement,
+            'skin_temperature': round(self.skin_temperature),
+            'sleep_state': state,
+            'battery_percentage': round(self.battery),
+            'battery_minutes': round(self.battery * 9),
+            'signal_strength': self.random.randint(60, 100),
+            'charging': 0,
+            'sock_off': False,
+            'sock_disconnected': False,
+            'low_battery_alert': self.battery < 15,
+            'high_heart_rate_alert': self.heart_rate >= 180,
+            'low_oxygen_alert': oxygen <= 88,
+        }
+
+def generate_vitals(data_processor, count, start=None, step_seconds=60, seed=0, **rates):
+    """Generate count history vitals, oldest first"""
+    if start is None:
+        start = datetime.now(timezone.utc) - timedelta(seconds=count * step_seconds)
+    simulator = VitalSimulator(seed=seed, start=start, step_seconds=step_seconds, **rates)
+    
+    vitals = []
+    for _ in range(count):
+        time, props = simulator.step()
+        vitals.append(data_processor.vital_from_properties(props, time))
+    return vitals
+
+class FakeSock:
+    """Stand-in for pyowletapi's Sock backed by a VitalSimulator"""
+    
+    def __init__(self, api, device_data):
+        self.api = api
+        self.serial = device_data['dsn']
+        self.properties = {}
+        self.simulator = api.simulator_for(self.serial)
+    
+    async def update_properties(self):
+        """Advance the simulator one step"""
+        await self.api.before_request()
+        _, self.properties = self.simulator.step()
+        return {'properties': self.properties}
+
+class FakeOwletAPI:
+    """Stand-in for pyowletapi's OwletAPI serving simulated socks.
+    
+    Takes the same constructor arguments, so it can be passed as the
+    api_factory of OwletAPIClient.
+    """
+    
+    def __init__(self, region, user, password, token=None, expiry=None, refresh=None, session=None,
+                 sock_count=1, seed=0, latency_seconds=0, **rates):
+        self.region = region
+        self.user = user
+        self.session = session
+        self.sock_count = sock_count
+        self.seed = seed
+        self.latency_seconds = latency_seconds
+        self.rates = rates
+        self.simulators = {}
+        
+        self._token = token
+        self._expiry = expiry
+        self._refresh = refresh
+    
+    @property
+    def tokens(self):
+        """Token triple in the OwletAPI format"""
+        return {'api_token': self._token, 'expiry': self._expiry, 'refresh': self._refresh}
+    
+    async def before_request(self):
+        """Simulate the cloud's response time"""
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+    
+    async def authenticate(self):
+        """Issue fake tokens valid for a day"""
+        await self.before_request()
+        if not self._token:
+            self._token = f"fake-token-{self.random_suffix()}"
+            self._refresh = f"fake-refresh-{self.random_suffix()}"
+        if not self._expiry:
+            self._expiry = datetime.now(timezone.utc).timestamp() + 86400
+        return self.tokens
+    
+    async def refresh_authentication(self):
+        """Extend the fake token"""
+        await self.before_request()
+        self._expiry = datetime.now(timezone.utc).timestamp() + 86400
+        return self.tokens
+    
+    def random_suffix(self):
+        """Short random token part"""
+        return f"{random.getrandbits(32):08x}"
+    
+    async def get_devices(self):
+        """List the simulated socks"""
+        await self.before_request()
+        return {'response': [
+            {'device': {'dsn': f"SIM{index:05d}", 'product_name': 'Smart Sock', 'connection_status': 'Online'}}
+            for index in range(self.sock_count)
+        ]}
+    
+    def simulator_for(self, dsn):
+        """Simulator of one sock, one step per update"""
+        if dsn not in self.simulators:
+            self.simulators[dsn] = VitalSimulator(seed=f"{self.seed}:{dsn}", **self.rates)
+        return self.simulators[dsn]
+    
+    async def close(self):
+        """Nothing to close"""
+        return None
@@ -0,0 +1,289 @@
+# ============================================
+# SQLITE_STORE.PY - SQLite storage backend for vitals, summaries and events
+# ============================================
+
+import json
+import os
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from .history_store import HistoryStore, iter_segment_file
+from .time_index import vital_epoch_ms
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DATABASE_FILE = 'owlet.db'
+
+# Rows fetched per lock acquisition when streaming vitals
+FETCH_SIZE = 1000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS vitals (
+    timestamp_ms INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS vitals_timestamp ON vitals (timestamp_ms);
+
+CREATE TABLE IF NOT EXISTS daily_summaries (
+    date TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT NOT NULL UNIQUE,
+    time TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_time ON events (time);
+'''
+
+def encode(data):
+    """Compact JSON text of a stored row"""
+    return json.dumps(data, separators=(',', ':'))
+
+class OwletDatabase:
+    """SQLite database shared with events.php.
+    
+    WAL mode lets PHP read (through PDO) while the service writes. All
+    queries are parameterized, so sqlite3's statement cache reuses the
+    prepared statements from tick to tick. The connection is shared with
+    the background writer thread, a lock keeps every call one transaction.
+    """
+    
+    def __init__(self, path, synchronous='NORMAL'):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(f'PRAGMA synchronous={synchronous}')
+        self.connection.executescript(SCHEMA)
+    
+    def close(self):
+        """Close the connection"""
+        with self.lock:
+            self.connection.close()
+    
+    def insert_vitals(self, vitals):
+        """Insert vitals in one transaction"""
+        rows = [(vital_epoch_ms(vital), encode(vital)) for vital in vitals]
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT INTO vitals (timestamp_ms, data) VALUES (?, ?)', rows)
+        metrics.inc('owlet_bytes_written_total', sum(len(row[1]) for row in rows), file=self.path)
+        return len(rows)
+    
+    def iter_vitals(self, t0_ms=None, t1_ms=None, newest_first=False):
+        """Stream vitals with t0_ms <= timestamp_ms <= t1_ms"""
+        order = 'DESC' if newest_first else 'ASC'
+        with self.lock:
+            cursor = self.connection.execute(
+                f'SELECT data FROM vitals WHERE timestamp_ms >= ? AND timestamp_ms <= ? ORDER BY timestamp_ms {order}',
+                (t0_ms if t0_ms is not None else -2 ** 63, t1_ms if t1_ms is not None else 2 ** 63 - 1)
+            )
+        # Fetched in batches, so the writer thread is never locked out for the whole scan
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                return
+            for (data,) in rows:
+                yield json.loads(data)
+    
+    def recent_vitals(self, limit):
+        """Newest vitals, newest first"""
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT data FROM vitals ORDER BY timestamp_ms DESC LIMIT ?', (limit,)
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+    
+    def count_vitals(self, t0_ms, t1_ms):
+        """Number of vitals in a time range"""
+        with self.lock:
+            return self.connection.execute(
+                'SELECT COUNT(*) FROM vitals WHERE timestamp_ms >= ? AND timestamp_ms <= ?', (t0_ms, t1_ms)
+            ).fetchone()[0]
+    
+    def delete_vitals_before(self, ts_ms):
+        """Delete vitals older than ts_ms"""
+        with self.lock, self.connection:
+            return self.connection.execute('DELETE FROM vitals WHERE timestamp_ms < ?', (ts_ms,)).rowcount
+    
+    def replace_vitals(self, vitals):
+        """Replace all vitals"""
+        rows = [(vital_epoch_ms(vital), encode(vital)) for vital in vitals]
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM vitals')
+            self.connection.executemany('INSERT INTO vitals (timestamp_ms, data) VALUES (?, ?)', rows)
+    
+    def save_summary(self, date_iso, summary):
+        """Insert or replace a daily summary"""
+        data = encode(summary)
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO daily_summaries (date, data) VALUES (?, ?)',
+                                    (date_iso, data))
+        metrics.inc('owlet_bytes_written_total', len(data), file=self.path)
+    
+    def load_summary(self, date_iso):
+        """Daily summary of a date, None if there is none"""
+        with self.lock:
+            row = self.connection.execute('SELECT data FROM daily_summaries WHERE date = ?', (date_iso,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def recent_summaries(self, limit):
+        """Newest daily summaries, newest first"""
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT data FROM daily_summaries ORDER BY date DESC LIMIT ?', (limit,)
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+    
+    def insert_events(self, events):
+        """Insert events given oldest first, replacing ones with the same id"""
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT INTO events (id, time, data) VALUES (?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET time = excluded.time, data = excluded.data',
+                [(str(event['id']), event.get('time'), encode(event)) for event in events]
+            )
+    
+    def load_events(self):
+        """All events, most recently added first like events.json"""
+        with self.lock:
+            rows = self.connection.execute('SELECT data FROM events ORDER BY rowid DESC').fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+class SQLiteHistoryStore:
+    """History store interface of HistoryStore on top of OwletDatabase.
+    
+    Expired vitals stay in the table when archiving is enabled (the indexed
+    table doubles as the archive), but only the retention window is streamed
+    into memory at startup.
+    """
+    
+    def __init__(self, database, retention_hours=48, keep_expired=True):
+        self.database = database
+        self.retention_hours = retention_hours
+        self.keep_expired = keep_expired
+    
+    def live_since_ms(self):
+        """Start of the retention window"""
+        return int((datetime.now(timezone.utc) - timedelta(hours=self.retention_hours)).timestamp() * 1000)
+    
+    def is_empty(self):
+        """Whether the store holds no vitals at all"""
+        return not self.database.recent_vitals(1)
+    
+    def append(self, vital):
+        """Append a single vital"""
+        return self.append_many([vital])
+    
+    def append_many(self, vitals, fsync=False):
+        """Insert vitals in one transaction, durability follows PRAGMA synchronous"""
+        try:
+            self.database.insert_vitals(vitals)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to insert vitals into {self.database.path}: {e}")
+            return False
+    
+    def iter_vitals(self, newest_first=False):
+        """Stream the vitals of the retention window"""
+        return self.database.iter_vitals(self.live_since_ms(), newest_first=newest_first)
+    
+    def iter_range(self, t0, t1):
+        """Stream live and expired vitals between epoch seconds t0 and t1, oldest first"""
+        return self.database.iter_vitals(int(t0 * 1000), int(t1 * 1000))
+    
+    def load_recent(self, limit):
+        """Load the newest vitals, newest first"""
+        return self.database.recent_vitals(limit)
+    
+    def load_all(self):
+        """Load the vitals of the retention window, newest first"""
+        return list(self.iter_vitals(newest_first=True))
+    
+    def replace_all(self, vitals):
+        """Replace all vitals"""
+        try:
+            self.database.replace_vitals(vitals)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to rewrite vitals in {self.database.path}: {e}")
+            return False
+    
+    def drop_expired(self, retention_hours=48):
+        """Delete vitals older than the retention, unless they are kept as the archive"""
+        self.retention_hours = retention_hours
+        if self.keep_expired:
+            return 0
+        
+        removed = self.database.delete_vitals_before(self.live_since_ms())
+        if removed:
+            logger.info(f"Dropped {removed} expired vitals")
+        return removed
+    
+    def drop_expired_archive(self, archive_days):
+        """Delete kept vitals older than archive_days (0 keeps them forever)"""
+        if not archive_days:
+            return 0
+        
+        cutoff = datetime.now(timezone.utc) - timedelta(days=archive_days)
+        removed = self.database.delete_vitals_before(int(cutoff.timestamp() * 1000))
+        if removed:
+            logger.info(f"Deleted {removed} archived vitals older than {archive_days} days")
+        return removed
+    
+    def import_legacy(self, legacy_file):
+        """Legacy single-file history is imported by migrate_to_sqlite"""
+        return False
+
+def migrate_to_sqlite(base_dir='', events_file=None):
+    """One-shot copy of a JSON file tree (history, archive, summaries, events) into owlet.db"""
+    def path(name):
+        return os.path.join(base_dir, name) if base_dir else name
+    
+    database = OwletDatabase(path(DATABASE_FILE))
+    try:
+        # Vitals of the live and archived segments, one transaction per segment
+        if not database.recent_vitals(1):
+            store = HistoryStore(path('owlet_history'), path('owlet_history_archive'))
+            segments = store.list_all_segments()
+            count = 0
+            for key in sorted(segments):
+                count += database.insert_vitals(iter_segment_file(segments[key]))
+            
+            legacy_file = path('owlet_history.json')
+            if not segments and os.path.exists(legacy_file):
+                with open(legacy_file, 'r') as f:
+                    legacy = [v for v in json.load(f) or [] if isinstance(v, dict) and v.get('timestamp')]
+                legacy.sort(key=vital_epoch_ms)
+                count += database.insert_vitals(legacy)
+            logger.info(f"Migrated {count} vitals into {database.path}")
+        else:
+            logger.info(f"{database.path} already holds vitals, skipping them")
+        
+        summaries_dir = path('owlet_daily_summaries')
+        names = sorted(
+            name for name in (os.listdir(summaries_dir) if os.path.isdir(summaries_dir) else [])
+            if name.startswith('owlet_summary_') and name.endswith('.json')
+        )
+        for name in names:
+            with open(os.path.join(summaries_dir, name), 'r') as f:
+                summary = json.load(f)
+            if summary and 'date' in summary:
+                database.save_summary(summary['date'], summary)
+        logger.info(f"Migrated {len(names)} daily summaries into {database.path}")
+        
+        if events_file and os.path.exists(events_file):
+            with open(events_file, 'r') as f:
+                events = [e for e in json.load(f) or [] if isinstance(e, dict) and 'id' in e]
+            # events.json lists the newest first
+            database.insert_events(reversed(events))
+            # events.php switches to the database once the JSON file is gone
+            os.replace(events_file, events_file + '.bak')
+            logger.info(f"Migrated {len(events)} events into {database.path}")
+    finally:
+        database.close()
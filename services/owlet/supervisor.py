@@ -0,0 +1,234 @@
+# ============================================
+# SUPERVISOR.PY - Many accounts sharded over worker processes
+# ============================================
+
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+import logging
+
+from services.config.config_loader import ConfigLoader
+from .sync_service import OwletSyncService
+from .logging_setup import setup_logging, set_log_account
+
+logger = logging.getLogger(__name__)
+
+# Default output directory of an account without a data_dir
+ACCOUNTS_DIR = 'owlet_accounts'
+
+# Backoff before restarting a crashed worker, reset once it stayed up
+RESTART_MAX_SECONDS = 300
+RESTART_RESET_SECONDS = 600
+# How long workers get to flush and close on shutdown
+STOP_TIMEOUT_SECONDS = 30
+
+def load_accounts(settings, accounts_file):
+    """Account entries of the accounts file as dicts with name, config and data_dir.
+    
+    An entry is either the path of an account's config file or a dict with
+    "config" and optional "name" and "data_dir". Relative paths are relative
+    to the accounts file. Raises ValueError when two accounts would share
+    files.
+    """
+    root = os.path.dirname(os.path.abspath(accounts_file))
+    
+    def resolve(path):
+        return os.path.normpath(os.path.join(root, path))
+    
+    accounts = []
+    for entry in settings.get('accounts') or []:
+        if isinstance(entry, str):
+            entry = {'config': entry}
+        if not entry.get('config'):
+            raise ValueError(f"Account entry without a config file: {entry}")
+        
+        name = entry.get('name') or os.path.splitext(os.path.basename(entry['config']))[0]
+        accounts.append({
+            'name': name,
+            'config': resolve(entry['config']),
+            'data_dir': resolve(entry.get('data_dir') or os.path.join(ACCOUNTS_DIR, name)),
+        })
+    
+    for key in ('name', 'data_dir'):
+        values = [account[key] for account in accounts]
+        duplicates = sorted({value for value in values if values.count(value) > 1})
+        if duplicates:
+            raise ValueError(f"Accounts must not share a {key}: {', '.join(duplicates)}")
+    return accounts
+
+def shard_accounts(accounts, workers):
+    """Deal the accounts, sorted by name, round-robin over the workers"""
+    accounts = sorted(accounts, key=lambda account: account['name'])
+    workers = max(min(workers, len(accounts)), 1)
+    return [accounts[index::workers] for index in range(workers)]
+
+def worker_log_settings(settings, index):
+    """Logging settings of a worker: its own log file next to the supervisor's"""
+    worker_settings = dict(settings)
+    log_file = settings.get('log_file', 'owlet_sync.log')
+    if log_file:
+        root, ext = os.path.splitext(log_file)
+        worker_settings['log_file'] = f"{root}.worker{index}{ext}"
+    return worker_settings
+
+async def run_account(account, gate, start_delay):
+    """Run one account's sync service until cancelled"""
+    set_log_account(account['name'])
+    # Spread the accounts' ticks over the interval instead of polling them all at once
+    await asyncio.sleep(start_delay)
+    
+    try:
+        service = OwletSyncService(account['config'], account['data_dir'], account=account['name'])
+    except Exception as e:
+        logger.error(f"Could not start account: {e}")
+        return False
+    
+    is_valid, msg = service.config_loader.validate()
+    if not is_valid:
+        logger.error(f"Configuration error in {account['config']}: {msg}")
+        await service.close()
+        return False
+    
+    logger.info(f"Account started in {account['data_dir']}")
+    service.sync_gate = gate
+    await service.run_service()
+    return True
+
+async def run_accounts(accounts, settings):
+    """Run the accounts of one worker as concurrent services until SIGTERM.
+    
+    The accounts share a semaphore bounding how many sync at once; asyncio
+    wakes its waiters in order, so every account gets its turn. A failing
+    account is logged and does not affect the others.
+    """
+    gate = asyncio.Semaphore(settings.get('max_concurrent_syncs', 4))
+    stagger_seconds = settings.get('stagger_seconds', 60)
+    tasks = [
+        asyncio.create_task(run_account(account, gate, stagger_seconds * index / len(accounts)))
+        for index, account in enumerate(accounts)
+    ]
+    
+    def cancel_all():
+        for task in tasks:
+            task.cancel()
+    
+    # Cancelled services still flush and close their files
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, cancel_all)
+    
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for account, result in zip(accounts, results):
+        if isinstance(result, Exception):
+            logger.error(f"Account {account['name']} failed: {result}")
+    return results
+
+def run_worker(index, accounts, settings):
+    """Worker process entry point"""
+    # Ctrl-C reaches the whole process group; the supervisor stops workers with SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stop_logging = setup_logging(worker_log_settings(settings, index))
+    logger.info(f"Worker {index} running {len(accounts)} accounts: {', '.join(a['name'] for a in accounts)}")
+    try:
+        asyncio.run(run_accounts(accounts, settings))
+    finally:
+        stop_logging()
+
+class Supervisor:
+    """Start one worker process per shard of accounts and keep them running.
+    
+    Workers are spawned rather than forked, so they start without the
+    supervisor's threads and open files. A worker that dies is restarted
+    with the same accounts after an increasing delay.
+    """
+    
+    def __init__(self, accounts_file, workers=None):
+        self.accounts_file = accounts_file
+        self.settings = ConfigLoader(accounts_file).config or {}
+        self.accounts = load_accounts(self.settings, accounts_file)
+        
+        workers = workers or self.settings.get('workers') or os.cpu_count() or 1
+        self.shards = shard_accounts(self.accounts, workers) if self.accounts else []
+        
+        self.context = multiprocessing.get_context('spawn')
+        self.processes = {}
+        self.started_at = {}
+        self.restart_delays = {}
+        self.restart_at = {}
+        self.stopping = False
+    
+    def start_worker(self, index):
+        """Start the process of a shard"""
+        process = self.context.Process(
+            target=run_worker, args=(index, self.shards[index], self.settings),
+            name=f'owlet-worker-{index}'
+        )
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = time.monotonic()
+        self.restart_at.pop(index, None)
+    
+    def check_workers(self):
+        """Schedule restarts of workers that exited and run the due ones"""
+        now = time.monotonic()
+        for index, process in list(self.processes.items()):
+            if process.is_alive() or index in self.restart_at:
+                continue
+            if process.exitcode == 0:
+                # Every account of the worker stopped on its own (e.g. bad config)
+                logger.warning(f"Worker {index} exited, its accounts are not synced")
+                del self.processes[index]
+                continue
+            
+            if now - self.started_at[index] >= RESTART_RESET_SECONDS:
+                self.restart_delays[index] = 0
+            delay = min(max(self.restart_delays.get(index, 0) * 2, 5), RESTART_MAX_SECONDS)
+            self.restart_delays[index] = delay
+            self.restart_at[index] = now + delay
+            logger.error(f"Worker {index} died (exit code {process.exitcode}), restarting in {delay}s")
+        
+        for index, restart_time in list(self.restart_at.items()):
+            if now >= restart_time:
+                self.start_worker(index)
+    
+    def request_stop(self, *_):
+        """Signal handler: stop after the current check"""
+        self.stopping = True
+    
+    def stop(self):
+        """Ask every worker to flush and exit, kill the ones that do not"""
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + STOP_TIMEOUT_SECONDS
+        for index, process in self.processes.items():
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning(f"Worker {index} did not stop in time, killing it")
+                process.kill()
+                process.join()
+    
+    def run(self):
+        """Run the workers until SIGTERM or Ctrl-C, returns False without accounts"""
+        if not self.accounts:
+            logger.error(f"No accounts in {self.accounts_file}")
+            return False
+        
+        logger.info(f"Supervising {len(self.accounts)} accounts in {len(self.shards)} worker processes")
+        signal.signal(signal.SIGTERM, self.request_stop)
+        for index in range(len(self.shards)):
+            self.start_worker(index)
+        
+        try:
+            while self.processes:
+                time.sleep(1)
+                if self.stopping:
+                    break
+                self.check_workers()
+        except KeyboardInterrupt:
+            logger.info("Supervisor interrupted")
+        finally:
+            self.stop()
+        
+        logger.info("All workers stopped")
+        return True
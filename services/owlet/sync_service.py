@@ -3,37 +3,67 @@
 # ============================================
 
 import asyncio
-import logging
 import os
-from datetime import datetime, timezone, timedelta
+import time
+import logging
+from contextlib import nullcontext
 
 from services.config.config_loader import ConfigLoader
 from .api_client import OwletAPIClient
 from .data_processor import VitalDataProcessor
 from .file_manager import OwletFileManager
 from .event_creator import EventCreator
+from .device_sync import DeviceSync
+from .scheduler import SyncScheduler
+from .push_server import VitalPushServer
+from .metrics import metrics, MetricsServer, set_metrics_account
 
 logger = logging.getLogger(__name__)
 
+# Output directory of every device except the primary one
+DEVICES_DIR = 'owlet_devices'
+
 class OwletSyncService:
     """Main orchestrator for Owlet data syncing"""
     
-    def __init__(self, config_file='owlet_config.json'):
+    def __init__(self, config_file='owlet_config.json', base_dir='', account=None):
+        # Metrics recorded by this task carry the account label when several share a process
+        self.account = account
+        if account is not None:
+            set_metrics_account(account)
+        
         self.config_loader = ConfigLoader(config_file)
         self.config = self.config_loader.config
         self.timezone = self.config_loader.timezone
+        # Every file of the account lives here, so several accounts can share a process
+        self.base_dir = base_dir
         
         # Initialize components
-        self.api_client = OwletAPIClient(self.config_loader)
-        self.data_processor = VitalDataProcessor(self.timezone)
-        self.file_manager = OwletFileManager(self.timezone)
+        self.api_client = OwletAPIClient(self.config_loader, base_dir=base_dir)
+        self.history_interval_seconds = self.config_loader.get('history_interval_seconds', 60)
+        self.data_processor = VitalDataProcessor(self.timezone, self.history_interval_seconds)
+        self.file_manager = OwletFileManager(self.timezone, self.config_loader, base_dir=base_dir)
         self.event_creator = EventCreator(self.config_loader)
         
-        # State tracking
-        self.last_sleep_state = None
-        self.last_history_save_time = None
-        self.last_daily_cleanup_time = None
-        self.last_hourly_update_time = None
+        # Optional SSE stream of live vitals for the web UI
+        self.push_server = VitalPushServer(self.config_loader) if self.config_loader.get('push_server_enabled', False) else None
+        
+        # Metrics are always collected, exported only when configured
+        self.metrics_file = self.config_loader.get('metrics_file')
+        if self.metrics_file and base_dir and not os.path.isabs(self.metrics_file):
+            self.metrics_file = os.path.join(base_dir, self.metrics_file)
+        metrics_port = self.config_loader.get('metrics_port')
+        self.metrics_server = MetricsServer(
+            metrics, self.config_loader.get('metrics_host', '127.0.0.1'), metrics_port, self.account
+        ) if metrics_port else None
+        self.slow_tick_seconds = self.config_loader.get('slow_tick_seconds', 5)
+        
+        # Per-device pipelines by DSN, created when a device is first discovered
+        self.devices = {}
+        self.primary_dsn = self.config_loader.get('primary_device_dsn')
+        
+        # Shared by the accounts of a supervisor worker to bound concurrent syncs
+        self.sync_gate = None
     
     async def authenticate(self):
         """Authenticate with Owlet API"""
@@ -43,189 +73,183 @@ class OwletSyncService:
         """Fetch device data"""
         return await self.api_client.fetch_device_data()
     
-    def should_perform_daily_cleanup(self):
-        """Check if we should perform daily cleanup"""
-        current_time = datetime.now(timezone.utc)
+    def get_device(self, dsn, all_dsns):
+        """Get the pipeline of a device, creating it on first sight"""
+        device = self.devices.get(dsn)
+        if device is not None:
+            return device
         
-        if self.last_daily_cleanup_time is None:
-            return True
+        if self.primary_dsn is None:
+            # Deterministic choice so a restart keeps writing to the same files
+            self.primary_dsn = sorted(all_dsns)[0]
         
-        time_since_last = (current_time - self.last_daily_cleanup_time).total_seconds()
-        return time_since_last >= 86400  # 24 hours
-    
-    def should_update_hourly(self):
-        """Check if we should update hourly data"""
-        current_time = datetime.now(timezone.utc).astimezone(self.timezone)
+        if dsn == self.primary_dsn:
+            # The primary device keeps the top-level files events.php serves by default
+            file_manager = self.file_manager
+        else:
+            file_manager = OwletFileManager(
+                self.timezone, self.config_loader, base_dir=os.path.join(self.base_dir, DEVICES_DIR, dsn)
+            )
         
-        if self.last_hourly_update_time is None:
-            return True
-        
-        time_since_last = (current_time - self.last_hourly_update_time).total_seconds()
-        return time_since_last >= 3600  # 1 hour
+        logger.info(f"Tracking device {dsn} in {file_manager.base_dir or '.'}")
+        device = DeviceSync(
+            dsn, self.config_loader, self.timezone, self.data_processor, file_manager,
+            on_vital=self.publish_vital if self.push_server else None
+        )
+        device.run_maintenance()
+        self.devices[dsn] = device
+        self.save_devices_index()
+        return device
+    
+    def publish_vital(self, dsn, vital):
+        """Push a freshly extracted vital to live clients"""
+        self.push_server.publish(dsn, vital, primary=dsn == self.primary_dsn)
     
-    def should_save_to_history(self, current_time):
-        """Check if we should save to history"""
-        if self.last_history_save_time is None:
-            return True
-        
-        interval_seconds = self.config.get('history_interval_seconds', 60)
-        time_since_last = (current_time - self.last_history_save_time).total_seconds()
-        return time_since_last >= interval_seconds
+    def save_devices_index(self):
+        """List known devices and where their files live"""
+        self.file_manager.write_json(self.file_manager.devices_file, [
+            {
+                'dsn': dsn,
+                'primary': dsn == self.primary_dsn,
+                # Relative to the account's directory, where events.php reads it
+                'data_dir': os.path.relpath(device.file_manager.base_dir or '.', self.base_dir or '.')
+            }
+            for dsn, device in sorted(self.devices.items())
+        ])
     
     async def sync(self):
-        """Main sync operation"""
+        """Main sync operation, timed stage by stage"""
+        metrics.start_tick()
+        metrics.inc('owlet_ticks_total')
+        start = time.perf_counter()
+        try:
+            with metrics.timer('tick'):
+                return await self.sync_stages()
+        finally:
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.slow_tick_seconds:
+                logger.warning("Slow sync tick (%.1fs): %s", elapsed, metrics.tick_breakdown())
+    
+    async def sync_stages(self):
+        """Maintenance, authentication, discovery and polling of every device"""
         logger.info("Starting Owlet sync...")
         
-        # Daily cleanup
-        if self.should_perform_daily_cleanup():
-            logger.info("Performing daily cleanup...")
-            self.cleanup_yesterdays_data()
-            self.last_daily_cleanup_time = datetime.now(timezone.utc)
-        
-        # Hourly update
-        if self.should_update_hourly():
-            logger.info("Updating today's hourly data...")
-            self.update_todays_hourly()
-            self.last_hourly_update_time = datetime.now(timezone.utc).astimezone(self.timezone)
+        # Daily cleanup and hourly update of known devices
+        with metrics.timer('maintenance'):
+            for device in self.devices.values():
+                device.run_maintenance()
         
         # Authenticate
-        if not await self.authenticate():
+        with metrics.timer('auth'):
+            authenticated = await self.authenticate()
+        if not authenticated:
             logger.error("Failed to authenticate")
             return False
         
-        # Fetch device data
-        sock = await self.fetch_device_data()
-        if not sock:
+        # Discover devices (cached Sock objects per DSN)
+        with metrics.timer('discover'):
+            socks = await self.api_client.discover_devices()
+        if not socks:
             logger.warning("Failed to fetch device data")
             return False
         
-        # Extract and save vital data
-        vital = self.data_processor.extract_vital_data(sock)
-        if vital:
-            # Save real-time data
-            self.file_manager.save_latest(vital)
-            
-            # Save to history if interval passed
-            current_time = datetime.now(timezone.utc)
-            if self.should_save_to_history(current_time):
-                history = self.file_manager.load_history()
-                history.insert(0, vital)
-                
-                # Cleanup old history
-                retention_hours = self.config.get('retention_hours', 48)
-                history = self.file_manager.cleanup_old_vitals(history, retention_hours)
-                self.file_manager.save_history(history)
-                self.last_history_save_time = current_time
-                logger.info(f"Saved to history. Total entries: {len(history)}")
-        
-        # Auto-create sleep events
-        if self.config.get('auto_create_events', True):
-            current_sleep_state = self.data_processor.detect_sleep_state(sock)
-            
-            if current_sleep_state is not None and self.last_sleep_state is not None:
-                if current_sleep_state and not self.last_sleep_state:
-                    # Fell asleep
-                    if self.event_creator.should_create_sleep_event('Sleep Start'):
-                        self.event_creator.create_event('Sleep Start', '😴', 'Detected by Owlet')
-                elif not current_sleep_state and self.last_sleep_state:
-                    # Woke up
-                    if self.event_creator.should_create_sleep_event('Sleep End'):
-                        self.event_creator.create_event('Sleep End', '😴', 'Detected by Owlet')
-            
-            self.last_sleep_state = current_sleep_state
-        
-        logger.info("Sync completed successfully")
+        for dsn in socks:
+            self.get_device(dsn, socks)
+        
+        # Poll every device concurrently, each saves its data as soon as it arrives
+        results = await asyncio.gather(*(self.sync_device(dsn) for dsn in socks))
+        
+        if not any(results):
+            logger.warning("Failed to fetch device data")
+            return False
+        
+        logger.info("Sync completed successfully (%d/%d devices)", sum(results), len(results))
+        return True
+    
+    async def sync_device(self, dsn):
+        """Fetch, save and process one device"""
+        with metrics.timer('fetch'):
+            sock = await self.api_client.update_device(dsn)
+        if not sock:
+            return False
+        
+        device = self.devices[dsn]
+        device.record(sock)
+        
+        # Auto-create sleep and desaturation events
+        events = device.detect_events(sock)
+        if self.config_loader.get('auto_create_events', True):
+            for event_type, icon, notes, event_time in events:
+                if len(self.devices) > 1:
+                    notes = f"{notes} ({dsn})"
+                # Posted in the background, the endpoint never delays the sync
+                self.event_creator.submit_event(event_type, icon, notes, event_time)
+        
         return True
     
     def cleanup_yesterdays_data(self):
-        """Archive yesterday's data into summary"""
-        try:
-            current_time = datetime.now(timezone.utc)
-            yesterday = (current_time - timedelta(days=1)).date()
-            
-            yesterday_summary_file = self.file_manager.get_daily_summary_filename(yesterday)
-            
-            if not os.path.exists(yesterday_summary_file):
-                logger.info("Creating yesterday's summary...")
-                
-                # Load history and filter for yesterday's data
-                history = self.file_manager.load_history()
-                yesterday_vitals = []
-                yesterday_start = datetime.combine(yesterday, datetime.min.time(), tzinfo=timezone.utc)
-                yesterday_end = datetime.combine(yesterday, datetime.max.time(), tzinfo=timezone.utc)
-                
-                for vital in history:
-                    try:
-                        vital_time = datetime.fromisoformat(vital['timestamp'].replace('Z', '+00:00'))
-                        if yesterday_start <= vital_time <= yesterday_end:
-                            yesterday_vitals.append(vital)
-                    except Exception as e:
-                        logger.warning(f"Could not parse timestamp: {e}")
-                
-                if yesterday_vitals:
-                    summary = self.data_processor.aggregate_vitals_to_summary(yesterday_vitals)
-                    if summary:
-                        self.file_manager.save_daily_summary(summary, yesterday)
-                        logger.info(f"Created yesterday's summary")
-            
-            logger.info("Daily cleanup completed")
-        except Exception as e:
-            logger.error(f"Error during cleanup: {e}")
+        """Create yesterday's summaries of all devices"""
+        for device in self.devices.values():
+            device.cleanup_yesterdays_data()
     
     def update_todays_hourly(self):
-        """Update today's hourly aggregated data"""
-        try:
-            current_time = datetime.now(timezone.utc).astimezone(self.timezone)
-            current_hour = current_time.hour
-            
-            # Load history for past hour
-            history = self.file_manager.load_history()
-            if not history:
-                logger.debug("No historical data for hourly update")
-                return
-            
-            one_hour_ago = current_time - timedelta(hours=1)
-            past_hour_vitals = []
-            
-            for vital in history:
-                try:
-                    vital_time = datetime.fromisoformat(vital['timestamp'].replace('Z', '+00:00'))
-                    if vital_time >= one_hour_ago and vital_time <= current_time:
-                        past_hour_vitals.append(vital)
-                except:
-                    pass
-            
-            if not past_hour_vitals:
-                logger.debug("No data from past hour")
-                return
-            
-            # Create hourly entry
-            # TODO: Implement detailed hourly aggregation
-            logger.info(f"Updated hour {current_hour}")
-        except Exception as e:
-            logger.error(f"Failed to update hourly: {e}")
+        """Persist today's hourly data of all devices"""
+        for device in self.devices.values():
+            device.update_todays_hourly()
+    
+    def flush(self):
+        """Flush coalesced writes of all devices"""
+        self.file_manager.flush()
+        for device in self.devices.values():
+            if device.file_manager is not self.file_manager:
+                device.file_manager.flush()
+        
+        if self.metrics_file:
+            metrics.write_textfile(self.metrics_file, self.account)
     
     async def close(self):
         """Close connections"""
+        self.flush()
+        for device in self.devices.values():
+            if device.file_manager is not self.file_manager:
+                device.file_manager.close()
+        self.file_manager.close()
+        if self.push_server:
+            await self.push_server.close()
+        if self.metrics_server:
+            await self.metrics_server.close()
+        await self.event_creator.close()
         await self.api_client.close()
     
     async def run_service(self):
         """Run service continuously"""
-        sync_interval_seconds = self.config.get('sync_interval_seconds', 60)
+        sync_interval_seconds = self.config_loader.get('sync_interval_seconds', 60)
         if sync_interval_seconds == 0:
-            sync_interval_seconds = self.config.get('sync_interval_minutes', 1) * 60
+            sync_interval_seconds = self.config_loader.get('sync_interval_minutes', 1) * 60
         
         logger.info(f"Starting service (interval: {sync_interval_seconds}s)")
+        scheduler = SyncScheduler(self.config_loader, sync_interval_seconds) if sync_interval_seconds > 0 else None
+        
+        if self.push_server:
+            await self.push_server.start()
+        if self.metrics_server:
+            await self.metrics_server.start()
         
         try:
             while True:
                 try:
-                    await self.sync()
+                    # Waits for a free slot when accounts share a worker
+                    async with self.sync_gate or nullcontext():
+                        await self.sync()
                 except Exception as e:
                     logger.error(f"Error during sync: {e}")
+                finally:
+                    # One flush per tick when writes are coalesced
+                    self.flush()
                 
-                if sync_interval_seconds > 0:
-                    await asyncio.sleep(sync_interval_seconds)
+                if scheduler:
+                    # Fixed cadence, faster on alerts and slower while the sock is off
+                    await scheduler.wait(self.devices.values())
         except KeyboardInterrupt:
             logger.info("Service interrupted")
         finally:
@@ -0,0 +1,64 @@
+# ============================================
+# TIME_INDEX.PY - Parse-once timestamps and range queries
+# ============================================
+
+import logging
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+def epoch_ms(dt):
+    """Convert an aware datetime to epoch milliseconds"""
+    return int(dt.timestamp() * 1000)
+
+def vital_epoch_ms(vital):
+    """Get a vital's epoch-millisecond timestamp, parsing the ISO string only once"""
+    ts_ms = vital.get('timestamp_ms')
+    if ts_ms is None:
+        # Records written before timestamp_ms existed: parse and remember
+        ts_ms = epoch_ms(datetime.fromisoformat(vital['timestamp'].replace('Z', '+00:00')))
+        vital['timestamp_ms'] = ts_ms
+    return ts_ms
+
+def vital_datetime(vital):
+    """Get a vital's timestamp as an aware UTC datetime"""
+    return datetime.fromtimestamp(vital_epoch_ms(vital) / 1000, timezone.utc)
+
+class TimeIndex:
+    """Sorted epoch-millisecond keys over a time-ordered vitals list"""
+    
+    def __init__(self, vitals, newest_first=True):
+        self.vitals = vitals
+        self.newest_first = newest_first
+        
+        keys = []
+        last_key = 0
+        for vital in vitals:
+            try:
+                last_key = vital_epoch_ms(vital)
+            except Exception as e:
+                # Keep the entry next to its neighbour rather than breaking the order
+                logger.warning(f"Could not parse vital timestamp: {e}")
+            keys.append(last_key)
+        
+        if newest_first:
+            keys.reverse()
+        self.keys = keys
+    
+    def _slice(self, lo, hi):
+        """Map an ascending key range [lo, hi) back to the vitals list"""
+        if self.newest_first:
+            count = len(self.keys)
+            return self.vitals[count - hi:count - lo]
+        return self.vitals[lo:hi]
+    
+    def between(self, t0_ms=None, t1_ms=None):
+        """Vitals with t0 <= timestamp <= t1, in list order"""
+        lo = 0 if t0_ms is None else bisect_left(self.keys, t0_ms)
+        hi = len(self.keys) if t1_ms is None else bisect_right(self.keys, t1_ms)
+        return self._slice(lo, max(lo, hi))
+    
+    def after(self, cutoff_ms):
+        """Vitals strictly newer than cutoff, in list order"""
+        return self._slice(bisect_right(self.keys, cutoff_ms), len(self.keys))
@@ -0,0 +1,71 @@
+# ============================================
+# TOKEN_CACHE.PY - Persisted Owlet API tokens
+# ============================================
+
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TokenCache:
+    """Owlet API auth/refresh tokens kept on disk between restarts"""
+    
+    def __init__(self, path, region, email):
+        self.path = path
+        self.region = region
+        self.email = email
+    
+    def load(self):
+        """Load cached tokens of this account, or None"""
+        if not os.path.exists(self.path):
+            return None
+        
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not read token cache {self.path}: {e}")
+            return None
+        
+        # Tokens of another account or region are useless
+        if data.get('region') != self.region or data.get('email') != self.email:
+            return None
+        if not data.get('api_token') and not data.get('refresh'):
+            return None
+        
+        return {
+            'api_token': data.get('api_token'),
+            'expiry': data.get('expiry'),
+            'refresh': data.get('refresh'),
+        }
+    
+    def save(self, tokens):
+        """Persist tokens atomically, readable by the service user only"""
+        data = {
+            'region': self.region,
+            'email': self.email,
+            'api_token': tokens.get('api_token'),
+            'expiry': tokens.get('expiry'),
+            'refresh': tokens.get('refresh'),
+        }
+        
+        tmp_path = f"{self.path}.tmp"
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to save token cache {self.path}: {e}")
+            return False
+    
+    def clear(self):
+        """Forget cached tokens"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Could not remove token cache {self.path}: {e}")
@@ -0,0 +1,188 @@
+# ============================================
+# VITAL_BUFFER.PY - Columnar in-memory ring buffer of recent vitals
+# ============================================
+
+import math
+import logging
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from .time_index import vital_epoch_ms
+
+logger = logging.getLogger(__name__)
+
+# Bits of the packed flags column
+FLAG_SOCK_CONNECTED = 1
+FLAG_SOCK_ON = 2
+FLAG_LOW_BATTERY = 4
+FLAG_HIGH_HEART_RATE = 8
+FLAG_LOW_OXYGEN = 16
+
+FLAG_FIELDS = (
+    ('sock_connected', FLAG_SOCK_CONNECTED),
+    ('sock_on', FLAG_SOCK_ON),
+    ('low_battery', FLAG_LOW_BATTERY),
+    ('high_heart_rate', FLAG_HIGH_HEART_RATE),
+    ('low_oxygen', FLAG_LOW_OXYGEN),
+)
+
+# Column name -> (vital key, array typecode)
+METRIC_COLUMNS = {
+    'heart_rate': ('heart_rate', 'f'),
+    'oxygen_saturation': ('oxygen_saturation', 'f'),
+    'skin_temperature': ('skin_temperature', 'f'),
+    'movement': ('movement', 'f'),
+    'battery': ('battery_percentage', 'f'),
+}
+
+MISSING_SLEEP_STATE = -1
+
+def format_timestamp(epoch):
+    """Format epoch seconds as the ISO timestamp used in vitals"""
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+class VitalRingBuffer:
+    """Fixed-capacity ring buffer storing vitals column by column.
+    
+    Every metric lives in its own typed array (NaN marks a missing reading),
+    so the retention window costs a few bytes per sample instead of a dict.
+    Samples are expected in time order; the oldest is overwritten when full.
+    """
+    
+    def __init__(self, capacity):
+        self.capacity = max(int(capacity), 1)
+        self.start = 0
+        self.size = 0
+        
+        self.timestamps = array('d', [0.0]) * self.capacity
+        self.metrics = {
+            name: array(typecode, [math.nan]) * self.capacity
+            for name, (_, typecode) in METRIC_COLUMNS.items()
+        }
+        self.sleep_states = array('b', [MISSING_SLEEP_STATE]) * self.capacity
+        self.flags = array('B', [0]) * self.capacity
+    
+    @classmethod
+    def for_retention(cls, retention_hours, interval_seconds):
+        """Create a buffer sized to hold the retention window"""
+        interval_seconds = max(interval_seconds or 1, 1)
+        # Headroom for jitter in the save interval
+        capacity = math.ceil(retention_hours * 3600 / interval_seconds * 1.1) + 1
+        return cls(capacity)
+    
+    def __len__(self):
+        return self.size
+    
+    def _slot(self, index):
+        """Map logical index (0 = oldest) to array position"""
+        return (self.start + index) % self.capacity
+    
+    def append(self, vital):
+        """Append a vital, overwriting the oldest sample when full"""
+        try:
+            ts = vital_epoch_ms(vital) / 1000
+        except Exception as e:
+            logger.warning(f"Could not parse vital timestamp: {e}")
+            return False
+        
+        if self.size < self.capacity:
+            slot = self._slot(self.size)
+            self.size += 1
+        else:
+            slot = self.start
+            self.start = (self.start + 1) % self.capacity
+        
+        self.timestamps[slot] = ts
+        for name, (key, _) in METRIC_COLUMNS.items():
+            value = vital.get(key)
+            self.metrics[name][slot] = math.nan if value is None else value
+        
+        sleep_state = vital.get('sleep_state')
+        self.sleep_states[slot] = MISSING_SLEEP_STATE if sleep_state is None else sleep_state
+        
+        flags = 0
+        for key, bit in FLAG_FIELDS:
+            if vital.get(key):
+                flags |= bit
+        self.flags[slot] = flags
+        return True
+    
+    def extend(self, vitals):
+        """Append vitals given oldest first"""
+        for vital in vitals:
+            self.append(vital)
+    
+    @classmethod
+    def from_store(cls, history_store, retention_hours, interval_seconds):
+        """Build a buffer from the on-disk history store"""
+        buffer = cls.for_retention(retention_hours, interval_seconds)
+        buffer.extend(history_store.iter_vitals())
+        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=retention_hours)
+        buffer.drop_before(cutoff_time.timestamp())
+        logger.info(f"Loaded {len(buffer)} vitals into memory (capacity {buffer.capacity})")
+        return buffer
+    
+    def _bisect(self, ts, right=False):
+        """Binary search the time-ordered samples, returns a logical index"""
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = self.timestamps[self._slot(mid)]
+            if value < ts or (right and value == ts):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+    
+    def drop_before(self, cutoff):
+        """Forget samples older than cutoff (epoch seconds)"""
+        dropped = self._bisect(cutoff)
+        self.start = self._slot(dropped)
+        self.size -= dropped
+        return dropped
+    
+    def _range_indices(self, t0=None, t1=None):
+        """Logical indices of samples with t0 <= ts <= t1"""
+        lo = 0 if t0 is None else self._bisect(t0)
+        hi = self.size if t1 is None else self._bisect(t1, right=True)
+        return list(range(lo, max(lo, hi)))
+    
+    def columns(self, t0=None, t1=None):
+        """Get timestamps and metric columns for a time range, oldest first"""
+        slots = [self._slot(i) for i in self._range_indices(t0, t1)]
+        result = {'timestamp': array('d', (self.timestamps[s] for s in slots))}
+        for name, (_, typecode) in METRIC_COLUMNS.items():
+            column = self.metrics[name]
+            result[name] = array(typecode, (column[s] for s in slots))
+        result['sleep_state'] = array('b', (self.sleep_states[s] for s in slots))
+        result['flags'] = array('B', (self.flags[s] for s in slots))
+        return result
+    
+    def _vital_at(self, slot):
+        """Rebuild a vital dict from one array position"""
+        ts = self.timestamps[slot]
+        vital = {'timestamp': format_timestamp(ts), 'timestamp_ms': round(ts * 1000)}
+        for name, (key, _) in METRIC_COLUMNS.items():
+            value = self.metrics[name][slot]
+            vital[key] = None if math.isnan(value) else value
+        
+        sleep_state = self.sleep_states[slot]
+        vital['sleep_state'] = None if sleep_state == MISSING_SLEEP_STATE else sleep_state
+        
+        flags = self.flags[slot]
+        for key, bit in FLAG_FIELDS:
+            vital[key] = bool(flags & bit)
+        return vital
+    
+    def to_vitals(self, t0=None, t1=None, newest_first=True):
+        """Get vitals in a time range as dicts"""
+        indices = self._range_indices(t0, t1)
+        if newest_first:
+            indices.reverse()
+        return [self._vital_at(self._slot(i)) for i in indices]
+    
+    def latest_timestamp(self):
+        """Epoch seconds of the newest sample, or None"""
+        if not self.size:
+            return None
+        return self.timestamps[self._slot(self.size - 1)]
@@ -0,0 +1,78 @@
+# ============================================
+# VITAL_DELTA.PY - Change-only encoding of consecutive vitals
+# ============================================
+
+from datetime import datetime, timedelta
+
+from .time_index import epoch_ms
+
+# Marks a record holding only the fields that changed since the previous vital
+DELTA_KEY = '_delta'
+REMOVED_KEY = '_removed'
+# Microseconds since the previous vital's timestamp
+OFFSET_KEY = 'dt'
+
+TIMESTAMP_FIELDS = ('timestamp', 'timestamp_ms')
+
+def parse_timestamp(timestamp):
+    """Parse a vital's ISO timestamp"""
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+def format_timestamp(dt):
+    """Format a datetime like the processor formats vital timestamps"""
+    return dt.isoformat().replace('+00:00', 'Z')
+
+def changed_fields(previous, vital):
+    """Fields other than the timestamps whose value differs from the previous vital"""
+    return {
+        key: value for key, value in vital.items()
+        if key not in TIMESTAMP_FIELDS and (key not in previous or previous[key] != value)
+    }
+
+def encode_delta(previous, vital):
+    """Record of a vital relative to the previous one"""
+    record = {DELTA_KEY: 1}
+    
+    # The timestamp becomes an offset when that reproduces the exact string
+    dt = parse_timestamp(vital['timestamp'])
+    previous_dt = parse_timestamp(previous['timestamp'])
+    offset = (dt - previous_dt) // timedelta(microseconds=1)
+    if format_timestamp(previous_dt + timedelta(microseconds=offset)) == vital['timestamp']:
+        record[OFFSET_KEY] = offset
+    else:
+        record['timestamp'] = vital['timestamp']
+    
+    # timestamp_ms is left out whenever readers can derive it from the timestamp
+    ts_ms = vital.get('timestamp_ms')
+    if ts_ms is not None and ts_ms != epoch_ms(dt):
+        record['timestamp_ms'] = ts_ms
+    
+    record.update(changed_fields(previous, vital))
+    removed = [key for key in previous if key not in vital]
+    if removed:
+        record[REMOVED_KEY] = removed
+    return record
+
+def is_delta(record):
+    """Whether a stored record is a delta rather than a full vital"""
+    return DELTA_KEY in record
+
+def apply_delta(previous, record):
+    """Rebuild the full vital of a delta record"""
+    vital = dict(previous)
+    for key in record.get(REMOVED_KEY, ()):
+        vital.pop(key, None)
+    
+    vital.update(record)
+    del vital[DELTA_KEY]
+    vital.pop(REMOVED_KEY, None)
+    
+    if OFFSET_KEY in record:
+        del vital[OFFSET_KEY]
+        dt = parse_timestamp(previous['timestamp']) + timedelta(microseconds=record[OFFSET_KEY])
+        vital['timestamp'] = format_timestamp(dt)
+    else:
+        dt = parse_timestamp(record['timestamp'])
+    if 'timestamp_ms' not in record:
+        vital['timestamp_ms'] = epoch_ms(dt)
+    return vital
@@ -0,0 +1,252 @@
+# ============================================
+# VITAL_STATS.PY - Sliding-window statistics and episode detection
+# ============================================
+
+import math
+import logging
+from collections import deque
+
+from .aggregator import LOW_OXYGEN_THRESHOLD
+from .time_index import vital_epoch_ms
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = (60, 300, 900)
+WINDOW_METRICS = ('heart_rate', 'oxygen_saturation', 'movement', 'asleep')
+
+# Sleep states reported by the sock (0 means unknown, e.g. sock off)
+SLEEP_AWAKE = 1
+ASLEEP_STATES = (2, 8)
+
+# Sleep starts when this share of the last 5 minutes was reported asleep and ends below the lower share
+SLEEP_WINDOW_SECONDS = 300
+SLEEP_ENTER_RATIO = 0.8
+SLEEP_EXIT_RATIO = 0.2
+# A window counts once its readings span this share of it
+READY_FRACTION = 0.75
+
+# SpO2 points above the threshold every reading of the last minute must reach to end an episode
+DESATURATION_WINDOW_SECONDS = 60
+DESATURATION_RECOVERY_MARGIN = 2
+
+def sleep_score(vital):
+    """1 when the sock reports sleep, 0 when awake, None when unknown"""
+    sleep_state = vital.get('sleep_state')
+    if sleep_state in ASLEEP_STATES:
+        return 1
+    if sleep_state == SLEEP_AWAKE:
+        return 0
+    return None
+
+def window_value(vital, metric):
+    """Reading of a windowed metric in a vital"""
+    if metric == 'asleep':
+        return sleep_score(vital)
+    return vital.get(metric)
+
+class RollingWindow:
+    """Mean, variance, min and max of the readings of the last `seconds`.
+    
+    Every reading is appended and evicted once: running sums give the mean
+    and variance, monotonic deques give min and max, so updates are
+    amortized O(1) however long the window is.
+    """
+    
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.samples = deque()
+        self.mins = deque()
+        self.maxes = deque()
+        self.total = 0.0
+        self.squares = 0.0
+        self.newest = None
+    
+    def __len__(self):
+        return len(self.samples)
+    
+    def expire(self, ts):
+        """Evict readings that left the window ending at ts"""
+        cutoff = ts - self.seconds
+        samples = self.samples
+        while samples and samples[0][0] <= cutoff:
+            _, value = samples.popleft()
+            self.total -= value
+            self.squares -= value * value
+        while self.mins and self.mins[0][0] <= cutoff:
+            self.mins.popleft()
+        while self.maxes and self.maxes[0][0] <= cutoff:
+            self.maxes.popleft()
+        
+        if not samples:
+            # Exact restart, so float drift never outlives an empty window
+            self.total = self.squares = 0.0
+    
+    def add(self, ts, value):
+        """Add a reading at epoch seconds ts, None only moves the window"""
+        if self.newest is not None and ts < self.newest:
+            return False
+        self.newest = ts
+        self.expire(ts)
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return False
+        
+        self.samples.append((ts, value))
+        self.total += value
+        self.squares += value * value
+        while self.mins and self.mins[-1][1] >= value:
+            self.mins.pop()
+        self.mins.append((ts, value))
+        while self.maxes and self.maxes[-1][1] <= value:
+            self.maxes.pop()
+        self.maxes.append((ts, value))
+        return True
+    
+    def mean(self):
+        """Mean of the readings, None when empty"""
+        return self.total / len(self.samples) if self.samples else None
+    
+    def variance(self):
+        """Population variance of the readings, None when empty"""
+        if not self.samples:
+            return None
+        mean = self.total / len(self.samples)
+        return max(self.squares / len(self.samples) - mean * mean, 0.0)
+    
+    def min(self):
+        """Lowest reading, None when empty"""
+        return self.mins[0][1] if self.mins else None
+    
+    def max(self):
+        """Highest reading, None when empty"""
+        return self.maxes[0][1] if self.maxes else None
+    
+    def is_ready(self):
+        """Whether the readings cover enough of the window to be trusted"""
+        if not self.samples or self.newest is None:
+            return False
+        return self.newest - self.samples[0][0] >= self.seconds * READY_FRACTION
+    
+    def stats(self):
+        """All statistics as a dict"""
+        variance = self.variance()
+        return {
+            'count': len(self.samples),
+            'mean': self.mean(),
+            'std': None if variance is None else math.sqrt(variance),
+            'min': self.min(),
+            'max': self.max(),
+        }
+
+class VitalWindows:
+    """Rolling windows of every windowed metric, fed one vital at a time"""
+    
+    def __init__(self, windows=WINDOW_SECONDS, metrics=WINDOW_METRICS):
+        self.windows = {
+            metric: {seconds: RollingWindow(seconds) for seconds in windows}
+            for metric in metrics
+        }
+    
+    def add(self, vital):
+        """Add a vital's readings to every window"""
+        try:
+            ts = vital_epoch_ms(vital) / 1000
+        except Exception as e:
+            logger.warning(f"Could not parse vital timestamp: {e}")
+            return False
+        
+        for metric, windows in self.windows.items():
+            value = window_value(vital, metric)
+            for window in windows.values():
+                window.add(ts, value)
+        return True
+    
+    def extend(self, vitals):
+        """Add vitals given oldest first"""
+        for vital in vitals:
+            self.add(vital)
+    
+    def get(self, metric, seconds):
+        """Window of a metric"""
+        return self.windows[metric][seconds]
+    
+    def stats(self):
+        """Statistics of every window, keyed by metric and window length"""
+        return {
+            metric: {f"{seconds // 60}m": window.stats() for seconds, window in windows.items()}
+            for metric, windows in self.windows.items()
+        }
+
+class SleepDetector:
+    """Sleep start/end with hysteresis over the 5-minute windows.
+    
+    Sleep starts once most of the last 5 minutes were reported asleep with
+    little movement, and ends only once most of them were awake, movement
+    is high or the sock has reported nothing for the whole window. Light
+    and deep sleep both count as asleep, so sleep cycles and short
+    dropouts do not produce events.
+    """
+    
+    def __init__(self, config):
+        self.movement_threshold = config.get('sleep_movement_threshold', 3)
+        self.wake_movement = config.get('sleep_wake_movement', 6)
+        # None until the windows first allow a decision, which creates no event
+        self.asleep = None
+    
+    def update(self, windows):
+        """Return 'Sleep Start' or 'Sleep End' when the state flipped"""
+        asleep = windows.get('asleep', SLEEP_WINDOW_SECONDS)
+        movement = windows.get('movement', SLEEP_WINDOW_SECONDS).mean()
+        
+        state = self.asleep
+        if not len(asleep):
+            if state:
+                state = False
+        elif asleep.is_ready():
+            ratio = asleep.mean()
+            calm = movement is None or movement <= self.movement_threshold
+            restless = movement is not None and movement >= self.wake_movement
+            if state is not True and ratio >= SLEEP_ENTER_RATIO and calm:
+                state = True
+            elif state is not False and (ratio <= SLEEP_EXIT_RATIO or restless):
+                state = False
+        
+        previous, self.asleep = self.asleep, state
+        if previous is None or state == previous:
+            return None
+        return 'Sleep Start' if state else 'Sleep End'
+
+class DesaturationDetector:
+    """Desaturation episodes from the 1-minute SpO2 window.
+    
+    An episode starts when the minute's mean drops below the threshold and
+    ends once every reading of a minute is back above threshold plus a
+    margin, or the sock stopped reporting SpO2.
+    """
+    
+    def __init__(self, config):
+        self.threshold = config.get('desaturation_threshold', LOW_OXYGEN_THRESHOLD)
+        self.episode = None
+    
+    def update(self, windows):
+        """Return the finished episode (start, end, nadir and duration) when one ended"""
+        window = windows.get('oxygen_saturation', DESATURATION_WINDOW_SECONDS)
+        now = window.newest
+        
+        if self.episode is None:
+            mean = window.mean()
+            if mean is not None and mean < self.threshold:
+                self.episode = {'start': window.samples[-1][0], 'nadir': window.min()}
+            return None
+        
+        lowest = window.min()
+        if lowest is not None and lowest < self.episode['nadir']:
+            self.episode['nadir'] = lowest
+        if lowest is not None and lowest < self.threshold + DESATURATION_RECOVERY_MARGIN:
+            return None
+        
+        # Recovered, or no readings left in the window
+        episode, self.episode = self.episode, None
+        end = window.samples[-1][0] if window.samples else now
+        episode['end'] = end
+        episode['duration_seconds'] = max(end - episode['start'], 0)
+        return episode
@@ -0,0 +1,24 @@
+# ============================================
+# CONFTEST.PY - Shared test setup
+# ============================================
+
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+import pytz
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from services.owlet.data_processor import VitalDataProcessor
+from services.owlet.simulator import generate_vitals
+
+# Fixed start, so every run sees the same simulated day
+DAY_START = datetime(2026, 1, 15, tzinfo=timezone.utc)
+
+@pytest.fixture
+def day_vitals():
+    """One UTC day of simulated minute vitals, oldest first"""
+    return generate_vitals(VitalDataProcessor(pytz.UTC), 1440, start=DAY_START)
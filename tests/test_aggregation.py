@@ -0,0 +1,76 @@
+# ============================================
+# TEST_AGGREGATION.PY - NumPy, pure Python and incremental summaries agree
+# ============================================
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytz
+
+from services.owlet import data_processor
+from services.owlet.aggregator import DailyAggregator
+from services.owlet.data_processor import VitalDataProcessor
+from services.owlet.simulator import generate_vitals
+from services.owlet.time_index import vital_epoch_ms
+
+from conftest import DAY_START
+
+TZ = pytz.timezone('Europe/Tallinn')
+
+def local_time(vital):
+    """Local datetime of a vital"""
+    return datetime.fromtimestamp(vital_epoch_ms(vital) / 1000, timezone.utc).astimezone(TZ)
+
+@pytest.fixture
+def local_day():
+    """(date, vitals) of one local day, with some readings missing"""
+    processor = VitalDataProcessor(TZ)
+    vitals = generate_vitals(processor, 2 * 1440, start=DAY_START - timedelta(hours=12))
+    date = local_time(vitals[1440]).date()
+    day = [vital for vital in vitals if local_time(vital).date() == date]
+    for vital in day[::7]:
+        vital['heart_rate'] = None
+    for vital in day[::11]:
+        vital['oxygen_saturation'] = None
+    return date, day
+
+def python_summary(processor, vitals, monkeypatch):
+    """Summary computed without NumPy"""
+    with monkeypatch.context() as patch:
+        patch.setattr(data_processor, 'np', None)
+        return processor.aggregate_vitals_to_summary(vitals)
+
+def incremental_summary(date, vitals):
+    """Summary of the per-hour accumulators the live service keeps"""
+    aggregator = DailyAggregator(date, 60)
+    for vital in vitals:
+        aggregator.add(vital, local_time(vital).hour)
+    return aggregator.to_daily_summary()
+
+@pytest.mark.skipif(data_processor.np is None, reason='numpy not installed')
+def test_numpy_matches_pure_python(local_day, monkeypatch):
+    _, vitals = local_day
+    processor = VitalDataProcessor(TZ)
+    
+    vectorized = processor.aggregate_vitals_to_summary(vitals)
+    assert vectorized == python_summary(processor, vitals, monkeypatch)
+
+def test_incremental_matches_batch(local_day, monkeypatch):
+    date, vitals = local_day
+    batch = python_summary(VitalDataProcessor(TZ), vitals, monkeypatch)
+    incremental = incremental_summary(date, vitals)
+    
+    assert batch['date'] == incremental['date'] == date.isoformat()
+    assert batch['total_data_points'] == incremental['total_data_points'] == len(vitals)
+    assert batch['daily'] == incremental['daily']
+    assert batch['hourly'] == incremental['hourly']
+
+def test_std_of_constant_readings_is_zero(monkeypatch):
+    processor = VitalDataProcessor(pytz.UTC)
+    vitals = generate_vitals(processor, 120, start=DAY_START)
+    for vital in vitals:
+        vital['heart_rate'] = 130.7
+    
+    summaries = [processor.aggregate_vitals_to_summary(vitals), python_summary(processor, vitals, monkeypatch)]
+    for summary in summaries:
+        assert summary['daily']['heart_rate']['std'] == 0
@@ -0,0 +1,99 @@
+# ============================================
+# TEST_API_CLIENT.PY - Token cache and session resumption against the fake API
+# ============================================
+
+import asyncio
+import os
+import stat
+
+import pytest
+
+from services.owlet import api_client
+from services.owlet.api_client import OwletAPIClient
+from services.owlet.simulator import FakeOwletAPI
+from services.owlet.token_cache import TokenCache
+
+CONFIG = {'email': 'parent@example.com', 'password': 'secret', 'region': 'europe', 'api_retry_attempts': 0}
+
+class FakeAuthError(Exception):
+    """Stand-in for pyowletapi's credential errors"""
+
+class RecordingAPI(FakeOwletAPI):
+    """Fake API remembering every session it was asked to start"""
+    
+    sessions = []
+    failure = None
+    
+    async def authenticate(self):
+        RecordingAPI.sessions.append('cached' if self._token else 'login')
+        if self._token and RecordingAPI.failure:
+            raise RecordingAPI.failure
+        return await super().authenticate()
+
+@pytest.fixture(autouse=True)
+def auth_errors(monkeypatch):
+    """Treat FakeAuthError as rejected credentials, also without pyowletapi installed"""
+    monkeypatch.setattr(api_client, 'AUTH_ERRORS', (FakeAuthError,))
+    RecordingAPI.sessions = []
+    RecordingAPI.failure = None
+
+def new_client(tmp_path):
+    return OwletAPIClient(CONFIG, RecordingAPI, base_dir=str(tmp_path))
+
+def cache_file(tmp_path):
+    return os.path.join(tmp_path, 'owlet_token_cache.json')
+
+def test_token_cache_round_trip(tmp_path):
+    cache = TokenCache(cache_file(tmp_path), 'europe', 'parent@example.com')
+    tokens = {'api_token': 'token', 'expiry': 1800000000, 'refresh': 'refresh'}
+    
+    assert cache.load() is None
+    assert cache.save(tokens)
+    assert cache.load() == tokens
+    assert stat.S_IMODE(os.stat(cache.path).st_mode) == 0o600
+    
+    cache.clear()
+    assert cache.load() is None
+
+def test_token_cache_ignores_other_accounts(tmp_path):
+    TokenCache(cache_file(tmp_path), 'europe', 'parent@example.com').save({'api_token': 'token'})
+    
+    assert TokenCache(cache_file(tmp_path), 'europe', 'other@example.com').load() is None
+    assert TokenCache(cache_file(tmp_path), 'us-east-1', 'parent@example.com').load() is None
+
+def test_token_cache_tolerates_corrupt_file(tmp_path):
+    with open(cache_file(tmp_path), 'w') as f:
+        f.write('{not json')
+    assert TokenCache(cache_file(tmp_path), 'europe', 'parent@example.com').load() is None
+
+def test_restart_resumes_from_cached_tokens(tmp_path):
+    assert asyncio.run(new_client(tmp_path).authenticate())
+    assert asyncio.run(new_client(tmp_path).authenticate())
+    assert RecordingAPI.sessions == ['login', 'cached']
+
+def test_transient_error_keeps_cache_without_password_login(tmp_path):
+    asyncio.run(new_client(tmp_path).authenticate())
+    with open(cache_file(tmp_path)) as f:
+        cached = f.read()
+    
+    RecordingAPI.failure = OSError('Temporary failure in name resolution')
+    client = new_client(tmp_path)
+    assert not asyncio.run(client.authenticate())
+    assert client.api is None
+    assert RecordingAPI.sessions == ['login', 'cached']
+    with open(cache_file(tmp_path)) as f:
+        assert f.read() == cached
+    
+    # Once the network is back the cached tokens are used again
+    RecordingAPI.failure = None
+    assert asyncio.run(client.authenticate())
+    assert RecordingAPI.sessions == ['login', 'cached', 'cached']
+
+def test_rejected_tokens_fall_back_to_login(tmp_path):
+    asyncio.run(new_client(tmp_path).authenticate())
+    
+    RecordingAPI.failure = FakeAuthError('token expired')
+    assert asyncio.run(new_client(tmp_path).authenticate())
+    assert RecordingAPI.sessions == ['login', 'cached', 'login']
+    # The fresh session's tokens replaced the rejected ones
+    assert TokenCache(cache_file(tmp_path), 'europe', 'parent@example.com').load() is not None
@@ -0,0 +1,68 @@
+# ============================================
+# TEST_SCHEDULER.PY - Drift-free cadence and skipped slots
+# ============================================
+
+from types import SimpleNamespace
+
+import pytest
+
+from services.owlet.scheduler import MODE_ALERT, MODE_IDLE, MODE_NORMAL, SyncScheduler
+
+class FakeClock:
+    """Monotonic clock moved by hand"""
+    
+    def __init__(self, now=1000.0):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+def device(sock_on=True, sock_on_since=None, **vital):
+    """Stand-in for a DeviceSync with its latest vital"""
+    return SimpleNamespace(latest_vital=dict(vital, sock_on=sock_on), sock_on_since=sock_on_since)
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def scheduler(clock):
+    return SyncScheduler({}, 60, clock=clock)
+
+def test_slots_do_not_drift(scheduler, clock):
+    for tick in range(1, 6):
+        # Each sync takes 7 seconds, the next slot stays on the 60 s grid
+        clock.now += 7
+        assert scheduler.advance() == pytest.approx(53)
+        assert scheduler.next_time == 1000 + tick * 60
+        clock.now = scheduler.next_time
+    assert scheduler.missed_slots == 0
+
+def test_overrun_skips_passed_slots(scheduler, clock):
+    # A sync of 150 s misses the slots at 60 and 120
+    clock.now += 150
+    assert scheduler.advance() == pytest.approx(30)
+    assert scheduler.next_time == 1180
+    assert scheduler.missed_slots == 2
+
+def test_overrun_ending_on_a_slot_skips_it(scheduler, clock):
+    clock.now += 120
+    assert scheduler.advance() == pytest.approx(60)
+    assert scheduler.missed_slots == 2
+
+def test_modes(clock):
+    scheduler = SyncScheduler({'alert_interval_seconds': 15, 'idle_interval_seconds': 300}, 60, clock=clock)
+    
+    assert scheduler.select_mode([]) == MODE_NORMAL
+    assert scheduler.select_mode([device()]) == MODE_NORMAL
+    assert scheduler.select_mode([device(sock_on=False)]) == MODE_IDLE
+    assert scheduler.select_mode([device(charging=True)]) == MODE_IDLE
+    assert scheduler.select_mode([device(sock_on=False), device(low_oxygen=True)]) == MODE_ALERT
+    # Polling stays fast for a while after the sock is put on
+    assert scheduler.select_mode([device(sock_on_since=clock.now - 10)]) == MODE_ALERT
+    assert scheduler.select_mode([device(sock_on_since=clock.now - 600)]) == MODE_NORMAL
+
+def test_interval_follows_mode(scheduler, clock):
+    assert scheduler.advance([device(high_heart_rate=True)]) == pytest.approx(15)
+    clock.now = scheduler.next_time
+    assert scheduler.advance([device(sock_on=False)]) == pytest.approx(300)
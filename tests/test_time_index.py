@@ -0,0 +1,60 @@
+# ============================================
+# TEST_TIME_INDEX.PY - Bisected range queries over vitals lists
+# ============================================
+
+import pytest
+
+from services.owlet.time_index import TimeIndex
+
+def vitals_at(*keys):
+    """Vitals with the given epoch-millisecond keys"""
+    return [{'timestamp': 'unused', 'timestamp_ms': key} for key in keys]
+
+def keys_of(vitals):
+    return [vital['timestamp_ms'] for vital in vitals]
+
+@pytest.fixture(params=[False, True], ids=['oldest_first', 'newest_first'])
+def index(request):
+    """Index over keys 1000..5000 (with 3000 twice) in either list order"""
+    keys = [1000, 2000, 3000, 3000, 4000, 5000]
+    if request.param:
+        keys.reverse()
+    return TimeIndex(vitals_at(*keys), newest_first=request.param)
+
+def ordered(index, keys):
+    """Keys in the list order of the index"""
+    return sorted(keys, reverse=index.newest_first)
+
+def test_between_includes_both_ends(index):
+    assert keys_of(index.between(2000, 4000)) == ordered(index, [2000, 3000, 3000, 4000])
+
+def test_between_between_keys(index):
+    assert keys_of(index.between(2001, 3999)) == ordered(index, [3000, 3000])
+    assert keys_of(index.between(2500, 2600)) == []
+
+def test_between_open_ends(index):
+    assert keys_of(index.between(None, 2000)) == ordered(index, [1000, 2000])
+    assert keys_of(index.between(4000, None)) == ordered(index, [4000, 5000])
+    assert len(index.between()) == 6
+
+def test_between_outside_and_inverted_ranges(index):
+    assert index.between(0, 999) == []
+    assert index.between(5001, 9000) == []
+    assert index.between(4000, 2000) == []
+
+def test_after_is_strict(index):
+    assert keys_of(index.after(3000)) == ordered(index, [4000, 5000])
+    assert keys_of(index.after(2999)) == ordered(index, [3000, 3000, 4000, 5000])
+    assert keys_of(index.after(999)) == ordered(index, [1000, 2000, 3000, 3000, 4000, 5000])
+    assert index.after(5000) == []
+
+def test_empty_index():
+    index = TimeIndex([])
+    assert index.between(0, 10) == []
+    assert index.after(0) == []
+
+def test_timestamp_parsed_when_key_missing():
+    vitals = [{'timestamp': '2026-01-15T00:00:00Z'}, {'timestamp': '2026-01-15T00:01:00Z'}]
+    index = TimeIndex(vitals, newest_first=False)
+    assert index.between(1768435260000, None) == [vitals[1]]
+    assert vitals[0]['timestamp_ms'] == 1768435200000
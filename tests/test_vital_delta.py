@@ -0,0 +1,52 @@
+# ============================================
+# TEST_VITAL_DELTA.PY - Delta encoding of history lines
+# ============================================
+
+from services.owlet.history_store import HistoryStore
+from services.owlet.vital_delta import apply_delta, encode_delta, is_delta
+
+def round_trip(vitals):
+    """Encode every vital against the one before and decode it again"""
+    decoded = [dict(vitals[0])]
+    for previous, vital in zip(vitals, vitals[1:]):
+        record = encode_delta(previous, vital)
+        assert is_delta(record)
+        decoded.append(apply_delta(decoded[-1], record))
+    return decoded
+
+def test_round_trip_of_simulated_vitals(day_vitals):
+    assert round_trip(day_vitals) == day_vitals
+
+def test_unchanged_fields_are_left_out(day_vitals):
+    previous, following = day_vitals[:2]
+    vital = dict(previous, timestamp=following['timestamp'], timestamp_ms=following['timestamp_ms'])
+    vital['heart_rate'] = (previous['heart_rate'] or 0) + 1
+    
+    record = encode_delta(previous, vital)
+    assert set(record) == {'_delta', 'dt', 'heart_rate'}
+    assert apply_delta(previous, record) == vital
+
+def test_removed_fields_and_irregular_timestamps():
+    previous = {'timestamp': '2026-01-15T00:00:00Z', 'timestamp_ms': 1768435200000, 'heart_rate': 120, 'charging': False}
+    # Millisecond precision is not what the processor writes, so the string is kept as is
+    vital = {'timestamp': '2026-01-15T00:01:00.500Z', 'timestamp_ms': 1768435260500, 'heart_rate': 121}
+    
+    record = encode_delta(previous, vital)
+    assert record['timestamp'] == vital['timestamp']
+    assert record['_removed'] == ['charging']
+    assert apply_delta(previous, record) == vital
+
+def test_timestamp_ms_kept_when_not_derivable():
+    previous = {'timestamp': '2026-01-15T00:00:00Z', 'timestamp_ms': 1768435200000}
+    vital = {'timestamp': '2026-01-15T00:01:00Z', 'timestamp_ms': 1}
+    
+    record = encode_delta(previous, vital)
+    assert record['timestamp_ms'] == 1
+    assert apply_delta(previous, record) == vital
+
+def test_segment_round_trip(tmp_path, day_vitals):
+    store = HistoryStore(str(tmp_path), keyframe_interval=30)
+    assert store.append_many(day_vitals[:90])
+    assert store.append_many(day_vitals[90:180])
+    
+    assert list(store.iter_vitals()) == day_vitals[:180]